@@ -13,24 +13,39 @@ if "bpy" in locals():
     import importlib
     importlib.reload(ui)
 
-import bpy
-from . import ui, operators, properties, preferences
-from .importer.importer import ImportColmapOperator
-classes = (
+try:
+    import bpy
+except ImportError:
+    # The pipeline modules are also imported without Blender (by the command
+    # line and by worker processes). There is nothing to register then.
+    bpy = None
+
+if bpy is not None:
+    from . import ui, operators, properties, preferences
+    from .importer.importer import ImportColmapOperator, ImportColmapAsyncOperator
+classes = () if bpy is None else (
     # Preferences
     preferences.OpenVideoTrackerPreferences,
     
     # Properties
     properties.OpenVideoTrackerCameraProperties,
     properties.OpenVideoTrackerPointsProperties,
+    properties.OpenVideoTrackerWeakLinkProperties,
+    properties.OpenVideoTrackerDatabaseProperties,
     properties.OpenVideoTrackerProperties,
     
     # Operators
     operators.OPEN_VIDEO_TRACKER_OT_run_pipeline_modal,
+    operators.OPEN_VIDEO_TRACKER_OT_analyze_database,
+    operators.OPEN_VIDEO_TRACKER_OT_add_job,
+    operators.OPEN_VIDEO_TRACKER_OT_run_job_queue,
+    operators.OPEN_VIDEO_TRACKER_OT_job_action,
     ImportColmapOperator,
+    ImportColmapAsyncOperator,
     
     # UI Panels
     ui.OPEN_VIDEO_TRACKER_PT_panel,
+    ui.OPEN_VIDEO_TRACKER_PT_job_queue_panel,
     ui.OPEN_VIDEO_TRACKER_PT_camera_panel
 )
 
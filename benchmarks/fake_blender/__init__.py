@@ -0,0 +1,121 @@
+"""Headless stand-ins of Blender's python modules for benchmarks.
+
+:code:`install()` registers fake :code:`bpy`, :code:`mathutils`, :code:`gpu`
+and :code:`gpu_extras` modules, which allows to run the scene construction
+code of the importer outside of Blender. The fakes record all calls and the
+modeled cost of Blender's expensive APIs (see :code:`CostModel`). The modules
+must be installed before the importer modules are imported.
+"""
+
+import importlib
+import os
+import sys
+import types
+
+from .recorder import CallRecorder, CostModel, get_recorder
+
+
+def install(cost_model=None):
+    """Register the fake modules and return the shared call recorder."""
+    if "bpy" in sys.modules and not is_installed():
+        raise RuntimeError("The real bpy module has already been imported")
+
+    from . import bpy, gpu, mathutils
+
+    gpu_extras = types.ModuleType("gpu_extras")
+    gpu_extras.batch = types.ModuleType("gpu_extras.batch")
+    gpu_extras.batch.batch_for_shader = gpu.batch_for_shader
+
+    sys.modules.update(
+        {
+            "bpy": bpy,
+            "bpy.props": bpy.props,
+            "bpy.types": bpy.types,
+            "mathutils": mathutils,
+            "gpu": gpu,
+            "gpu_extras": gpu_extras,
+            "gpu_extras.batch": gpu_extras.batch,
+        }
+    )
+    recorder = get_recorder()
+    if cost_model is not None:
+        recorder.cost_model = cost_model
+    return recorder
+
+
+def is_installed():
+    """Return True, if the fake modules are registered."""
+    module = sys.modules.get("bpy")
+    return module is not None and module.__name__ == __name__ + ".bpy"
+
+
+def reset():
+    """Remove all data blocks, draw handlers and recorded calls."""
+    from . import bpy
+
+    bpy.reset()
+    bpy.SpaceView3D.draw_handlers.clear()
+    # The draw manager of the importer is stored as class attribute
+    if hasattr(bpy.Object, "current_draw_manager"):
+        del bpy.Object.current_draw_manager
+    get_recorder().reset()
+
+
+def draw_view3d():
+    """Call the registered draw handlers like a redraw of the 3D view."""
+    from . import bpy
+
+    for callback, args in list(bpy.SpaceView3D.draw_handlers.values()):
+        callback(*args)
+
+
+def create_property_group(property_group_class, **values):
+    """Return an instance of a property group with the default values.
+
+    The property definitions of the fake :code:`bpy.props` are
+    :code:`(property_type, kwargs)` tuples. Pointer properties are created
+    recursively, the given values overwrite the defaults.
+    """
+    property_group = types.SimpleNamespace()
+    for cls in reversed(property_group_class.__mro__):
+        for name, definition in getattr(cls, "__annotations__", {}).items():
+            if not isinstance(definition, tuple):
+                continue
+            property_type, kwargs = definition
+            if property_type == "PointerProperty":
+                value = create_property_group(kwargs["type"])
+            elif property_type == "CollectionProperty":
+                value = []
+            elif "default" in kwargs:
+                value = kwargs["default"]
+            elif property_type == "EnumProperty":
+                value = kwargs["items"][0][0]
+            else:
+                value = {
+                    "BoolProperty": False,
+                    "FloatProperty": 0.0,
+                    "IntProperty": 0,
+                    "StringProperty": "",
+                }.get(property_type)
+            setattr(property_group, name, value)
+    for name, value in values.items():
+        setattr(property_group, name, value)
+    return property_group
+
+
+def import_addon_module(module_name, package_name="open_video_tracker"):
+    """Import a module of the addon, e.g. :code:`operators`.
+
+    The addon is registered as package without running its
+    :code:`__init__.py`, i.e. only the modules required by the given module
+    are imported.
+    """
+    if package_name not in sys.modules:
+        repository_dp = os.path.dirname(
+            os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        )
+        package = types.ModuleType(package_name)
+        package.__path__ = [repository_dp]
+        package.__package__ = package_name
+        sys.modules[package_name] = package
+    return importlib.import_module(f"{package_name}.{module_name}")
@@ -0,0 +1,651 @@
+"""Minimal stand-in of Blender's :code:`bpy` module.
+
+The data blocks store the values assigned by the importer, but do not
+perform the work of Blender. Each call is recorded with the shared
+:code:`CallRecorder`, expensive calls additionally with their modeled cost.
+Rarely used APIs (node trees, operators, ...) are represented by
+:code:`_Struct` instances that accept arbitrary attributes and calls.
+"""
+
+import bisect
+import contextlib
+import math
+import types as _types
+
+from .mathutils import Matrix, Quaternion, Vector
+from .recorder import get_recorder
+
+
+class _Struct:
+    """Generic struct that creates attributes and items on first access."""
+
+    def __init__(self, path):
+        object.__setattr__(self, "_path", path)
+        object.__setattr__(self, "_items", {})
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        value = _Struct(f"{self._path}.{name}")
+        object.__setattr__(self, name, value)
+        return value
+
+    def __getitem__(self, key):
+        if key not in self._items:
+            self._items[key] = _Struct(f"{self._path}[]")
+        return self._items[key]
+
+    def __setitem__(self, key, value):
+        self._items[key] = value
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def __iter__(self):
+        return iter(list(self._items.values()))
+
+    def __len__(self):
+        return len(self._items)
+
+    def __call__(self, *args, **kwargs):
+        get_recorder().record(self._path)
+        return _Struct(f"{self._path}()")
+
+
+class ID:
+    """Base class of data blocks with custom properties and animations."""
+
+    _type_name = "ID"
+
+    def __init__(self, name):
+        self.name = name
+        self.users = 0
+        self.animation_data = None
+        self._properties = {}
+
+    def __getitem__(self, key):
+        return self._properties[key]
+
+    def __setitem__(self, key, value):
+        self._properties[key] = value
+
+    def __contains__(self, key):
+        return key in self._properties
+
+    def __repr__(self):
+        return f"bpy.data.{self._type_name}[{self.name!r}]"
+
+    def keyframe_insert(self, data_path, index=-1, frame=None, **kwargs):
+        """Insert keyframes of the current value of data_path.
+
+        Like in Blender, each keyframe insertion recalculates the handles of
+        the modified F-Curves, i.e. the cost grows with the number of existing
+        keyframes.
+        """
+        if frame is None:
+            frame = context.scene.frame_current
+        value = getattr(self, data_path)
+        if hasattr(value, "__len__"):
+            values = list(value)
+            indices = range(len(values)) if index == -1 else [index]
+        else:
+            values = [value]
+            indices = [0]
+
+        if self.animation_data is None:
+            self.animation_data = AnimData(f"{self.name}Action")
+        fcurves = self.animation_data.action.fcurves
+        num_existing_keyframes = 0
+        for array_index in indices:
+            fcurve = fcurves.find(data_path, index=array_index)
+            if fcurve is None:
+                fcurve = fcurves.new(data_path, index=array_index)
+            num_existing_keyframes += len(fcurve.keyframe_points)
+            fcurve.keyframe_points.insert(frame, values[array_index])
+        get_recorder().record(
+            f"{type(self).__name__}.keyframe_insert",
+            "keyframe_insert",
+            size=num_existing_keyframes,
+            count=len(indices),
+        )
+        return True
+
+
+class Keyframe:
+    def __init__(self, frame, value):
+        self.co = [float(frame), float(value)]
+        self.interpolation = "BEZIER"
+
+
+class KeyframePoints:
+    def __init__(self):
+        self._keyframes = []
+        self._frames = []
+
+    def __len__(self):
+        return len(self._keyframes)
+
+    def __getitem__(self, index):
+        return self._keyframes[index]
+
+    def __iter__(self):
+        return iter(self._keyframes)
+
+    def insert(self, frame, value, **kwargs):
+        position = bisect.bisect_left(self._frames, frame)
+        if position < len(self._frames) and self._frames[position] == frame:
+            self._keyframes[position].co[1] = float(value)
+            return self._keyframes[position]
+        keyframe = Keyframe(frame, value)
+        self._frames.insert(position, frame)
+        self._keyframes.insert(position, keyframe)
+        return keyframe
+
+
+class FCurve:
+    def __init__(self, data_path, array_index):
+        self.data_path = data_path
+        self.array_index = array_index
+        self.keyframe_points = KeyframePoints()
+
+
+class FCurves:
+    def __init__(self):
+        self._fcurves = {}
+
+    def __len__(self):
+        return len(self._fcurves)
+
+    def __iter__(self):
+        return iter(list(self._fcurves.values()))
+
+    def find(self, data_path, index=0):
+        return self._fcurves.get((data_path, index))
+
+    def new(self, data_path, index=0, action_group=""):
+        fcurve = FCurve(data_path, index)
+        self._fcurves[(data_path, index)] = fcurve
+        return fcurve
+
+
+class Action(ID):
+    _type_name = "actions"
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.fcurves = FCurves()
+
+
+class AnimData:
+    def __init__(self, action_name):
+        self.action = Action(action_name)
+
+
+class Object(ID):
+    _type_name = "objects"
+
+    def __init__(self, name, object_data=None):
+        super().__init__(name)
+        self.data = object_data
+        if object_data is not None:
+            object_data.users += 1
+        self.type = getattr(object_data, "_object_type", "EMPTY")
+        self.location = Vector((0.0, 0.0, 0.0))
+        self.rotation_quaternion = Quaternion()
+        self.rotation_mode = "XYZ"
+        self.scale = Vector((1.0, 1.0, 1.0))
+        self.mode = "OBJECT"
+        self.parent = None
+        self.modifiers = _Struct("Object.modifiers")
+        self.users_collection = []
+        self._matrix_world = Matrix()
+        self._is_selected = False
+
+    @property
+    def matrix_world(self):
+        return self._matrix_world.copy()
+
+    @matrix_world.setter
+    def matrix_world(self, matrix):
+        self._matrix_world = Matrix(matrix)
+        self.location = self._matrix_world.to_translation()
+        self.rotation_quaternion = self._matrix_world.to_quaternion()
+        self.scale = self._matrix_world.to_scale()
+
+    def select_set(self, state, view_layer=None):
+        get_recorder().record("Object.select_set")
+        self._is_selected = state
+
+    def select_get(self, view_layer=None):
+        return self._is_selected
+
+    def visible_get(self, view_layer=None, viewport=None):
+        return True
+
+
+class Camera(ID):
+    _type_name = "cameras"
+    _object_type = "CAMERA"
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.type = "PERSP"
+        self.lens = 50.0
+        self.sensor_width = 36.0
+        self.sensor_height = 24.0
+        self.sensor_fit = "AUTO"
+        self.shift_x = 0.0
+        self.shift_y = 0.0
+        self.clip_start = 0.1
+        self.clip_end = 1000.0
+        self.show_background_images = False
+        self.background_images = _Struct("Camera.background_images")
+        self.cycles = _Struct("Camera.cycles")
+
+    @property
+    def angle(self):
+        return 2.0 * math.atan(self.sensor_width / (2.0 * self.lens))
+
+    @angle.setter
+    def angle(self, angle):
+        self.lens = self.sensor_width / (2.0 * math.tan(angle / 2.0))
+
+
+class AttributeData:
+    def __init__(self, attribute):
+        self._attribute = attribute
+
+    def foreach_set(self, attribute_name, values):
+        get_recorder().record(
+            "bpy_prop_collection.foreach_set", "foreach_set", size=len(values)
+        )
+
+
+class Attribute:
+    def __init__(self, name, attribute_type, domain):
+        self.name = name
+        self.data_type = attribute_type
+        self.domain = domain
+        self.data = AttributeData(self)
+
+
+class Attributes:
+    def __init__(self):
+        self._attributes = {}
+
+    def __getitem__(self, name):
+        return self._attributes[name]
+
+    def __contains__(self, name):
+        return name in self._attributes
+
+    def new(self, name, type, domain):
+        get_recorder().record("Mesh.attributes.new")
+        attribute = Attribute(name, type, domain)
+        self._attributes[name] = attribute
+        return attribute
+
+
+class Mesh(ID):
+    _type_name = "meshes"
+    _object_type = "MESH"
+
+    def __init__(self, name):
+        super().__init__(name)
+        # Only the number of elements is stored
+        self.vertices = range(0)
+        self.edges = range(0)
+        self.polygons = range(0)
+        self.attributes = Attributes()
+        self.uv_layers = _Struct("Mesh.uv_layers")
+        self.vertex_colors = _Struct("Mesh.vertex_colors")
+        self.materials = []
+
+    def from_pydata(self, vertices, edges, faces, shade_flat=True):
+        num_elements = len(vertices) + len(edges) + len(faces)
+        get_recorder().record("Mesh.from_pydata", "from_pydata", num_elements)
+        self.vertices = range(len(vertices))
+        self.edges = range(len(edges))
+        self.polygons = range(len(faces))
+
+    def update(self, calc_edges=False, calc_edges_loose=False):
+        get_recorder().record("Mesh.update", "mesh.update", len(self.vertices))
+
+    def validate(self, verbose=False, clean_customdata=True):
+        get_recorder().record(
+            "Mesh.validate", "mesh.validate", len(self.vertices)
+        )
+        return False
+
+
+class Image(ID):
+    _type_name = "images"
+
+    def __init__(self, name, filepath="", width=0, height=0):
+        super().__init__(name)
+        self.filepath = filepath
+        self.size = [width, height]
+        self.pixels = _Struct("Image.pixels")
+
+    def pack(self):
+        get_recorder().record("Image.pack")
+
+
+class Material(ID):
+    _type_name = "materials"
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.use_nodes = False
+        self.node_tree = _Struct("Material.node_tree")
+
+
+class NodeTree(ID):
+    _type_name = "node_groups"
+
+    def __init__(self, name, tree_type="ShaderNodeTree"):
+        super().__init__(name)
+        self.bl_idname = tree_type
+        self.nodes = _Struct("NodeTree.nodes")
+        self.links = _Struct("NodeTree.links")
+        self.interface = _Struct("NodeTree.interface")
+
+
+class MovieClip(ID):
+    _type_name = "movieclips"
+
+
+class _CollectionObjects:
+    def __init__(self, name):
+        self._name = name
+        self._objects = {}
+
+    def __len__(self):
+        return len(self._objects)
+
+    def __iter__(self):
+        return iter(list(self._objects.values()))
+
+    def __contains__(self, obj):
+        return id(obj) in self._objects
+
+    def link(self, obj):
+        get_recorder().record(f"Collection.{self._name}.link")
+        self._objects[id(obj)] = obj
+
+    def unlink(self, obj):
+        get_recorder().record(f"Collection.{self._name}.unlink")
+        self._objects.pop(id(obj), None)
+
+
+class Collection(ID):
+    _type_name = "collections"
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.objects = _CollectionObjects("objects")
+        self.children = _CollectionObjects("children")
+        self.hide_viewport = False
+        self.hide_render = False
+
+
+class IDCollection:
+    """A :code:`bpy.data` collection that stores data blocks by name."""
+
+    def __init__(self, type_name, id_type):
+        self._type_name = type_name
+        self._id_type = id_type
+        self._items = {}
+        self._last_suffixes = {}
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(list(self._items.values()))
+
+    def __getitem__(self, name):
+        return self._items[name]
+
+    def __contains__(self, name):
+        return name in self._items
+
+    def get(self, name, default=None):
+        return self._items.get(name, default)
+
+    def keys(self):
+        return list(self._items.keys())
+
+    def _get_unique_name(self, name):
+        # Blender appends a numeric suffix to names that are already in use
+        unique_name = name
+        suffix = self._last_suffixes.get(name, 0)
+        while unique_name in self._items:
+            suffix += 1
+            unique_name = f"{name}.{suffix:03d}"
+        self._last_suffixes[name] = suffix
+        return unique_name
+
+    def _add(self, id_block):
+        id_block.name = self._get_unique_name(id_block.name)
+        self._items[id_block.name] = id_block
+        return id_block
+
+    def new(self, name, *args, **kwargs):
+        get_recorder().record(
+            f"bpy.data.{self._type_name}.new", "data.new", len(self._items)
+        )
+        return self._add(self._id_type(name, *args, **kwargs))
+
+    def remove(self, id_block, do_unlink=True, **kwargs):
+        get_recorder().record(f"bpy.data.{self._type_name}.remove")
+        self._items.pop(id_block.name, None)
+        if isinstance(id_block, Object) and id_block.data is not None:
+            id_block.data.users -= 1
+
+
+class ImageCollection(IDCollection):
+    def __init__(self):
+        super().__init__("images", Image)
+        self._images_by_path = {}
+
+    def new(self, name, width, height, **kwargs):
+        return super().new(name, width=width, height=height)
+
+    def load(self, filepath, check_existing=False):
+        """Return an image of filepath.
+
+        Only the image creation is modeled, the file is not read.
+        """
+        if check_existing and filepath in self._images_by_path:
+            get_recorder().record("bpy.data.images.load")
+            return self._images_by_path[filepath]
+        get_recorder().record("bpy.data.images.load", "images.load")
+        name = filepath.replace("\\", "/").rsplit("/", 1)[-1]
+        image = self._add(Image(name, filepath=filepath))
+        self._images_by_path[filepath] = image
+        return image
+
+    def remove(self, id_block, do_unlink=True, **kwargs):
+        super().remove(id_block, do_unlink)
+        self._images_by_path.pop(id_block.filepath, None)
+
+
+class BlendData:
+    def __init__(self):
+        self.objects = IDCollection("objects", Object)
+        self.meshes = IDCollection("meshes", Mesh)
+        self.cameras = IDCollection("cameras", Camera)
+        self.collections = IDCollection("collections", Collection)
+        self.images = ImageCollection()
+        self.materials = IDCollection("materials", Material)
+        self.node_groups = IDCollection("node_groups", NodeTree)
+        self.movieclips = IDCollection("movieclips", MovieClip)
+        self.actions = IDCollection("actions", Action)
+        self.filepath = ""
+
+
+class Scene(ID):
+    _type_name = "scenes"
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.collection = Collection("Scene Collection")
+        self.frame_start = 1
+        self.frame_end = 250
+        self.frame_current = 1
+        self.render = _Struct("Scene.render")
+        self.render.engine = "BLENDER_EEVEE_NEXT"
+        self.render.resolution_x = 1920
+        self.render.resolution_y = 1080
+        self.render.fps = 24
+
+
+class _LayerObjects:
+    def __init__(self):
+        self.active = None
+
+
+class ViewLayer:
+    def __init__(self):
+        self.objects = _LayerObjects()
+
+    def update(self):
+        get_recorder().record("ViewLayer.update")
+
+
+class Context:
+    def __init__(self):
+        self.scene = Scene("Scene")
+        self.collection = self.scene.collection
+        self.view_layer = ViewLayer()
+        self.preferences = _Struct("Context.preferences")
+        self.window_manager = _Struct("Context.window_manager")
+        self.object = None
+        self.window = None
+        self.screen = None
+        self.area = None
+        self.region = None
+
+    @contextlib.contextmanager
+    def temp_override(self, **kwargs):
+        yield
+
+
+data = BlendData()
+context = Context()
+
+
+def reset():
+    """Replace all data blocks with an empty file."""
+    global data, context
+    data = BlendData()
+    context = Context()
+
+
+class _Timers:
+    def __init__(self):
+        self._functions = {}
+
+    def register(self, function, first_interval=0.0, persistent=False):
+        self._functions[function] = first_interval
+
+    def unregister(self, function):
+        del self._functions[function]
+
+    def is_registered(self, function):
+        return function in self._functions
+
+
+app = _types.SimpleNamespace(
+    version=(4, 2, 0),
+    timers=_Timers(),
+    handlers=_Struct("bpy.app.handlers"),
+    background=True,
+)
+ops = _Struct("bpy.ops")
+utils = _types.SimpleNamespace(
+    register_class=lambda cls: None, unregister_class=lambda cls: None
+)
+
+
+def _create_property(property_type):
+    def create_property(**kwargs):
+        return (property_type, kwargs)
+
+    create_property.__name__ = property_type
+    return create_property
+
+
+props = _types.ModuleType("bpy.props")
+for _property_type in (
+    "BoolProperty",
+    "BoolVectorProperty",
+    "CollectionProperty",
+    "EnumProperty",
+    "FloatProperty",
+    "FloatVectorProperty",
+    "IntProperty",
+    "IntVectorProperty",
+    "PointerProperty",
+    "StringProperty",
+):
+    setattr(props, _property_type, _create_property(_property_type))
+
+
+class SpaceView3D:
+    """Stores the draw handlers, see :code:`fake_blender.draw_view3d()`."""
+
+    draw_handlers = {}
+
+    @classmethod
+    def draw_handler_add(cls, callback, args, region_type, draw_type):
+        get_recorder().record("SpaceView3D.draw_handler_add")
+        handle = object()
+        cls.draw_handlers[handle] = (callback, args)
+        return handle
+
+    @classmethod
+    def draw_handler_remove(cls, handle, region_type):
+        get_recorder().record("SpaceView3D.draw_handler_remove")
+        cls.draw_handlers.pop(handle, None)
+
+
+types = _types.ModuleType("bpy.types")
+for _type in (
+    ID,
+    Object,
+    Camera,
+    Mesh,
+    Image,
+    Material,
+    NodeTree,
+    MovieClip,
+    Collection,
+    Action,
+    FCurve,
+    Scene,
+    Context,
+    SpaceView3D,
+):
+    setattr(types, _type.__name__, _type)
+class Operator:
+    """Operator base class that records the reported messages."""
+
+    def __init__(self, *args, **kwargs):
+        self.reports = []
+
+    def report(self, report_type, message):
+        get_recorder().record("Operator.report")
+        self.reports.append((set(report_type), message))
+
+
+types.Operator = Operator
+for _type_name in (
+    "AddonPreferences",
+    "Menu",
+    "Panel",
+    "PropertyGroup",
+    "UIList",
+):
+    setattr(types, _type_name, type(_type_name, (), {}))
@@ -0,0 +1,64 @@
+"""Minimal stand-in of Blender's :code:`gpu` and :code:`gpu_extras` modules."""
+
+import types as _types
+
+from .recorder import get_recorder
+
+
+class Shader:
+    def __init__(self, name):
+        self.name = name
+
+    def bind(self):
+        get_recorder().record("GPUShader.bind")
+
+
+class Batch:
+    def __init__(self, num_vertices):
+        self.num_vertices = num_vertices
+
+    def draw(self, shader=None):
+        get_recorder().record("GPUBatch.draw")
+
+
+def from_builtin(shader_name, **kwargs):
+    get_recorder().record("gpu.shader.from_builtin")
+    return Shader(shader_name)
+
+
+def batch_for_shader(shader, batch_type, content, indices=None):
+    """Return a batch of content.
+
+    Only the upload of the vertex attributes is modeled.
+    """
+    num_vertices = len(next(iter(content.values())))
+    get_recorder().record(
+        "gpu_extras.batch.batch_for_shader",
+        "batch_for_shader",
+        size=num_vertices * len(content),
+    )
+    return Batch(num_vertices)
+
+
+class _State:
+    def __init__(self):
+        self._values = {"depth_mask": False, "depth_test": "NONE"}
+
+    def point_size_set(self, size):
+        self._values["point_size"] = size
+
+    def depth_mask_get(self):
+        return self._values["depth_mask"]
+
+    def depth_mask_set(self, value):
+        self._values["depth_mask"] = value
+
+    def depth_test_get(self):
+        return self._values["depth_test"]
+
+    def depth_test_set(self, value):
+        self._values["depth_test"] = value
+
+
+shader = _types.SimpleNamespace(from_builtin=from_builtin)
+state = _State()
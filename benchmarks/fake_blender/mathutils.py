@@ -0,0 +1,186 @@
+"""Minimal pure python stand-in of Blender's :code:`mathutils` module.
+
+Only the functionality used by the importer is implemented.
+"""
+
+import math
+
+import numpy as np
+
+
+class Vector:
+    def __init__(self, values=(0.0, 0.0, 0.0)):
+        self._values = [float(value) for value in values]
+
+    def __len__(self):
+        return len(self._values)
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return tuple(self._values[index])
+        return self._values[index]
+
+    def __setitem__(self, index, value):
+        self._values[index] = value
+
+    def __array__(self, dtype=None, copy=None):
+        return np.array(self._values, dtype=dtype)
+
+    def __repr__(self):
+        return f"Vector({tuple(self._values)})"
+
+    def __neg__(self):
+        return Vector(-value for value in self._values)
+
+    def __add__(self, other):
+        return Vector(a + b for a, b in zip(self._values, other))
+
+    def __sub__(self, other):
+        return Vector(a - b for a, b in zip(self._values, other))
+
+    def __mul__(self, scalar):
+        return Vector(value * scalar for value in self._values)
+
+    __rmul__ = __mul__
+
+    def copy(self):
+        return Vector(self._values)
+
+    def to_4d(self):
+        values = (self._values + [0.0, 0.0, 0.0])[:3]
+        return Vector(values + [1.0])
+
+
+class Quaternion:
+    def __init__(self, values=(1.0, 0.0, 0.0, 0.0)):
+        self._values = [float(value) for value in values]
+
+    def __len__(self):
+        return 4
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __getitem__(self, index):
+        return self._values[index]
+
+    def __array__(self, dtype=None, copy=None):
+        return np.array(self._values, dtype=dtype)
+
+    def __repr__(self):
+        return f"Quaternion({tuple(self._values)})"
+
+    def dot(self, other):
+        return sum(a * b for a, b in zip(self._values, other))
+
+    def negate(self):
+        self._values = [-value for value in self._values]
+
+
+class _MatrixColumns:
+    def __init__(self, matrix):
+        self._matrix = matrix
+
+    def __getitem__(self, index):
+        return Vector(row[index] for row in self._matrix._rows)
+
+    def __setitem__(self, index, values):
+        for row, value in zip(self._matrix._rows, values):
+            row[index] = float(value)
+
+
+class Matrix:
+    def __init__(self, rows=None):
+        if rows is None:
+            self._rows = [
+                [1.0 if row == col else 0.0 for col in range(4)]
+                for row in range(4)
+            ]
+        else:
+            self._rows = [[float(value) for value in row] for row in rows]
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __iter__(self):
+        return (Vector(row) for row in self._rows)
+
+    def __getitem__(self, index):
+        # Returns the row itself to support assignments like m[0][0:3] = v
+        return self._rows[index]
+
+    def __array__(self, dtype=None, copy=None):
+        return np.array(self._rows, dtype=dtype)
+
+    def __repr__(self):
+        return f"Matrix({self._rows})"
+
+    def __matmul__(self, other):
+        if isinstance(other, Matrix):
+            columns = list(zip(*other._rows))
+            return Matrix(
+                [
+                    [sum(a * b for a, b in zip(row, col)) for col in columns]
+                    for row in self._rows
+                ]
+            )
+        return Vector(
+            sum(a * b for a, b in zip(row, other)) for row in self._rows
+        )
+
+    @property
+    def col(self):
+        return _MatrixColumns(self)
+
+    def copy(self):
+        return Matrix(self._rows)
+
+    def transpose(self):
+        self._rows = [list(col) for col in zip(*self._rows)]
+
+    def to_translation(self):
+        return Vector(row[3] for row in self._rows[:3])
+
+    def to_quaternion(self):
+        """Return the rotation of the (normalized) 3x3 part."""
+        rotation = np.array(self._rows, dtype=float)[:3, :3]
+        rotation /= np.linalg.norm(rotation, axis=0)
+        trace = np.trace(rotation)
+        if trace > 0:
+            s = 2.0 * math.sqrt(trace + 1.0)
+            w = 0.25 * s
+            x = (rotation[2, 1] - rotation[1, 2]) / s
+            y = (rotation[0, 2] - rotation[2, 0]) / s
+            z = (rotation[1, 0] - rotation[0, 1]) / s
+        elif rotation[0, 0] > rotation[1, 1] and rotation[0, 0] > rotation[2, 2]:
+            s = 2.0 * math.sqrt(
+                1.0 + rotation[0, 0] - rotation[1, 1] - rotation[2, 2]
+            )
+            w = (rotation[2, 1] - rotation[1, 2]) / s
+            x = 0.25 * s
+            y = (rotation[0, 1] + rotation[1, 0]) / s
+            z = (rotation[0, 2] + rotation[2, 0]) / s
+        elif rotation[1, 1] > rotation[2, 2]:
+            s = 2.0 * math.sqrt(
+                1.0 + rotation[1, 1] - rotation[0, 0] - rotation[2, 2]
+            )
+            w = (rotation[0, 2] - rotation[2, 0]) / s
+            x = (rotation[0, 1] + rotation[1, 0]) / s
+            y = 0.25 * s
+            z = (rotation[1, 2] + rotation[2, 1]) / s
+        else:
+            s = 2.0 * math.sqrt(
+                1.0 + rotation[2, 2] - rotation[0, 0] - rotation[1, 1]
+            )
+            w = (rotation[1, 0] - rotation[0, 1]) / s
+            x = (rotation[0, 2] + rotation[2, 0]) / s
+            y = (rotation[1, 2] + rotation[2, 1]) / s
+            z = 0.25 * s
+        return Quaternion((w, x, y, z))
+
+    def to_scale(self):
+        rotation = np.array(self._rows, dtype=float)[:3, :3]
+        return Vector(np.linalg.norm(rotation, axis=0))
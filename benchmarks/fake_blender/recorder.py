@@ -0,0 +1,105 @@
+import threading
+from collections import Counter, defaultdict
+
+
+class CostModel:
+    """Modeled durations (in seconds) of expensive Blender API calls.
+
+    The fake modules do not perform the work of Blender. Instead, they add
+    the modeled duration of each expensive call to the recorder. The default
+    coefficients are rough estimates of the asymptotic behavior of Blender's
+    implementation (e.g. :code:`keyframe_insert()` recalculates the handles
+    of the whole F-Curve), which allows to compare the complexity of
+    different scene construction strategies. They are not measured Blender
+    timings.
+    """
+
+    DEFAULT_COEFFICIENTS = {
+        # Per inserted keyframe and channel, plus the handle recalculation
+        # of the existing keyframes of the F-Curve
+        "keyframe_insert": (5e-6, 2e-8),
+        # Per call, plus per vertex / edge / face
+        "from_pydata": (2e-5, 1.5e-7),
+        # Per call, plus per value
+        "foreach_set": (2e-6, 4e-9),
+        # Per call (reading the image header)
+        "images.load": (2e-4, 0.0),
+        # Per call, plus per vertex (upload to the gpu)
+        "batch_for_shader": (5e-5, 3e-8),
+        # Per call, plus per vertex
+        "mesh.validate": (5e-6, 2e-8),
+        "mesh.update": (5e-6, 1e-8),
+        # Per created data block (name lookup and sorting of the id list)
+        "data.new": (3e-6, 2e-9),
+    }
+
+    def __init__(self, **coefficients):
+        self.coefficients = dict(self.DEFAULT_COEFFICIENTS)
+        for name, value in coefficients.items():
+            if name not in self.coefficients:
+                raise ValueError(f"Unknown cost model entry: {name}")
+            self.coefficients[name] = tuple(value)
+
+    def get_cost(self, name, size=0, count=1):
+        """Return the modeled duration of count calls processing size
+        elements in total."""
+        base, per_element = self.coefficients.get(name, (0.0, 0.0))
+        return base * count + per_element * size
+
+
+class CallRecorder:
+    """Record the calls of the fake Blender modules and their modeled cost."""
+
+    def __init__(self, cost_model=None):
+        self.cost_model = cost_model or CostModel()
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Remove all recorded calls."""
+        with self._lock:
+            self.call_counts = Counter()
+            self.modeled_times = defaultdict(float)
+
+    def record(self, name, cost_name=None, size=0, count=1):
+        """Record a call of the API name.
+
+        If :code:`cost_name` is given, the modeled duration of the call is
+        added to the modeled time of the API. :code:`count` is the number of
+        internal operations (e.g. the channels of :code:`keyframe_insert()`).
+        """
+        with self._lock:
+            self.call_counts[name] += 1
+            if cost_name is not None:
+                self.modeled_times[name] += self.cost_model.get_cost(
+                    cost_name, size, count
+                )
+
+    def get_total_calls(self):
+        return sum(self.call_counts.values())
+
+    def get_total_modeled_time(self):
+        return sum(self.modeled_times.values())
+
+    def get_summary(self, max_calls=None):
+        """Return the recorded calls as json serializable dict."""
+        return {
+            "total_calls": self.get_total_calls(),
+            "modeled_s": self.get_total_modeled_time(),
+            "calls": dict(self.call_counts.most_common(max_calls)),
+            "modeled_times_s": dict(
+                sorted(
+                    self.modeled_times.items(),
+                    key=lambda item: item[1],
+                    reverse=True,
+                )
+            ),
+        }
+
+
+_recorder = CallRecorder()
+
+
+def get_recorder():
+    """Return the recorder shared by the fake modules."""
+    return _recorder
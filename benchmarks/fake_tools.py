@@ -0,0 +1,556 @@
+"""Stand-ins of the FFmpeg, Colmap and Glomap executables.
+
+The stand-ins accept the command lines of the pipeline operator, print log
+output in the format (and configurable volume) of the real tools, sleep for
+configurable durations and write dummy outputs in the expected layout (the
+frames in :code:`images/`, a :code:`database.db` with the Colmap schema and
+a model in :code:`sparse/0`).
+
+:code:`write_fake_executables()` writes a small executable script per tool
+that calls :code:`main()` with a json config.
+"""
+
+import json
+import os
+import sqlite3
+import stat
+import sys
+import time
+
+
+DEFAULT_CONFIG = {
+    # Number of frames written by the fake FFmpeg
+    "num_frames": 200,
+    # Sleep durations (in seconds) per frame / image / matched image / phase
+    "frame_duration": 0.0,
+    "feature_duration": 0.0,
+    "matching_duration": 0.0,
+    "mapper_phase_duration": 0.0,
+    "converter_duration": 0.0,
+    # Additional log lines per processed frame / image to stress the log pump
+    "extra_log_lines": 0,
+    "features_per_image": 256,
+    "num_points": 2000,
+    # Every n-th sequential pair gets too few inliers (0 disables weak links)
+    "weak_link_interval": 0,
+    # Name of a command (e.g. "mapper") that fails with exit code 1
+    "fail_command": None,
+}
+
+TOOL_NAMES = ("ffmpeg", "colmap", "glomap")
+
+# https://github.com/colmap/colmap/blob/main/src/colmap/scene/database.cc
+COLMAP_DATABASE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cameras (
+    camera_id INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+    model INTEGER NOT NULL,
+    width INTEGER NOT NULL,
+    height INTEGER NOT NULL,
+    params BLOB,
+    prior_focal_length INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS images (
+    image_id INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+    name TEXT NOT NULL UNIQUE,
+    camera_id INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS keypoints (
+    image_id INTEGER PRIMARY KEY NOT NULL,
+    rows INTEGER NOT NULL,
+    cols INTEGER NOT NULL,
+    data BLOB);
+CREATE TABLE IF NOT EXISTS descriptors (
+    image_id INTEGER PRIMARY KEY NOT NULL,
+    rows INTEGER NOT NULL,
+    cols INTEGER NOT NULL,
+    data BLOB);
+CREATE TABLE IF NOT EXISTS matches (
+    pair_id INTEGER PRIMARY KEY NOT NULL,
+    rows INTEGER NOT NULL,
+    cols INTEGER NOT NULL,
+    data BLOB);
+CREATE TABLE IF NOT EXISTS two_view_geometries (
+    pair_id INTEGER PRIMARY KEY NOT NULL,
+    rows INTEGER NOT NULL,
+    cols INTEGER NOT NULL,
+    data BLOB,
+    config INTEGER NOT NULL,
+    F BLOB,
+    E BLOB,
+    H BLOB,
+    qvec BLOB,
+    tvec BLOB);
+"""
+
+GLOMAP_PHASES = (
+    "Running view graph calibration ...",
+    "Running relative pose estimation ...",
+    "Running rotation averaging ...",
+    "Running track establishment ...",
+    "Running global positioning ...",
+    "Running bundle adjustment ...",
+    "Running retriangulation ...",
+    "Running postprocessing ...",
+)
+
+WIDTH = 1920
+HEIGHT = 1080
+
+
+def load_config(config_fp=None):
+    config = dict(DEFAULT_CONFIG)
+    if config_fp is not None:
+        with open(config_fp) as config_file:
+            config.update(json.load(config_file))
+    return config
+
+
+def _log(line):
+    print(line, flush=True)
+
+
+def _log_extra_lines(config, prefix):
+    for index in range(config["extra_log_lines"]):
+        _log(f"{prefix} [debug {index}]")
+
+
+def _get_option(args, name, default=None):
+    if name in args:
+        return args[args.index(name) + 1]
+    return default
+
+
+def _get_frame_names(images_dir):
+    return sorted(
+        name for name in os.listdir(images_dir)
+        if os.path.splitext(name)[1].lower() == ".jpg"
+    )
+
+
+def _write_raw_frames(output_path, num_frames, width, height):
+    """Write smooth gray frames with a moving gradient (and some noise)."""
+    import numpy as np
+
+    rng = np.random.default_rng(0)
+    x_coords = np.arange(width)[None, :]
+    y_coords = np.arange(height)[:, None]
+    with open(output_path, "wb") as output_file:
+        for index in range(num_frames):
+            frame = (x_coords * 2 + y_coords + index * 3) % 256
+            noise = rng.integers(0, 16, size=(height, width))
+            output_file.write(
+                np.clip(frame + noise, 0, 255).astype(np.uint8).tobytes()
+            )
+
+
+def run_ffmpeg(args, config):
+    """Extract frames like :code:`ffmpeg -stats -i <video> ... <pattern>`."""
+    video_path = _get_option(args, "-i")
+    if video_path is None or not os.path.isfile(video_path):
+        _log(f"{video_path}: No such file or directory")
+        return 1
+
+    num_frames = config["num_frames"]
+    frame_pattern = next(arg for arg in args if "%06d" in arg)
+    # Only the frames from -start_number on (extend mode)
+    start_number = int(_get_option(args, "-start_number", "1"))
+    for index in range(start_number, num_frames + 1):
+        time.sleep(config["frame_duration"])
+        with open(frame_pattern % index, "wb") as frame_file:
+            frame_file.write(b"\xff\xd8\xff\xe0 fake frame \xff\xd9")
+        seconds = index / 30.0
+        # FFmpeg overwrites its stats line with a carriage return
+        sys.stderr.write(
+            f"frame={index:5d} fps= 60 q=2.0 size=N/A "
+            f"time=00:00:{seconds:05.2f} bitrate=N/A speed=2.0x\r"
+        )
+        sys.stderr.flush()
+        _log_extra_lines(config, "ffmpeg")
+
+    # Additional raw outputs (thumbnails, previews): -vf scale=W:H... -f
+    # rawvideo <path>
+    for index, arg in enumerate(args):
+        if arg == "rawvideo" and args[index - 1] == "-f":
+            # The filter of an output precedes its path
+            filter_index = max(
+                filter_index
+                for filter_index, filter_arg in enumerate(args[:index])
+                if filter_arg == "-vf"
+            )
+            scale = args[filter_index + 1]
+            width, height = scale.split(",")[0][len("scale="):].split(":")[:2]
+            _write_raw_frames(
+                args[index + 1], num_frames, int(width), int(height)
+            )
+    sys.stderr.write("\n")
+    return 0
+
+
+def _open_database(database_path):
+    connection = sqlite3.connect(database_path)
+    connection.executescript(COLMAP_DATABASE_SCHEMA)
+    return connection
+
+
+def feature_extractor(args, config):
+    import numpy as np
+
+    database_path = _get_option(args, "--database_path")
+    images_dir = _get_option(args, "--image_path")
+    camera_model = _get_option(
+        args, "--ImageReader.camera_model", "SIMPLE_RADIAL"
+    )
+    frame_names = _get_frame_names(images_dir)
+    image_list_path = _get_option(args, "--image_list_path")
+    if image_list_path is not None:
+        with open(image_list_path) as image_list_file:
+            frame_names = image_list_file.read().split()
+    camera_id = _get_option(args, "--ImageReader.existing_camera_id")
+    num_features = config["features_per_image"]
+    rng = np.random.default_rng(0)
+
+    connection = _open_database(database_path)
+    with connection:
+        if camera_id is None:
+            connection.execute(
+                "INSERT INTO cameras VALUES (NULL, 2, ?, ?, ?, 0)",
+                (
+                    WIDTH,
+                    HEIGHT,
+                    np.array([2304.0, 960.0, 540.0, 0.0]).tobytes(),
+                ),
+            )
+            camera_id = connection.execute(
+                "SELECT MAX(camera_id) FROM cameras"
+            ).fetchone()[0]
+        for index, name in enumerate(frame_names):
+            time.sleep(config["feature_duration"])
+            cursor = connection.execute(
+                "INSERT OR REPLACE INTO images VALUES (NULL, ?, ?)",
+                (name, camera_id),
+            )
+            keypoints = rng.uniform(
+                0, WIDTH, size=(num_features, 6)
+            ).astype(np.float32)
+            connection.execute(
+                "INSERT OR REPLACE INTO keypoints VALUES (?, ?, 6, ?)",
+                (cursor.lastrowid, num_features, keypoints.tobytes()),
+            )
+            _log(f"Processed file [{index + 1}/{len(frame_names)}]")
+            _log(f"  Name:            {name}")
+            _log(f"  Dimensions:      {WIDTH} x {HEIGHT}")
+            _log(f"  Camera:          #{camera_id} - {camera_model}")
+            _log("  Focal length:    2304.00px")
+            _log(f"  Features:        {num_features}")
+            _log_extra_lines(config, "feature_extractor")
+    connection.close()
+    _log(f"Elapsed time: {0.0:.3f} [minutes]")
+    return 0
+
+
+def _write_matches(connection, pairs, config):
+    import numpy as np
+
+    from pipeline.database import image_ids_to_pair_id
+
+    rng = np.random.default_rng(1)
+    num_features = config["features_per_image"]
+    weak_link_interval = config["weak_link_interval"]
+    for image_id1, image_id2 in pairs:
+        num_inliers = int(rng.integers(num_features // 4, num_features // 2))
+        if (
+            weak_link_interval > 0
+            and abs(image_id2 - image_id1) == 1
+            and min(image_id1, image_id2) % weak_link_interval == 0
+        ):
+            num_inliers = 5
+        matches = np.stack(
+            [np.arange(num_inliers), np.arange(num_inliers)], axis=1
+        ).astype(np.uint32)
+        pair_id = int(image_ids_to_pair_id(image_id1, image_id2))
+        connection.execute(
+            "INSERT OR REPLACE INTO matches VALUES (?, ?, 2, ?)",
+            (pair_id, num_inliers, matches.tobytes()),
+        )
+        connection.execute(
+            "INSERT OR REPLACE INTO two_view_geometries "
+            "VALUES (?, ?, 2, ?, 2, NULL, NULL, NULL, NULL, NULL)",
+            (pair_id, num_inliers, matches.tobytes()),
+        )
+
+
+def _read_image_ids(connection):
+    rows = connection.execute("SELECT image_id, name FROM images").fetchall()
+    image_ids = [image_id for image_id, _ in sorted(rows, key=lambda row: row[1])]
+    name_to_image_id = {name: image_id for image_id, name in rows}
+    return image_ids, name_to_image_id
+
+
+def sequential_matcher(args, config):
+    database_path = _get_option(args, "--database_path")
+    overlap = int(_get_option(args, "--SequentialMatching.overlap", "10"))
+    connection = _open_database(database_path)
+    image_ids, _ = _read_image_ids(connection)
+    with connection:
+        for index, image_id in enumerate(image_ids):
+            time.sleep(config["matching_duration"])
+            pairs = [
+                (image_id, other_image_id)
+                for other_image_id in image_ids[index + 1 : index + 1 + overlap]
+            ]
+            _write_matches(connection, pairs, config)
+            _log(f"Matching image [{index + 1}/{len(image_ids)}] in 0.010s")
+            _log_extra_lines(config, "sequential_matcher")
+    connection.close()
+    return 0
+
+
+def matches_importer(args, config):
+    database_path = _get_option(args, "--database_path")
+    match_list_path = _get_option(args, "--match_list_path")
+    connection = _open_database(database_path)
+    _, name_to_image_id = _read_image_ids(connection)
+    with open(match_list_path) as match_list_file:
+        pairs = [
+            (name_to_image_id[names[0]], name_to_image_id[names[1]])
+            for names in (line.split() for line in match_list_file)
+            if len(names) == 2
+        ]
+    block_size = 50
+    num_blocks = max(1, (len(pairs) + block_size - 1) // block_size)
+    with connection:
+        for block_index in range(num_blocks):
+            time.sleep(config["matching_duration"])
+            _write_matches(
+                connection,
+                pairs[block_index * block_size : (block_index + 1) * block_size],
+                config,
+            )
+            _log(f"Matching block [{block_index + 1}/{num_blocks}]")
+            _log_extra_lines(config, "matches_importer")
+    connection.close()
+    return 0
+
+
+def model_converter(args, config):
+    from importer.read_write_model import read_model, write_model
+
+    input_path = _get_option(args, "--input_path")
+    output_path = _get_option(args, "--output_path")
+    output_ext = "." + _get_option(args, "--output_type", "BIN").lower()
+    time.sleep(config["converter_duration"])
+    cameras, images, points3D = read_model(input_path, ext=".bin")
+    write_model(cameras, images, points3D, output_path, ext=output_ext)
+    return 0
+
+
+def image_registrator(args, config):
+    """Add the images of the database that are missing in the model (with
+    the pose of the last registered image)."""
+    from importer.read_write_model import read_model, write_model
+
+    database_path = _get_option(args, "--database_path")
+    input_path = _get_option(args, "--input_path")
+    output_path = _get_option(args, "--output_path")
+    cameras, images, points3D = read_model(input_path, ext=".bin")
+    connection = _open_database(database_path)
+    rows = connection.execute(
+        "SELECT image_id, name, camera_id FROM images ORDER BY name"
+    ).fetchall()
+    connection.close()
+    last_image = images[max(images)]
+    for image_id, name, _ in rows:
+        time.sleep(config["matching_duration"])
+        if image_id not in images:
+            images[image_id] = last_image._replace(
+                id=image_id,
+                name=name,
+                xys=last_image.xys[:0],
+                point3D_ids=last_image.point3D_ids[:0],
+            )
+            _log(f"Registering image #{image_id} ({len(images)})")
+    write_model(cameras, images, points3D, output_path, ext=".bin")
+    return 0
+
+
+def bundle_adjuster(args, config):
+    from importer.read_write_model import read_model, write_model
+
+    input_path = _get_option(args, "--input_path")
+    output_path = _get_option(args, "--output_path")
+    time.sleep(config["converter_duration"])
+    cameras, images, points3D = read_model(input_path, ext=".bin")
+    write_model(cameras, images, points3D, output_path, ext=".bin")
+    return 0
+
+
+def point_triangulator(args, config):
+    """Add random points observed by the images of the input model, whose
+    ids must match the database."""
+    import numpy as np
+
+    from importer.read_write_model import read_model, write_model
+
+    from .synthetic_model import generate_synthetic_model
+
+    database_path = _get_option(args, "--database_path")
+    input_path = _get_option(args, "--input_path")
+    output_path = _get_option(args, "--output_path")
+    cameras, images, _ = read_model(input_path, ext=".bin")
+    connection = _open_database(database_path)
+    database_names = dict(
+        connection.execute("SELECT image_id, name FROM images").fetchall()
+    )
+    connection.close()
+    for image_id, image in images.items():
+        if database_names.get(image_id) != image.name:
+            _log(f"Image {image.name} (id {image_id}) is not in the database")
+            return 1
+
+    _log("Triangulating image points")
+    time.sleep(config["mapper_phase_duration"])
+    _, _, points3D = generate_synthetic_model(
+        num_images=len(images),
+        num_points=config["num_points"],
+        keypoints_per_image=config["features_per_image"],
+    )
+    image_ids = sorted(images)
+    points3D = {
+        point_id: point._replace(
+            image_ids=np.array(
+                [image_ids[index - 1] for index in point.image_ids]
+            )
+        )
+        for point_id, point in points3D.items()
+    }
+    write_model(cameras, images, points3D, output_path, ext=".bin")
+    return 0
+
+
+def mapper(args, config):
+    import numpy as np
+
+    from importer.read_write_model import write_model
+
+    from .synthetic_model import generate_synthetic_model
+
+    database_path = _get_option(args, "--database_path")
+    output_path = _get_option(args, "--output_path")
+    connection = _open_database(database_path)
+    rows = connection.execute(
+        "SELECT image_id, name FROM images ORDER BY name"
+    ).fetchall()
+    connection.close()
+    if len(rows) < 2:
+        _log("Not enough images to reconstruct")
+        return 1
+
+    _log("Loading database")
+    for phase in GLOMAP_PHASES:
+        _log(phase)
+        time.sleep(config["mapper_phase_duration"])
+        _log_extra_lines(config, "mapper")
+
+    cameras, images, points3D = generate_synthetic_model(
+        num_images=len(rows),
+        num_points=config["num_points"],
+        keypoints_per_image=config["features_per_image"],
+    )
+    # Use the image names and ids of the database
+    images = {
+        image_id: images[index + 1]._replace(id=image_id, name=name)
+        for index, (image_id, name) in enumerate(rows)
+    }
+    index_to_image_id = {
+        index + 1: image_id for index, (image_id, _) in enumerate(rows)
+    }
+    points3D = {
+        point_id: point._replace(
+            image_ids=np.array(
+                [index_to_image_id[index] for index in point.image_ids]
+            )
+        )
+        for point_id, point in points3D.items()
+    }
+    model_dir = os.path.join(output_path, "0")
+    os.makedirs(model_dir, exist_ok=True)
+    write_model(cameras, images, points3D, model_dir, ext=".bin")
+    _log(f"Reconstruction done in {0.0:.3f} seconds")
+    return 0
+
+
+COMMANDS = {
+    "ffmpeg": {None: run_ffmpeg},
+    "colmap": {
+        "feature_extractor": feature_extractor,
+        "sequential_matcher": sequential_matcher,
+        "matches_importer": matches_importer,
+        "model_converter": model_converter,
+        "image_registrator": image_registrator,
+        "bundle_adjuster": bundle_adjuster,
+        "point_triangulator": point_triangulator,
+    },
+    "glomap": {"mapper": mapper},
+}
+
+
+def main(tool_name, config_fp, args):
+    """Run a fake tool with the command line arguments args."""
+    config = load_config(config_fp)
+    commands = COMMANDS[tool_name]
+    if None in commands:
+        command_name, command = tool_name, commands[None]
+    elif len(args) > 0 and args[0] in commands:
+        command_name, command = args[0], commands[args[0]]
+        args = args[1:]
+    else:
+        _log(f"Unknown command: {args[:1]}")
+        return 1
+
+    if config["fail_command"] == command_name:
+        _log(f"{command_name}: simulated failure")
+        return 1
+    return command(args, config)
+
+
+EXECUTABLE_TEMPLATE = """#!{python}
+import sys
+sys.path.insert(0, {repository_dp!r})
+from benchmarks.fake_tools import main
+sys.exit(main({tool_name!r}, {config_fp!r}, sys.argv[1:]))
+"""
+
+
+def write_fake_executables(bin_dp, config=None):
+    """Write executable scripts of the fake tools and their config.
+
+    Returns a dict mapping the tool names to the executable paths.
+    """
+    os.makedirs(bin_dp, exist_ok=True)
+    config_fp = os.path.join(bin_dp, "fake_tools_config.json")
+    write_config(config_fp, config)
+    repository_dp = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    executable_paths = {}
+    for tool_name in TOOL_NAMES:
+        executable_path = os.path.join(bin_dp, tool_name)
+        with open(executable_path, "w") as executable_file:
+            executable_file.write(
+                EXECUTABLE_TEMPLATE.format(
+                    python=sys.executable,
+                    repository_dp=repository_dp,
+                    tool_name=tool_name,
+                    config_fp=config_fp,
+                )
+            )
+        os.chmod(
+            executable_path,
+            os.stat(executable_path).st_mode | stat.S_IXUSR | stat.S_IXGRP,
+        )
+        executable_paths[tool_name] = executable_path
+    return executable_paths
+
+
+def write_config(config_fp, config=None):
+    """Write the config read by the fake executables."""
+    full_config = dict(DEFAULT_CONFIG)
+    full_config.update(config or {})
+    with open(config_fp, "w") as config_file:
+        json.dump(full_config, config_file, indent=2)
@@ -0,0 +1,272 @@
+"""Benchmarks of the model parsing and point conversion of the importer.
+
+Run from the repository root, e.g.:
+
+    python -m benchmarks.parser_benchmarks --sizes 100:10000 1000:100000 \
+        --output results.json --baseline previous_results.json
+"""
+
+import argparse
+import logging
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+from importer.camera import Camera
+from importer.colmap_file_handler import ColmapFileHandler, read_array
+from importer.logger import logger
+from importer.point import Point
+from importer.read_write_model import CAMERA_MODEL_NAMES, read_model
+
+from . import fake_blender
+from .results import (
+    compare_results,
+    create_result,
+    create_skipped_result,
+    time_function,
+    write_results,
+)
+from .synthetic_model import write_synthetic_depth_map, write_synthetic_model
+
+
+SUITE = "parser"
+FORMATS = {"txt": ".txt", "bin": ".bin"}
+
+
+def _get_compute_transformed_coords():
+    # The draw manager requires Blender's bpy and gpu modules, which are
+    # replaced by the fake modules outside of Blender
+    if "bpy" not in sys.modules:
+        fake_blender.install()
+    try:
+        from importer.draw_manager import _compute_transformed_coords
+    except ImportError as e:
+        return None, str(e)
+    return _compute_transformed_coords, None
+
+
+def benchmark_model(model_dp, ext, repeats, case):
+    """Benchmark the parsing of a model and the conversion of its points."""
+    results = []
+    durations = time_function(lambda: read_model(model_dp, ext), repeats)
+    results.append(create_result(durations, name="read_model", **case))
+
+    def parse():
+        return ColmapFileHandler.parse_colmap_model_folder(
+            model_dp,
+            image_dp=model_dp,
+            image_fp_type=Camera.IMAGE_FP_TYPE_NAME,
+            suppress_distortion_warnings=True,
+        )
+
+    durations = time_function(parse, repeats)
+    results.append(
+        create_result(durations, name="parse_colmap_model_folder", **case)
+    )
+    return results, parse()
+
+
+def benchmark_points(points, repeats, case):
+    """Benchmark the conversions of parsed points."""
+    results = []
+    durations = time_function(
+        lambda: Point.split_points(points, normalize_colors=True), repeats
+    )
+    results.append(create_result(durations, name="split_points", **case))
+
+    compute_transformed_coords, error = _get_compute_transformed_coords()
+    if compute_transformed_coords is None:
+        results.append(
+            create_skipped_result(
+                error, name="compute_transformed_coords", **case
+            )
+        )
+        return results
+
+    coords, _ = Point.split_points(points)
+    matrix_world = np.identity(4)
+    matrix_world[:3, 3] = [1.0, 2.0, 3.0]
+    durations = time_function(
+        lambda: compute_transformed_coords(matrix_world, coords), repeats
+    )
+    results.append(
+        create_result(durations, name="compute_transformed_coords", **case)
+    )
+    return results
+
+
+def benchmark_depth_map(depth_map_fp, camera, width, height, repeats):
+    """Benchmark the back-projection of a depth map."""
+    camera.set_depth_map_callback(
+        read_array,
+        depth_map_fp,
+        Camera.DEPTH_MAP_WRT_CANONICAL_VECTORS,
+        shift_depth_map_to_pixel_center=False,
+    )
+    durations = time_function(
+        lambda: camera.convert_depth_map_to_world_coords(
+            depth_map_display_sparsity=1
+        ),
+        repeats,
+    )
+    return create_result(
+        durations,
+        suite=SUITE,
+        name="depth_map_back_projection",
+        depth_map_size=f"{width}x{height}",
+    )
+
+
+def run_benchmarks(
+    output_dp,
+    sizes,
+    formats,
+    num_cameras,
+    track_length,
+    keypoints_per_image,
+    camera_model,
+    depth_map_sizes,
+    repeats,
+):
+    """Generate the synthetic models and run all benchmarks."""
+    results = []
+    camera = None
+    for num_images, num_points in sizes:
+        for format_name in formats:
+            ext = FORMATS[format_name]
+            case = {
+                "suite": SUITE,
+                "format": format_name,
+                "num_images": num_images,
+                "num_points": num_points,
+                "num_cameras": num_cameras,
+                "track_length": track_length,
+                "keypoints_per_image": keypoints_per_image,
+                "camera_model": camera_model,
+            }
+            model_dp = os.path.join(
+                output_dp, f"{format_name}_{num_images}_{num_points}"
+            )
+            print(f"Benchmarking {model_dp}", file=sys.stderr)
+            write_synthetic_model(
+                model_dp,
+                ext,
+                num_images=num_images,
+                num_points=num_points,
+                num_cameras=num_cameras,
+                track_length=track_length,
+                keypoints_per_image=keypoints_per_image,
+                camera_model_name=camera_model,
+            )
+            model_results, (cameras, points) = benchmark_model(
+                model_dp, ext, repeats, case
+            )
+            results += model_results
+            camera = cameras[0]
+
+        # The point conversions do not depend on the file format
+        case = {
+            "suite": SUITE,
+            "num_images": num_images,
+            "num_points": num_points,
+        }
+        results += benchmark_points(points, repeats, case)
+
+    if camera is None:
+        return results
+    for width, height in depth_map_sizes:
+        depth_map_fp = write_synthetic_depth_map(
+            os.path.join(output_dp, f"depth_map_{width}x{height}.bin"),
+            width,
+            height,
+        )
+        results.append(
+            benchmark_depth_map(depth_map_fp, camera, width, height, repeats)
+        )
+    return results
+
+
+def _parse_size(size_str):
+    num_images, num_points = size_str.split(":")
+    return int(num_images), int(num_points)
+
+
+def _parse_resolution(resolution_str):
+    width, height = resolution_str.lower().split("x")
+    return int(width), int(height)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark the parsing of (synthetic) Colmap models."
+    )
+    parser.add_argument(
+        "--sizes",
+        nargs="+",
+        type=_parse_size,
+        default=[(100, 10000), (1000, 100000)],
+        help="Model sizes as <num_images>:<num_points>",
+    )
+    parser.add_argument(
+        "--formats", nargs="+", choices=sorted(FORMATS), default=["txt", "bin"]
+    )
+    parser.add_argument("--num-cameras", type=int, default=1)
+    parser.add_argument("--track-length", type=int, default=5)
+    parser.add_argument("--keypoints-per-image", type=int, default=2000)
+    parser.add_argument(
+        "--camera-model",
+        choices=sorted(CAMERA_MODEL_NAMES),
+        default="SIMPLE_RADIAL",
+    )
+    parser.add_argument(
+        "--depth-map-sizes",
+        nargs="*",
+        type=_parse_resolution,
+        default=[(640, 360), (1920, 1080)],
+        help="Depth map resolutions as <width>x<height>",
+    )
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument(
+        "--work-dir",
+        help="Directory for the synthetic models (default: temporary)",
+    )
+    parser.add_argument("--output", help="Json output file (default: stdout)")
+    parser.add_argument("--baseline", help="Json results of a previous run")
+    parser.add_argument(
+        "--max-slowdown",
+        type=float,
+        default=1.2,
+        help="Slowdown w.r.t. the baseline that is reported as regression",
+    )
+    args = parser.parse_args(argv)
+
+    # The importer logs each parsed model
+    logger.setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as temp_dp:
+        results = run_benchmarks(
+            args.work_dir or temp_dp,
+            args.sizes,
+            args.formats,
+            args.num_cameras,
+            args.track_length,
+            args.keypoints_per_image,
+            args.camera_model,
+            args.depth_map_sizes,
+            args.repeats,
+        )
+    write_results(results, args.output)
+
+    if args.baseline is not None:
+        regressions = compare_results(
+            results, args.baseline, args.max_slowdown
+        )
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,362 @@
+"""Benchmarks of the orchestration of the reconstruction pipeline.
+
+The pipeline runner (:code:`pipeline.runner`) runs end to end with the
+fake executables of :code:`benchmarks.fake_tools`. The benchmarks measure the orchestration
+overhead, the throughput of the log pump, the duration of a second run in
+the same working directory (resume / caching) and the cancellation latency.
+
+Run from the repository root (Linux / macOS), e.g.:
+
+    python -m benchmarks.pipeline_benchmarks --num-frames 100 1000 \
+        --output results.json --baseline previous_results.json
+"""
+
+import argparse
+import collections
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+from . import fake_blender
+
+from .fake_tools import write_config, write_fake_executables
+from .results import compare_results, create_result, write_results
+
+
+SUITE = "pipeline"
+VIDEO_NAME = "video"
+
+
+class _LineCounter:
+    """File like object that counts the printed lines and keeps the last
+    lines for error messages."""
+
+    def __init__(self, num_kept_lines=20):
+        self.num_lines = 0
+        self.last_lines = collections.deque(maxlen=num_kept_lines)
+
+    def write(self, text):
+        self.num_lines += text.count("\n")
+        self.last_lines.extend(line for line in text.splitlines() if line)
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+class FakeToolPipeline:
+    """Run the pipeline runner with the fake executables."""
+
+    def __init__(self, work_dp, **setting_values):
+        self.work_dp = work_dp
+        self.runner_module = fake_blender.import_addon_module(
+            "pipeline.runner"
+        )
+        executable_paths = write_fake_executables(os.path.join(work_dp, "bin"))
+        self.tool_paths = self.runner_module.ToolPaths(
+            executable_paths["ffmpeg"],
+            executable_paths["colmap"],
+            executable_paths["glomap"],
+        )
+        self.video_path = os.path.join(work_dp, VIDEO_NAME + ".mp4")
+        with open(self.video_path, "wb") as video_file:
+            video_file.write(b"fake video")
+        self.settings = self.runner_module.PipelineSettings(
+            video_path=self.video_path, **setting_values
+        )
+
+    @property
+    def working_dir(self):
+        return os.path.join(self.work_dp, "video_tracking", VIDEO_NAME)
+
+    def set_tool_config(self, config):
+        write_config(
+            os.path.join(self.work_dp, "bin", "fake_tools_config.json"), config
+        )
+
+    def remove_working_dir(self):
+        shutil.rmtree(self.working_dir, ignore_errors=True)
+
+    def create_runner(self, line_counter):
+        """Return a pipeline runner that writes its output to the counter."""
+
+        def write_line(text):
+            print(text, file=line_counter)
+
+        return self.runner_module.PipelineRunner(
+            self.settings,
+            self.tool_paths,
+            self.work_dp,
+            progress_callback=lambda progress: write_line(progress.message),
+            log_callback=write_line,
+            trace=True,
+        )
+
+    def run(self):
+        """Run the pipeline and return its duration, stages and log lines."""
+        line_counter = _LineCounter()
+        runner = self.create_runner(line_counter)
+        start = time.perf_counter()
+        succeeded = runner.run()
+        duration = time.perf_counter() - start
+        if not succeeded:
+            raise RuntimeError(
+                f"Pipeline failed: {runner.error}\n"
+                + "\n".join(line_counter.last_lines)
+            )
+        return duration, self.read_stage_durations(), line_counter.num_lines
+
+    def run_and_cancel(self, cancel_step, cancel_delay):
+        """Cancel the pipeline during a step and return the latency."""
+        runner = self.create_runner(_LineCounter())
+        thread = threading.Thread(target=runner.run)
+        thread.start()
+        # Wait until the process of the step is running
+        while (
+            runner.current_step < cancel_step
+            or runner._process is None
+            or runner._process.returncode is not None
+        ):
+            if not thread.is_alive():
+                raise RuntimeError("Pipeline finished before cancelling")
+            time.sleep(0.001)
+        time.sleep(cancel_delay)
+        start = time.perf_counter()
+        runner.cancel()
+        thread.join()
+        latency = time.perf_counter() - start
+        return latency, runner.current_step
+
+    def read_stage_durations(self):
+        """Return the durations of the traced stages of the last run."""
+        with open(os.path.join(self.working_dir, "trace.json")) as trace_file:
+            trace = json.load(trace_file)
+        stage_durations = {}
+        for event in trace["traceEvents"]:
+            if event.get("ph") != "X":
+                continue
+            key = (event.get("cat"), event["name"])
+            stage_durations[key] = (
+                stage_durations.get(key, 0.0) + event["dur"] * 1e-6
+            )
+        return stage_durations
+
+
+def _get_tool_sleep_duration(config, num_frames, num_images):
+    """Return the total configured sleep duration of the fake tools."""
+    return (
+        num_frames * config.get("frame_duration", 0.0)
+        + num_images * config.get("feature_duration", 0.0)
+        + num_images * config.get("matching_duration", 0.0)
+        + 8 * config.get("mapper_phase_duration", 0.0)
+        + 2 * config.get("converter_duration", 0.0)
+    )
+
+
+def benchmark_pipeline(runner, config, repeats, case):
+    """Benchmark complete pipeline runs and their orchestration overhead."""
+    runner.set_tool_config(config)
+    durations = []
+    for _ in range(repeats):
+        runner.remove_working_dir()
+        duration, stage_durations, num_lines = runner.run()
+        durations.append(duration)
+
+    num_images = len(os.listdir(os.path.join(runner.working_dir, "images")))
+    subprocess_duration = sum(
+        duration
+        for (category, _), duration in stage_durations.items()
+        if category == "subprocess"
+    )
+    result = create_result(durations, name="pipeline", **case)
+    result["num_log_lines"] = num_lines
+    result["stage_s"] = {
+        name: duration for (_, name), duration in stage_durations.items()
+    }
+    result["tool_sleep_s"] = _get_tool_sleep_duration(
+        config, case["num_frames"], num_images
+    )
+    # Process start, log pumping and the python stages between the tools
+    result["orchestration_overhead_s"] = durations[-1] - result["tool_sleep_s"]
+    result["in_process_s"] = durations[-1] - subprocess_duration
+    return result
+
+
+def benchmark_log_pump(runner, config, repeats, case):
+    """Benchmark the throughput of the log pump with verbose tools."""
+    runner.set_tool_config(config)
+    durations = []
+    throughputs = []
+    for _ in range(repeats):
+        runner.remove_working_dir()
+        _, stage_durations, num_lines = runner.run()
+        subprocess_duration = sum(
+            duration
+            for (category, _), duration in stage_durations.items()
+            if category == "subprocess"
+        )
+        durations.append(subprocess_duration)
+        throughputs.append(num_lines / subprocess_duration)
+    result = create_result(durations, name="log_pump", **case)
+    result["num_log_lines"] = num_lines
+    result["lines_per_s"] = max(throughputs)
+    return result
+
+
+def benchmark_rerun(runner, config, repeats, case):
+    """Benchmark a second run in the working directory of a previous run."""
+    runner.set_tool_config(config)
+    runner.remove_working_dir()
+    first_duration, _, _ = runner.run()
+    durations = []
+    for _ in range(repeats):
+        duration, _, _ = runner.run()
+        durations.append(duration)
+    result = create_result(durations, name="rerun", **case)
+    result["first_run_s"] = first_duration
+    result["rerun_ratio"] = result["median_s"] / first_duration
+    return result
+
+
+def benchmark_cancel(runner, config, repeats, case, cancel_delay=0.1):
+    """Benchmark the latency of cancelling the feature extraction."""
+    config = dict(config)
+    # Keep the feature extraction busy until it is cancelled
+    config["feature_duration"] = max(config.get("feature_duration", 0.0), 0.05)
+    runner.set_tool_config(config)
+    latencies = []
+    for _ in range(repeats):
+        runner.remove_working_dir()
+        latency, step = runner.run_and_cancel(2, cancel_delay)
+        latencies.append(latency)
+    result = create_result(latencies, name="cancel", **case)
+    result["cancelled_step"] = step
+    return result
+
+
+def run_benchmarks(
+    work_dp,
+    num_frames_list,
+    stage_duration,
+    extra_log_lines,
+    weak_link_interval,
+    repeats,
+    setting_values,
+):
+    """Run the pipeline benchmarks for each number of frames."""
+    runner = FakeToolPipeline(work_dp, **setting_values)
+    results = []
+    for num_frames in num_frames_list:
+        print(f"Benchmarking {num_frames} frames", file=sys.stderr)
+        case = {
+            "suite": SUITE,
+            "num_frames": num_frames,
+            "matching_mode": setting_values["matching_mode"],
+        }
+        config = {
+            "num_frames": num_frames,
+            "frame_duration": stage_duration / num_frames,
+            "feature_duration": stage_duration / num_frames,
+            "matching_duration": stage_duration / num_frames,
+            "mapper_phase_duration": stage_duration / 8,
+            "converter_duration": 0.0,
+            "weak_link_interval": weak_link_interval,
+        }
+        results.append(benchmark_pipeline(runner, config, repeats, case))
+        verbose_config = {
+            "num_frames": num_frames,
+            "extra_log_lines": extra_log_lines,
+            "weak_link_interval": weak_link_interval,
+        }
+        results.append(
+            benchmark_log_pump(runner, verbose_config, repeats, case)
+        )
+        results.append(benchmark_rerun(runner, config, repeats, case))
+        results.append(benchmark_cancel(runner, config, repeats, case))
+        for result in results[-4:]:
+            print(
+                f"  {result['name']}: {result['median_s']:.3f}s", file=sys.stderr
+            )
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark the pipeline orchestration with fake "
+        "FFmpeg, Colmap and Glomap executables."
+    )
+    parser.add_argument(
+        "--num-frames", nargs="+", type=int, default=[100, 1000]
+    )
+    parser.add_argument(
+        "--stage-duration",
+        type=float,
+        default=0.5,
+        help="Sleep duration (in seconds) of each fake tool",
+    )
+    parser.add_argument(
+        "--extra-log-lines",
+        type=int,
+        default=50,
+        help="Additional log lines per frame of the log pump benchmark",
+    )
+    parser.add_argument(
+        "--matching-mode",
+        choices=["SEQUENTIAL", "SIMILARITY"],
+        default="SEQUENTIAL",
+    )
+    parser.add_argument("--filter-frames", action="store_true")
+    parser.add_argument("--repair-weak-links", action="store_true")
+    parser.add_argument(
+        "--weak-link-interval",
+        type=int,
+        default=0,
+        help="Every n-th sequential pair of the fake matcher has too few "
+        "inliers (0: no weak links)",
+    )
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument(
+        "--work-dir", help="Directory for the pipeline runs (default: temporary)"
+    )
+    parser.add_argument("--output", help="Json output file (default: stdout)")
+    parser.add_argument("--baseline", help="Json results of a previous run")
+    parser.add_argument(
+        "--max-slowdown",
+        type=float,
+        default=1.2,
+        help="Slowdown w.r.t. the baseline that is reported as regression",
+    )
+    args = parser.parse_args(argv)
+
+    setting_values = {
+        "matching_mode": args.matching_mode,
+        "filter_frames": args.filter_frames,
+        "repair_weak_links": args.repair_weak_links,
+    }
+    with tempfile.TemporaryDirectory() as temp_dp:
+        results = run_benchmarks(
+            args.work_dir or temp_dp,
+            args.num_frames,
+            args.stage_duration,
+            args.extra_log_lines,
+            args.weak_link_interval,
+            args.repeats,
+            setting_values,
+        )
+    write_results(results, args.output)
+
+    if args.baseline is not None:
+        regressions = compare_results(
+            results, args.baseline, args.max_slowdown
+        )
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
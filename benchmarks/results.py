@@ -0,0 +1,139 @@
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+
+# Fields that identify a benchmark case across runs
+CASE_KEY_FIELDS = (
+    "suite",
+    "name",
+    "format",
+    "num_images",
+    "num_points",
+    "num_cameras",
+    "track_length",
+    "keypoints_per_image",
+    "camera_model",
+    "depth_map_size",
+    "num_frames",
+    "matching_mode",
+)
+
+
+def time_function(func, repeats=3):
+    """Return the durations (in seconds) of repeated calls of func.
+
+    The garbage collector is disabled during each call to reduce noise.
+    """
+    durations = []
+    for _ in range(repeats):
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            func()
+            durations.append(time.perf_counter() - start)
+        finally:
+            gc.enable()
+    return durations
+
+
+def create_result(durations, **case):
+    """Return a result record of a benchmark case."""
+    result = dict(case)
+    result["repeats"] = len(durations)
+    result["min_s"] = min(durations)
+    result["median_s"] = statistics.median(durations)
+    result["mean_s"] = statistics.mean(durations)
+    return result
+
+
+def create_skipped_result(reason, **case):
+    """Return a result record of a benchmark case that could not run."""
+    result = dict(case)
+    result["skipped"] = reason
+    return result
+
+
+def _get_git_revision():
+    repository_dp = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=repository_dp,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def get_metadata():
+    """Return information about the environment of a benchmark run."""
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_revision": _get_git_revision(),
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def write_results(results, output_fp=None):
+    """Write the results as json (to stdout, if no path is given)."""
+    report = {"metadata": get_metadata(), "results": results}
+    if output_fp is None:
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    else:
+        with open(output_fp, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+    return report
+
+
+def get_case_key(result):
+    """Return the key that identifies the case of a result record."""
+    return tuple(result.get(field) for field in CASE_KEY_FIELDS)
+
+
+def compare_results(results, baseline_fp, max_slowdown=1.2):
+    """Compare the results with a previous run.
+
+    Prints the ratio of the median durations of each case and returns the
+    cases that are slower than :code:`max_slowdown` times the baseline.
+    """
+    with open(baseline_fp) as baseline_file:
+        baseline = json.load(baseline_file)
+    baseline_results = {
+        get_case_key(result): result
+        for result in baseline["results"]
+        if "median_s" in result
+    }
+
+    regressions = []
+    for result in results:
+        baseline_result = baseline_results.get(get_case_key(result))
+        if baseline_result is None or "median_s" not in result:
+            continue
+        ratio = result["median_s"] / max(baseline_result["median_s"], 1e-12)
+        label = " ".join(
+            f"{field}={result[field]}"
+            for field in CASE_KEY_FIELDS
+            if result.get(field) is not None
+        )
+        flag = " REGRESSION" if ratio > max_slowdown else ""
+        print(f"{ratio:6.2f}x  {label}{flag}", file=sys.stderr)
+        if ratio > max_slowdown:
+            regressions.append(result)
+    return regressions
@@ -0,0 +1,217 @@
+"""Benchmarks of the scene construction of the importer outside of Blender.
+
+The scene construction runs against the fake Blender modules of
+:code:`benchmarks.fake_blender`. Each result contains the python side
+duration, the number of calls of each Blender API and the modeled duration of
+the expensive Blender APIs (see :code:`fake_blender.CostModel`).
+
+Run from the repository root, e.g.:
+
+    python -m benchmarks.scene_benchmarks --num-images 1000 10000 100000 \
+        --output results.json --baseline previous_results.json
+"""
+
+import argparse
+import gc
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from . import fake_blender
+
+# The fake modules must be registered before importing the importer modules
+fake_blender.install()
+
+from importer.camera import Camera
+from importer.camera_animation_utility import add_camera_animation
+from importer.camera_utility import add_cameras, draw_points
+from importer.colmap_file_handler import ColmapFileHandler
+from importer.logger import logger
+from importer.point_utility import add_points_as_mesh_vertices
+
+from .results import compare_results, create_result, write_results
+from .synthetic_model import generate_synthetic_model
+
+
+SUITE = "scene"
+
+
+def time_scene_function(func, repeats=3):
+    """Return the durations of repeated calls of func and the recorded calls
+    of the last call.
+
+    Each call starts with an empty scene.
+    """
+    recorder = fake_blender.get_recorder()
+    durations = []
+    for _ in range(repeats):
+        fake_blender.reset()
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            func(fake_blender.bpy.context.collection)
+            durations.append(time.perf_counter() - start)
+        finally:
+            gc.enable()
+    return durations, recorder.get_summary()
+
+
+def create_scene_result(durations, summary, **case):
+    """Return a result record with the python side and the modeled cost."""
+    result = create_result(durations, **case)
+    result["total_calls"] = summary["total_calls"]
+    result["modeled_s"] = summary["modeled_s"]
+    result["median_with_modeled_s"] = result["median_s"] + summary["modeled_s"]
+    result["calls"] = summary["calls"]
+    result["modeled_times_s"] = summary["modeled_times_s"]
+    return result
+
+
+def create_synthetic_scene_input(
+    image_dp, num_images, num_points, track_length, write_images
+):
+    """Return reconstructed cameras and points of a synthetic model."""
+    id_to_col_cameras, id_to_col_images, id_to_col_points3D = (
+        generate_synthetic_model(
+            num_images=num_images,
+            num_points=num_points,
+            track_length=track_length,
+            # Each image observes about track_length * num_points / num_images
+            # points
+            keypoints_per_image=max(
+                1, 2 * track_length * num_points // num_images
+            ),
+        )
+    )
+    cameras = ColmapFileHandler._convert_cameras(
+        id_to_col_cameras,
+        id_to_col_images,
+        image_dp,
+        Camera.IMAGE_FP_TYPE_NAME,
+        suppress_distortion_warnings=True,
+    )
+    points = ColmapFileHandler._convert_points(id_to_col_points3D)
+
+    if write_images:
+        # The image planes are only added for existing image files. The
+        # fake image loading does not read the files.
+        os.makedirs(image_dp, exist_ok=True)
+        for camera in cameras:
+            open(camera.get_absolute_fp(), "a").close()
+    return cameras, points
+
+
+def run_benchmarks(work_dp, num_images_list, points_per_image, repeats):
+    """Run the scene construction benchmarks for each number of images."""
+    results = []
+    for num_images in num_images_list:
+        num_points = num_images * points_per_image
+        print(
+            f"Benchmarking {num_images} images, {num_points} points",
+            file=sys.stderr,
+        )
+        cameras, points = create_synthetic_scene_input(
+            os.path.join(work_dp, f"images_{num_images}"),
+            num_images,
+            num_points,
+            track_length=5,
+            write_images=True,
+        )
+        case = {
+            "suite": SUITE,
+            "num_images": num_images,
+            "num_points": num_points,
+        }
+
+        benchmark_functions = {
+            "add_cameras": lambda collection: add_cameras(
+                cameras,
+                collection,
+                add_depth_maps_as_point_cloud=False,
+            ),
+            "add_cameras_with_image_planes": lambda collection: add_cameras(
+                cameras,
+                collection,
+                add_image_planes=True,
+                add_depth_maps_as_point_cloud=False,
+            ),
+            "add_camera_animation": lambda collection: add_camera_animation(
+                cameras, collection
+            ),
+            "add_points_as_mesh_vertices": (
+                lambda collection: add_points_as_mesh_vertices(
+                    points, collection
+                )
+            ),
+            "draw_points": lambda collection: (
+                draw_points(points, 5, True, collection),
+                fake_blender.draw_view3d(),
+            ),
+        }
+        for name, func in benchmark_functions.items():
+            durations, summary = time_scene_function(func, repeats)
+            result = create_scene_result(durations, summary, name=name, **case)
+            print(
+                f"  {name}: {statistics.median(durations):.3f}s python, "
+                f"{summary['modeled_s']:.3f}s modeled, "
+                f"{summary['total_calls']} calls",
+                file=sys.stderr,
+            )
+            results.append(result)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark the scene construction with fake Blender "
+        "modules."
+    )
+    parser.add_argument(
+        "--num-images",
+        nargs="+",
+        type=int,
+        default=[1000, 10000, 100000],
+        help="Number of reconstructed images (cameras)",
+    )
+    parser.add_argument("--points-per-image", type=int, default=10)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument(
+        "--work-dir",
+        help="Directory for the placeholder images (default: temporary)",
+    )
+    parser.add_argument("--output", help="Json output file (default: stdout)")
+    parser.add_argument("--baseline", help="Json results of a previous run")
+    parser.add_argument(
+        "--max-slowdown",
+        type=float,
+        default=1.2,
+        help="Slowdown w.r.t. the baseline that is reported as regression",
+    )
+    args = parser.parse_args(argv)
+
+    logger.setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as temp_dp:
+        results = run_benchmarks(
+            args.work_dir or temp_dp,
+            args.num_images,
+            args.points_per_image,
+            args.repeats,
+        )
+    write_results(results, args.output)
+
+    if args.baseline is not None:
+        regressions = compare_results(
+            results, args.baseline, args.max_slowdown
+        )
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,188 @@
+import os
+
+import numpy as np
+
+from importer.read_write_model import (
+    CAMERA_MODEL_NAMES,
+    Camera,
+    Image,
+    Point3D,
+    rotmat2qvec,
+    write_model,
+)
+
+
+# Camera models with a single focal length parameter
+SINGLE_FOCAL_LENGTH_MODELS = {
+    "SIMPLE_PINHOLE",
+    "SIMPLE_RADIAL",
+    "RADIAL",
+    "SIMPLE_RADIAL_FISHEYE",
+    "RADIAL_FISHEYE",
+}
+
+
+def get_camera_params(camera_model_name, width, height):
+    """Return plausible parameters (without distortion) of a camera model."""
+    num_params = CAMERA_MODEL_NAMES[camera_model_name].num_params
+    focal_length = 1.2 * max(width, height)
+    if camera_model_name in SINGLE_FOCAL_LENGTH_MODELS:
+        params = [focal_length]
+    else:
+        params = [focal_length, focal_length]
+    params += [width / 2.0, height / 2.0]
+    params += [0.0] * (num_params - len(params))
+    return np.array(params, dtype=float)
+
+
+def _compute_look_at_rotation(camera_center, target):
+    """Return the world to camera rotation of a camera looking at target."""
+    # Colmap cameras look along the positive z axis
+    z_axis = target - camera_center
+    z_axis /= np.linalg.norm(z_axis)
+    x_axis = np.cross(z_axis, [0.0, 0.0, 1.0])
+    x_axis /= np.linalg.norm(x_axis)
+    y_axis = np.cross(z_axis, x_axis)
+    return np.stack([x_axis, y_axis, z_axis])
+
+
+def _compute_observations(num_images, num_points, track_length, rng):
+    """Return the observing images of each point.
+
+    Like in a video, each point is observed by consecutive images.
+    """
+    track_length = min(track_length, num_images)
+    start_indices = rng.integers(
+        0, num_images - track_length + 1, size=num_points
+    )
+    return start_indices[:, None] + np.arange(track_length)[None, :]
+
+
+def generate_synthetic_model(
+    num_images,
+    num_points,
+    num_cameras=1,
+    track_length=5,
+    keypoints_per_image=1000,
+    camera_model_name="SIMPLE_RADIAL",
+    width=1920,
+    height=1080,
+    seed=0,
+):
+    """Generate a synthetic model in the representation of
+    :code:`read_write_model`.
+
+    The cameras move on a circle around the point cloud. Each point is
+    observed by :code:`track_length` consecutive images, as long as these
+    images have free keypoint slots. Returns cameras, images and points
+    (as dicts mapping ids to named tuples).
+    """
+    rng = np.random.default_rng(seed)
+    num_cameras = max(1, min(num_cameras, num_images))
+
+    cameras = {}
+    for camera_id in range(1, num_cameras + 1):
+        cameras[camera_id] = Camera(
+            id=camera_id,
+            model=camera_model_name,
+            width=width,
+            height=height,
+            params=get_camera_params(camera_model_name, width, height),
+        )
+
+    # Assign a keypoint slot to each observation. Observations of images
+    # without free slots are dropped.
+    observing_images = _compute_observations(
+        num_images, num_points, track_length, rng
+    )
+    flat_images = observing_images.ravel()
+    order = np.argsort(flat_images, kind="stable")
+    sorted_images = flat_images[order]
+    group_starts = np.searchsorted(sorted_images, np.arange(num_images))
+    slots = np.empty_like(flat_images)
+    slots[order] = np.arange(len(sorted_images)) - group_starts[sorted_images]
+    slots = slots.reshape(observing_images.shape)
+    is_valid = slots < keypoints_per_image
+
+    point3D_ids = np.full((num_images, keypoints_per_image), -1, dtype=np.int64)
+    point_indices = np.broadcast_to(
+        np.arange(num_points)[:, None], observing_images.shape
+    )
+    point3D_ids[observing_images[is_valid], slots[is_valid]] = (
+        point_indices[is_valid] + 1
+    )
+
+    images = {}
+    radius = 10.0
+    angles = np.linspace(0.0, np.pi, num_images)
+    for index in range(num_images):
+        camera_center = np.array(
+            [radius * np.cos(angles[index]), radius * np.sin(angles[index]), 1.0]
+        )
+        rotation = _compute_look_at_rotation(camera_center, np.zeros(3))
+        image_id = index + 1
+        images[image_id] = Image(
+            id=image_id,
+            qvec=rotmat2qvec(rotation),
+            tvec=-rotation.dot(camera_center),
+            camera_id=index * num_cameras // num_images + 1,
+            name=f"frame_{image_id:06d}.jpg",
+            xys=rng.uniform(
+                [0.0, 0.0], [width, height], size=(keypoints_per_image, 2)
+            ),
+            point3D_ids=point3D_ids[index],
+        )
+
+    coords = rng.uniform(-radius / 3.0, radius / 3.0, size=(num_points, 3))
+    colors = rng.integers(0, 256, size=(num_points, 3), dtype=np.uint8)
+    errors = rng.uniform(0.0, 2.0, size=num_points)
+    points3D = {}
+    for index in range(num_points):
+        point_id = index + 1
+        valid = is_valid[index]
+        points3D[point_id] = Point3D(
+            id=point_id,
+            xyz=coords[index],
+            rgb=colors[index],
+            error=errors[index],
+            image_ids=observing_images[index][valid] + 1,
+            point2D_idxs=slots[index][valid],
+        )
+    return cameras, images, points3D
+
+
+def write_synthetic_model(model_dp, ext, **kwargs):
+    """Generate a synthetic model and write it in the given format.
+
+    :code:`ext` is either :code:`.txt` or :code:`.bin`. See
+    :code:`generate_synthetic_model()` for the remaining parameters.
+    """
+    os.makedirs(model_dp, exist_ok=True)
+    cameras, images, points3D = generate_synthetic_model(**kwargs)
+    write_model(cameras, images, points3D, model_dp, ext)
+    return model_dp
+
+
+def write_array(array, path):
+    """Write a depth map in the format of :code:`Colmap` (see
+    :code:`read_array()`)."""
+    height, width = array.shape
+    with open(path, "wb") as fid:
+        fid.write(f"{width}&{height}&1&".encode("ascii"))
+        # Colmap stores the values column major with shape (width, height),
+        # which corresponds to the row major layout of (height, width).
+        np.ascontiguousarray(array, dtype=np.float32).tofile(fid)
+
+
+def write_synthetic_depth_map(path, width, height, seed=0):
+    """Write a smooth synthetic depth map with some noise."""
+    rng = np.random.default_rng(seed)
+    y_coords, x_coords = np.mgrid[0:height, 0:width]
+    depth_map = (
+        5.0
+        + np.sin(x_coords / width * np.pi)
+        + np.cos(y_coords / height * np.pi)
+        + rng.normal(0.0, 0.01, size=(height, width))
+    )
+    write_array(depth_map, path)
+    return path
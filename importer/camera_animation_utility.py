@@ -15,8 +15,11 @@ from .camera_utility import (
 
 from .camera import Camera
 from .logger import log_info, log_warning, log_error, log_debug
+from .tracing import traced
 
 
+ANIMATED_CAMERA_NAME = "Animated Camera"
+
 _CameraIntrinsics = namedtuple(
     "CameraIntrinsics", "field_of_view shift_x shift_y"
 )
@@ -151,7 +154,7 @@ def get_image_file_paths_in_dir(
 
 
 def _enhance_cameras_with_non_reconstructed_cameras(
-    cameras, image_dp, image_fp_type, op=None
+    cameras, image_dp, image_fp_type, rejected_image_dp=None, op=None
 ):
     rec_image_relative_fp = []
     for camera in cameras:
@@ -180,17 +183,52 @@ def _enhance_cameras_with_non_reconstructed_cameras(
         camera.has_undistorted_absolute_fp() for camera in cameras
     )
 
-    for non_rec_image_path in non_rec_image_relative_paths:
+    non_rec_image_dp_and_paths = [
+        (image_dp, image_path) for image_path in non_rec_image_relative_paths
+    ]
+
+    # Frames that have been removed before the reconstruction (e.g. blurry
+    # frames) are missing in the image directory, but not in the animation.
+    # A frame that is also in the image directory is only added once.
+    if rejected_image_dp is not None and os.path.isdir(rejected_image_dp):
+        rejected_image_relative_paths = get_image_file_paths_in_dir(
+            rejected_image_dp,
+            base_name_only=image_fp_type == Camera.IMAGE_FP_TYPE_NAME,
+            relative_path_only=image_fp_type == Camera.IMAGE_FP_TYPE_RELATIVE,
+            sort_result=True,
+            recursive=True,
+        )
+        known_image_names = {
+            os.path.basename(image_path)
+            for image_path in rec_image_relative_fp
+            + non_rec_image_relative_paths
+        }
+        rejected_image_relative_paths = [
+            image_path
+            for image_path in rejected_image_relative_paths
+            if os.path.basename(image_path) not in known_image_names
+        ]
+        log_info(
+            f"Adding {len(rejected_image_relative_paths)} rejected frames to"
+            " the animation",
+            op,
+        )
+        non_rec_image_dp_and_paths += [
+            (rejected_image_dp, image_path)
+            for image_path in rejected_image_relative_paths
+        ]
+
+    for non_rec_image_dp, non_rec_image_path in non_rec_image_dp_and_paths:
         cam = _NonReconstructedCamera()
         cam._relative_fp = non_rec_image_path
-        cam._absolute_fp = os.path.join(image_dp, cam._relative_fp)
+        cam._absolute_fp = os.path.join(non_rec_image_dp, cam._relative_fp)
         cam.image_fp_type = image_fp_type
-        cam.image_dp = image_dp
+        cam.image_dp = non_rec_image_dp
 
         if add_undistorted_paths:
             cam._undistorted_relative_fp = non_rec_image_path
             cam._undistorted_absolute_fp = os.path.join(
-                image_dp, cam._undistorted_relative_fp
+                non_rec_image_dp, cam._undistorted_relative_fp
             )
 
         cameras.append(cam)
@@ -259,7 +297,7 @@ def _set_fcurve_interpolation(some_obj, interpolation_type="LINEAR"):
             kf.interpolation = interpolation_type
 
 
-def _add_transformation_animation(
+def _iter_add_transformation_animation(
     animated_obj_name,
     transformations_sorted,
     number_interpolation_frames,
@@ -276,6 +314,7 @@ def _add_transformation_animation(
     animated_obj = bpy.data.objects[animated_obj_name]
 
     for index, transformation in enumerate(transformations_sorted):
+        yield
         # print('INFO', 'index: ' + str(index), op)
         # print('INFO', 'transformation: ' + str(transformation), op)
 
@@ -304,6 +343,9 @@ def _add_transformation_animation(
             frame=current_keyframe_index,
         )
 
+    # Process the keyframes once after inserting them. Processing them after
+    # each insertion results in a quadratic runtime.
+    if animated_obj.animation_data is not None:
         if remove_rotation_discontinuities:
             # q and -q represent the same rotation
             _remove_quaternion_discontinuities(animated_obj)
@@ -314,7 +356,7 @@ def _add_transformation_animation(
     log_info("Adding transformation animation: Done", op)
 
 
-def _add_camera_intrinsics_animation(
+def _iter_add_camera_intrinsics_animation(
     animated_obj_name, intrinsics_sorted, number_interpolation_frames, op=None
 ):
     log_info("Adding camera intrinsic parameter animation: ...", op)
@@ -323,6 +365,7 @@ def _add_camera_intrinsics_animation(
     animated_obj = bpy.data.objects[animated_obj_name]
 
     for index, intrinsics in enumerate(intrinsics_sorted):
+        yield
         current_keyframe_index = (index + 1) * step_size
 
         if intrinsics is None:
@@ -441,7 +484,125 @@ def _add_background_image_sequence(
         bg_img.clip = bpy.data.movieclips[movie_clip_name]
 
 
-def add_camera_animation(
+def _sort_cameras_by_frame_number(cameras):
+    return sorted(
+        cameras,
+        key=lambda camera: int(
+            "".join(filter(str.isdigit, camera.get_relative_fp()))
+        ),
+    )
+
+
+def _compute_keyframe_values(camera):
+    """Return the world matrix and the intrinsics of a camera (None for
+    non-reconstructed cameras)."""
+    if isinstance(camera, _NonReconstructedCamera):
+        return None, None
+    matrix_world = compute_camera_matrix_world(camera)
+    shift_x, shift_y = compute_principal_point_shift(
+        camera, relativ_to_largest_extend=True
+    )
+    camera_intrinsics = _CameraIntrinsics(
+        camera.get_field_of_view(), shift_x, shift_y
+    )
+    return matrix_world, camera_intrinsics
+
+
+def _insert_camera_keyframe(cam_obj, matrix_world, intrinsics, frame):
+    # A direct assignment of a numpy array leads to incorrect results!
+    cam_obj.matrix_world = Matrix(matrix_world)
+    cam_obj.rotation_mode = "QUATERNION"
+    cam_obj.keyframe_insert(data_path="location", index=-1, frame=frame)
+    cam_obj.keyframe_insert(
+        data_path="rotation_quaternion", index=-1, frame=frame
+    )
+    cam_obj.data.angle = intrinsics.field_of_view
+    cam_obj.data.shift_x = intrinsics.shift_x
+    cam_obj.data.shift_y = intrinsics.shift_y
+    for data_path in ["lens", "shift_x", "shift_y"]:
+        cam_obj.data.keyframe_insert(data_path=data_path, index=-1, frame=frame)
+
+
+def find_animated_camera():
+    """Return the most recently imported animated camera or None."""
+    names = [
+        obj.name
+        for obj in bpy.data.objects
+        if obj.type == "CAMERA"
+        and obj.name.split(".")[0] == ANIMATED_CAMERA_NAME
+    ]
+    if not names:
+        return None
+    # Blender appends .001, .002, ... to the names of later imports
+    return bpy.data.objects[max(names)]
+
+
+@traced("update_camera_animation")
+def update_camera_animation(
+    cam_obj,
+    cameras,
+    image_names,
+    animation_frame_source="ORIGINAL",
+    number_interpolation_frames=0,
+    interpolation_type="LINEAR",
+    remove_rotation_discontinuities=True,
+    image_dp=None,
+    image_fp_type=None,
+    rejected_image_dp=None,
+    op=None,
+):
+    """Add the keyframes of the given images to an animated camera.
+
+    The animated camera must have been created with
+    :code:`consider_missing_cameras_during_animation`, i.e. each image of
+    the image directory has a keyframe position, no matter whether it was
+    reconstructed. This allows to insert the keyframes of frames that have
+    been registered later without touching the other keyframes. Returns the
+    number of inserted keyframes.
+    """
+    if animation_frame_source == "ORIGINAL":
+        number_interpolation_frames = 0
+    image_names = set(image_names)
+    cameras = _enhance_cameras_with_non_reconstructed_cameras(
+        list(cameras), image_dp, image_fp_type, rejected_image_dp, op
+    )
+    step_size = number_interpolation_frames + 1
+    num_keyframes = 0
+    for index, camera in enumerate(_sort_cameras_by_frame_number(cameras)):
+        if os.path.basename(camera.get_relative_fp()) not in image_names:
+            continue
+        matrix_world, intrinsics = _compute_keyframe_values(camera)
+        if matrix_world is None:
+            continue
+        _insert_camera_keyframe(
+            cam_obj, matrix_world, intrinsics, (index + 1) * step_size
+        )
+        num_keyframes += 1
+
+    if num_keyframes > 0:
+        if remove_rotation_discontinuities:
+            _remove_quaternion_discontinuities(cam_obj)
+        if interpolation_type is not None:
+            _set_fcurve_interpolation(cam_obj, interpolation_type)
+    log_info(f"Updated {num_keyframes} keyframes of {cam_obj.name}", op)
+    return num_keyframes
+
+
+def add_camera_animation(*args, **kwargs):
+    """Add an animated camera from a set of reconstructed cameras.
+
+    See :code:`iter_add_camera_animation()` for the parameters.
+    """
+    iterator = iter_add_camera_animation(*args, **kwargs)
+    while True:
+        try:
+            next(iterator)
+        except StopIteration as stop:
+            return stop.value
+
+
+@traced("add_camera_animation")
+def iter_add_camera_animation(
     cameras,
     parent_collection,
     animation_frame_source="ORIGINAL",
@@ -453,9 +614,14 @@ def add_camera_animation(
     consider_missing_cameras_during_animation=False,
     image_dp=None,
     image_fp_type=None,
+    rejected_image_dp=None,
     op=None,
 ):
-    """Add an animated camera from a set of reconstructed cameras."""
+    """Add an animated camera step by step.
+
+    This generator yields before each keyframe is added and returns the
+    animated camera object.
+    """
     log_info("Adding Camera Animation: ...", op)
 
     if len(cameras) == 0:
@@ -470,44 +636,32 @@ def add_camera_animation(
 
     if consider_missing_cameras_during_animation:
         assert image_dp is not None and image_fp_type is not None
+        # Copy the list, since the non reconstructed cameras are appended
         cameras = _enhance_cameras_with_non_reconstructed_cameras(
-            cameras, image_dp, image_fp_type, op
+            list(cameras), image_dp, image_fp_type, rejected_image_dp, op
         )
 
     # Using the first reconstructed camera as template for the animated camera.
-    # The values are adjusted with _add_transformation_animation() and
-    # add_camera_intrinsics_animation().
+    # The values are adjusted with _iter_add_transformation_animation() and
+    # _iter_add_camera_intrinsics_animation().
     some_cam = cameras[0]
     cam_obj = add_camera_object(
-        some_cam, "Animated Camera", parent_collection, copy_matrix_world=False
+        some_cam,
+        ANIMATED_CAMERA_NAME,
+        parent_collection,
+        copy_matrix_world=False,
     )
 
-    cameras_sorted = sorted(
-        cameras,
-        key=lambda camera: int(
-            "".join(filter(str.isdigit, camera.get_relative_fp()))
-        ),
-    )
+    cameras_sorted = _sort_cameras_by_frame_number(cameras)
 
     transformations_sorted = []
     camera_intrinsics_sorted = []
     for camera in cameras_sorted:
-        if isinstance(camera, _NonReconstructedCamera):
-            matrix_world = None
-            camera_intrinsics = None
-        else:
-            matrix_world = compute_camera_matrix_world(camera)
-            shift_x, shift_y = compute_principal_point_shift(
-                camera, relativ_to_largest_extend=True
-            )
-            camera_intrinsics = _CameraIntrinsics(
-                camera.get_field_of_view(), shift_x, shift_y
-            )
-
+        matrix_world, camera_intrinsics = _compute_keyframe_values(camera)
         transformations_sorted.append(matrix_world)
         camera_intrinsics_sorted.append(camera_intrinsics)
 
-    _add_transformation_animation(
+    yield from _iter_add_transformation_animation(
         animated_obj_name=cam_obj.name,
         transformations_sorted=transformations_sorted,
         number_interpolation_frames=number_interpolation_frames,
@@ -516,7 +670,7 @@ def add_camera_animation(
         op=op,
     )
 
-    _add_camera_intrinsics_animation(
+    yield from _iter_add_camera_intrinsics_animation(
         animated_obj_name=cam_obj.name,
         intrinsics_sorted=camera_intrinsics_sorted,
         number_interpolation_frames=number_interpolation_frames,
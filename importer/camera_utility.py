@@ -16,6 +16,7 @@ from .object_utility import add_empty
 from.point import Point
 from .draw_manager import DrawManager
 from .logger import log_info, log_warning, log_error, log_debug
+from .tracing import traced
 
 
 class StopWatch(object):
@@ -70,7 +71,21 @@ def _draw_coords_with_color(
     return object_anchor_handle
 
 
-def draw_points(
+def draw_points(*args, **kwargs):
+    """Draw points using OpenGL.
+
+    See :code:`iter_draw_points()` for the parameters.
+    """
+    iterator = iter_draw_points(*args, **kwargs)
+    while True:
+        try:
+            next(iterator)
+        except StopIteration as stop:
+            return stop.value
+
+
+@traced("draw_points")
+def iter_draw_points(
     points,
     point_size,
     add_points_to_point_cloud_handle,
@@ -78,10 +93,16 @@ def draw_points(
     object_anchor_handle_name="OpenGL Point Cloud",
     op=None,
 ):
-    """Draw points using OpenGL."""
+    """Draw points using OpenGL step by step.
+
+    This generator yields after each chunk of points and returns the object
+    anchor handle.
+    """
     log_info("Add particle draw handlers", op)
 
-    coords, colors = Point.split_points(points, normalize_colors=True)
+    coords, colors = yield from Point.iter_split_points(
+        points, normalize_colors=True
+    )
     object_anchor_handle = _draw_coords_with_color(
         coords,
         colors,
@@ -331,9 +352,13 @@ def get_calibration_mat(blender_camera, op=None):
 
 
 def get_computer_vision_camera_transformation_matrix(
-    blender_camera, check_scale=True, op=None
+    blender_camera, check_scale=True, op=None, matrix_world=None
 ):
-    """Derive camera transformation matrix from a Blender camera."""
+    """Derive camera transformation matrix from a Blender camera.
+
+    :code:`matrix_world` replaces the world matrix of the camera (e.g. the
+    matrix of another frame).
+    """
 
     # Only if the objects have a scale of 1, the 3x3 part
     # of the corresponding matrix_world contains a pure rotation.
@@ -346,7 +371,9 @@ def get_computer_vision_camera_transformation_matrix(
         )
         assert False
 
-    camera_matrix = np.array(blender_camera.matrix_world)
+    if matrix_world is None:
+        matrix_world = blender_camera.matrix_world
+    camera_matrix = np.array(matrix_world)
     blender_camera_rotation_inverse = camera_matrix.copy()[0:3, 0:3]
     blender_camera_rotation = blender_camera_rotation_inverse.T
 
@@ -371,13 +398,18 @@ def get_computer_vision_camera(
     camera_index=None,
     check_scale=True,
     op=None,
+    matrix_world=None,
 ):
-    """Derive a camera object from a Blender camera object."""
+    """Derive a camera object from a Blender camera object.
+
+    :code:`matrix_world` replaces the world matrix of the camera (e.g. the
+    matrix of another frame).
+    """
 
     calibration_mat = get_calibration_mat(blender_camera)
     camera_matrix_computer_vision = (
         get_computer_vision_camera_transformation_matrix(
-            blender_camera, check_scale, op
+            blender_camera, check_scale, op, matrix_world
         )
     )
 
@@ -406,7 +438,17 @@ def load_background_image(blender_image, camera_name):
     background_image.frame_method = "CROP"
 
 
-def add_cameras(
+def add_cameras(*args, **kwargs):
+    """Add a set of reconstructed cameras to Blender's 3D view port.
+
+    See :code:`iter_add_cameras()` for the parameters.
+    """
+    for _ in iter_add_cameras(*args, **kwargs):
+        pass
+
+
+@traced("add_cameras")
+def iter_add_cameras(
     cameras,
     parent_collection,
     add_background_images=False,
@@ -426,7 +468,11 @@ def add_cameras(
     depth_map_id_or_name_str="",
     op=None,
 ):
-    """Add a set of reconstructed cameras to Blender's 3D view port."""
+    """Add a set of reconstructed cameras step by step.
+
+    This generator yields before each camera is added, which allows to
+    distribute the import over several time slices.
+    """
     log_info("Adding Cameras: ...", op)
     stop_watch = StopWatch()
     camera_collection = add_collection(
@@ -482,6 +528,7 @@ def add_cameras(
 
     # Adding cameras and image planes:
     for index, camera in enumerate(cameras):
+        yield
         # camera_name = "Camera %d" % index     # original code
         # Replace the camera name so it matches the image name (without extension)
         blender_image_name_stem = _get_camera_obj_gui_str(camera)
@@ -503,7 +550,8 @@ def add_cameras(
             log_debug("Could not find image at " + str(image_path), op)
             continue
 
-        blender_image = bpy.data.images.load(image_path)
+        # Reuse images loaded by a previous (e.g. preview) import
+        blender_image = bpy.data.images.load(image_path, check_existing=True)
 
         if add_background_images:
             load_background_image(blender_image, camera_name)
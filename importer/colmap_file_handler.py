@@ -13,6 +13,7 @@ from .read_write_model import (
 from .camera import Camera
 from .point import Point
 from .logger import log_info, log_warning, log_error, log_debug
+from .tracing import trace_span, traced
 
 
 # From photogrammetry_importer\ext\read_write_model.py
@@ -132,6 +133,7 @@ class ColmapFileHandler:
         return fx, fy, cx, cy, skew, r
 
     @staticmethod
+    @traced()
     def _convert_cameras(
         id_to_col_cameras,
         id_to_col_images,
@@ -217,6 +219,7 @@ class ColmapFileHandler:
         return cameras
 
     @staticmethod
+    @traced()
     def _convert_points(id_to_col_points3D):
         # From photogrammetry_importer\ext\read_write_model.py
         #   Point3D = collections.namedtuple(
@@ -282,9 +285,10 @@ class ColmapFileHandler:
 
         # cameras represent information about the camera model
         # images contain pose information
-        id_to_col_cameras, id_to_col_images, id_to_col_points3D = read_model(
-            model_idp, ext=ext
-        )
+        with trace_span("read_model", ext=ext):
+            id_to_col_cameras, id_to_col_images, id_to_col_points3D = (
+                read_model(model_idp, ext=ext)
+            )
 
         cameras = ColmapFileHandler._convert_cameras(
             id_to_col_cameras,
@@ -320,6 +324,7 @@ class ColmapFileHandler:
         return model_idp, image_idp, depth_map_idp, mesh_ifp
 
     @staticmethod
+    @traced()
     def parse_colmap_folder(
         idp,
         use_workspace_images,
@@ -362,8 +367,9 @@ class ColmapFileHandler:
         return cameras, points, mesh_ifp
 
     @staticmethod
-    def write_colmap_model(odp, cameras, points, camera_model="SIMPLE_PINHOLE", op=None):
-        """Write cameras and points as :code:`Colmap` model."""
+    def write_colmap_model(odp, cameras, points, camera_model="SIMPLE_PINHOLE", ext=".txt", op=None):
+        """Write cameras and points as :code:`Colmap` model (:code:`ext` is
+        :code:`.txt` or :code:`.bin`)."""
         log_info("Write Colmap model folder: " + odp, op)
 
         assert camera_model in [
@@ -435,5 +441,5 @@ class ColmapFileHandler:
             colmap_points3D[point.id] = colmap_point
 
         write_model(
-            colmap_cams, colmap_images, colmap_points3D, odp, ext=".txt"
+            colmap_cams, colmap_images, colmap_points3D, odp, ext=ext
         )
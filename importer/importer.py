@@ -1,5 +1,7 @@
 import os
+import time
 import logging
+from threading import Thread
 
 import bpy
 from bpy.props import StringProperty , BoolProperty, IntProperty, FloatProperty, EnumProperty, FloatVectorProperty
@@ -7,15 +9,20 @@ from bpy.types import Operator
 import math
 
 from .camera import Camera
-from .camera_utility import add_cameras ,adjust_render_settings_if_possible
-from .camera_animation_utility import add_camera_animation
-from .object_utility import add_collection
+from .camera_utility import add_cameras, iter_add_cameras ,adjust_render_settings_if_possible
+from .camera_animation_utility import find_animated_camera, iter_add_camera_animation, update_camera_animation
+from .object_utility import add_collection, remove_collection, remove_obj
+from .point import Point
 
 from .point_importer import PointImporter
 from .mesh_importer import MeshImporter
 from .general_options import GeneralOptions
 from .colmap_file_handler import ColmapFileHandler
 from .logger import log_info, log_warning, log_error, log_debug, logger
+from .tracing import begin_trace, end_trace
+
+# Yielded by the scene edits once the preview of a progressive import is built
+PREVIEW_COMPLETE = object()
 
 class ImportOperator(bpy.types.Operator):
     """Abstract basic import operator."""
@@ -57,6 +64,31 @@ class ImportOperator(bpy.types.Operator):
         ].preferences
         self._initialize_options(import_export_prefs)
 
+    def get_addon_preferences(self):
+        """Return the preferences of this addon (or None)."""
+        addon = bpy.context.preferences.addons.get(
+            __package__.rpartition(".")[0]
+        )
+        if addon is None:
+            return None
+        return addon.preferences
+
+    def begin_trace(self, trace_path):
+        """Start recording a trace, if enabled in the addon preferences."""
+        prefs = self.get_addon_preferences()
+        self._is_tracing = getattr(prefs, "enable_tracing", False)
+        if self._is_tracing:
+            begin_trace(trace_path, prefs.trace_memory)
+
+    def end_trace(self):
+        """Stop recording the trace started with :code:`begin_trace()`."""
+        if not self._is_tracing:
+            return
+        self._is_tracing = False
+        trace_path = end_trace()
+        if trace_path is not None:
+            log_info("Trace written to " + trace_path, self)
+
     def get_default_image_path(self, reconstruction_fp, image_dp):
         """Get the (default) path that defines where to look for images."""
         if image_dp is None:
@@ -112,6 +144,13 @@ class CameraImporter:
         # (i.e. nvm)
         default="",
     )
+    rejected_image_dp: StringProperty(
+        name="Rejected Image Directory",
+        description="Directory containing frames that have been removed "
+        "before the reconstruction (e.g. blurry frames). These frames are "
+        "treated as missing cameras during the animation",
+        default="",
+    )
     import_cameras: BoolProperty(
         name="Import Cameras", description="Import Cameras", default=True
     )
@@ -435,31 +474,113 @@ class CameraImporter:
             if not camera.has_principal_point():
                 camera.set_principal_point([default_pp_x, default_pp_y])
 
-    def import_photogrammetry_cameras(self, cameras, parent_collection):
-        """Import the cameras using the properties of this class."""
-        if not self.import_cameras and not self.add_camera_motion_as_animation:
-            return {"FINISHED"}
-
+    def _prepare_cameras(self, cameras):
+        """Complete the image sizes, intrinsics and principal points."""
         cameras, success = self.set_image_size_of_cameras(cameras)
         if not success:
-            return {"FINISHED"}
+            return cameras, success
 
         cameras, success = self.set_intrinsics_of_cameras(cameras)
         if not success:
-            return {"FINISHED"}
+            return cameras, success
 
         # The principal point may be part of the reconstruction data
         if not self.__class__._principal_points_initialized(cameras):
             self.__class__._set_principal_point_for_cameras(
                 cameras, self.default_pp_x, self.default_pp_y, self
             )
+        return cameras, success
 
-        if self.adjust_render_settings:
-            adjust_render_settings_if_possible(cameras, op=self)
+    def update_photogrammetry_cameras(self, cameras, image_names):
+        """Add the cameras of the given images to a previous import.
+
+        The keyframes of these images are inserted into the animated camera
+        of the previous import, the other keyframes are not changed. Returns
+        False, if there is no suitable animated camera (i.e. the model must
+        be imported completely).
+        """
+        cam_obj = find_animated_camera()
+        if cam_obj is None or not self.consider_missing_cameras_during_animation:
+            return False
+        # The other cameras would be added again
+        image_names = set(image_names)
+        cameras = [
+            camera
+            for camera in cameras
+            if os.path.basename(camera.get_relative_fp()) in image_names
+        ]
+        if not cameras:
+            return True
+        cameras, success = self._prepare_cameras(cameras)
+        if not success:
+            return True
 
         if self.import_cameras:
             add_cameras(
                 cameras,
+                cam_obj.users_collection[0],
+                add_background_images=self.add_background_images,
+                add_image_planes=self.add_image_planes,
+                add_depth_maps_as_point_cloud=False,
+                camera_collection_name="Registered Cameras",
+                camera_scale=self.camera_extent,
+                image_plane_transparency=self.image_plane_transparency,
+                add_image_plane_emission=self.add_image_plane_emission,
+                op=self,
+            )
+        if self.add_camera_motion_as_animation:
+            update_camera_animation(
+                cam_obj,
+                cameras,
+                image_names,
+                animation_frame_source=self.animation_frame_source,
+                number_interpolation_frames=self.number_interpolation_frames,
+                interpolation_type=self.interpolation_type,
+                remove_rotation_discontinuities=self.remove_rotation_discontinuities,
+                image_dp=self.image_dp,
+                image_fp_type=self.image_fp_type,
+                rejected_image_dp=self.rejected_image_dp or None,
+                op=self,
+            )
+        return True
+
+    def import_photogrammetry_cameras(self, cameras, parent_collection):
+        """Import the cameras using the properties of this class."""
+        for _ in self.iter_import_photogrammetry_cameras(
+            cameras, parent_collection
+        ):
+            pass
+        return {"FINISHED"}
+
+    def iter_import_photogrammetry_cameras(
+        self,
+        cameras,
+        parent_collection,
+        add_camera_objects=True,
+        add_animation=True,
+        camera_step=1,
+    ):
+        """Import the cameras step by step.
+
+        This generator yields before each camera and each keyframe is added.
+        If :code:`camera_step` is larger than one, only every n-th camera
+        object is added. The animation always uses all cameras.
+        """
+        add_camera_objects = add_camera_objects and self.import_cameras
+        add_animation = add_animation and self.add_camera_motion_as_animation
+        if not add_camera_objects and not add_animation:
+            return
+
+        cameras, success = self._prepare_cameras(cameras)
+        if not success:
+            return
+
+        if self.adjust_render_settings:
+            adjust_render_settings_if_possible(cameras, op=self)
+
+        if add_camera_objects:
+            yield from iter_add_cameras(
+                cameras[::camera_step],
                 parent_collection,
                 add_background_images=self.add_background_images,
                 add_image_planes=self.add_image_planes,
@@ -474,8 +595,8 @@ class CameraImporter:
                 op=self,
             )
 
-        if self.add_camera_motion_as_animation:
-            add_camera_animation(
+        if add_animation:
+            yield from iter_add_camera_animation(
                 cameras=cameras,
                 parent_collection=parent_collection,
                 animation_frame_source=self.animation_frame_source,
@@ -487,9 +608,9 @@ class CameraImporter:
                 consider_missing_cameras_during_animation=self.consider_missing_cameras_during_animation,
                 image_dp=self.image_dp,
                 image_fp_type=self.image_fp_type,
+                rejected_image_dp=self.rejected_image_dp or None,
                 op=self,
             )
-        return {"FINISHED"}
 
 
 class ImportColmapOperator(
@@ -499,7 +620,12 @@ class ImportColmapOperator(
     MeshImporter,
     GeneralOptions,
 ):
-    """:code:`Blender` operator to import a :code:`Colmap` model/workspace."""
+    """:code:`Blender` operator to import a :code:`Colmap` model/workspace.
+
+    In progressive mode, a decimated preview is built within a time budget
+    first. Afterwards, the preview is refined to full density in time slices
+    of bounded duration from :code:`bpy.app.timers`.
+    """
 
     bl_idname = "import_scene.open_video_tracker_colmap"
     bl_label = "Import Colmap Model Folder"
@@ -508,28 +634,59 @@ class ImportColmapOperator(
     directory: StringProperty()
     # filter_folder : BoolProperty(default=True, options={'HIDDEN'})
 
+    progressive_import: BoolProperty(
+        name="Progressive Import",
+        description="Import a decimated preview first and refine it to full "
+        "camera and point density in the background",
+        default=False,
+    )
+    preview_camera_step: IntProperty(
+        name="Preview Camera Step",
+        description="Only every n-th camera is added to the preview. The "
+        "animated camera always uses all cameras",
+        default=10,
+        min=1,
+    )
+    preview_voxel_size: FloatProperty(
+        name="Preview Voxel Size",
+        description="Size of the voxels used to subsample the preview point "
+        "cloud, relative to the largest extent of the point cloud",
+        default=0.01,
+        min=0.0001,
+        max=1.0,
+    )
+    preview_time_budget: FloatProperty(
+        name="Preview Time Budget",
+        description="Maximal time (in seconds) spent on the preview before "
+        "the import continues in the background",
+        default=2.0,
+        min=0.0,
+    )
+
+    update_image_names: StringProperty(
+        name="Update Image Names",
+        description="Only add the cameras of these images (separated by "
+        "';') to the previous import, e.g. after registering missing frames",
+        default="",
+        options={"HIDDEN"},
+    )
+
+    # Maximal duration (in seconds) of the scene edits per timer call
+    time_slice = 0.05
+
+    is_active = False
+    _progress = 0.0
+    _message = ""
+
     def execute(self, context):
         """Import a :code:`Colmap` model/workspace."""
-        # Get the suppress_distortion_warnings value from scene properties
-        suppress_warnings = context.scene.open_video_tracker.camera_importer.suppress_distortion_warnings
-
-        # Set console handler level based on suppress_distortion_warnings
-        # When True, only show warnings and errors; when False, show info and above
-        console_handler = None
-        for handler in logger.handlers:
-            if isinstance(handler, logging.StreamHandler):
-                console_handler = handler
-                break
-        if console_handler:
-            if suppress_warnings:
-                console_handler.setLevel(logging.WARNING)
-            else:
-                console_handler.setLevel(logging.INFO)
+        self.set_console_log_level(context)
 
         path = self.directory
         # Remove trailing slash
         path = os.path.dirname(path)
         log_info("path: " + str(path), self)
+        self.begin_trace(os.path.join(path, "import_trace.json"))
 
         self.image_dp = self.get_default_image_path(path, self.image_dp)
         cameras, points, mesh_ifp = ColmapFileHandler.parse_colmap_folder(
@@ -541,6 +698,23 @@ class ImportColmapOperator(
             self,
         )
 
+        if self.update_image_names:
+            image_names = self.update_image_names.split(";")
+            if self.update_photogrammetry_cameras(cameras, image_names):
+                self.end_trace()
+                return {"FINISHED"}
+            log_info("No animated camera to update, importing the model", self)
+
+        if self.progressive_import:
+            self.init_scene_edits(context)
+            self.start_scene_edits(cameras, points, mesh_ifp)
+            self.run_scene_edits(self.preview_time_budget, stop_at_preview=True)
+            if self._is_done:
+                return self.finish_scene_edits(context)
+            self.apply_general_options()
+            self.start_background_scene_edits(context)
+            return {"RUNNING_MODAL"}
+
         log_info("Number cameras: " + str(len(cameras)), self)
         log_info("Number points: " + str(len(points)), self)
         log_info("Mesh file path: " + str(mesh_ifp), self)
@@ -550,7 +724,244 @@ class ImportColmapOperator(
         self.import_photogrammetry_points(points, reconstruction_collection)
         self.import_photogrammetry_mesh(mesh_ifp, reconstruction_collection)
         self.apply_general_options()
+        self.end_trace()
+
+        return {"FINISHED"}
+
+    def set_console_log_level(self, context):
+        """Adjust the console log level to the distortion warning option."""
+        # Get the suppress_distortion_warnings value from scene properties
+        suppress_warnings = context.scene.open_video_tracker.camera_importer.suppress_distortion_warnings
+
+        # Set console handler level based on suppress_distortion_warnings
+        # When True, only show warnings and errors; when False, show info and above
+        console_handler = None
+        for handler in logger.handlers:
+            if isinstance(handler, logging.StreamHandler):
+                console_handler = handler
+                break
+        if console_handler:
+            if suppress_warnings:
+                console_handler.setLevel(logging.WARNING)
+            else:
+                console_handler.setLevel(logging.INFO)
+
+    def init_scene_edits(self, context):
+        """Reset the state of the step-wise scene edits."""
+        self._scene_edits = None
+        self._error = None
+        self._num_steps = 0
+        self._num_done_steps = 0
+        self._is_preview_complete = False
+        self._is_done = False
+        self._is_cancelled = False
+        self._reconstruction_collection = None
+        self._timer = None
+        self._window = context.window
+        # Timers are identified by the function object, i.e. the bound method
+        # must be created only once.
+        self._timer_function = self._apply_scene_edits
+
+    def _iter_progressive_scene_edits(self, cameras, points, mesh_ifp):
+        """Build a decimated preview and refine it in place."""
+        collection = self._reconstruction_collection
+
+        # The animated camera uses all cameras in the preview already
+        yield from self.iter_import_photogrammetry_cameras(
+            cameras, collection, add_camera_objects=False
+        )
+        collection_names = {child.name for child in collection.children}
+        yield from self.iter_import_photogrammetry_cameras(
+            cameras,
+            collection,
+            add_animation=False,
+            camera_step=self.preview_camera_step,
+        )
+        preview_collection_names = [
+            child.name
+            for child in collection.children
+            if child.name not in collection_names
+        ]
+        yield
+        object_names = {obj.name for obj in collection.objects}
+        preview_points = Point.get_voxel_subsampled_points(
+            points, self.preview_voxel_size
+        )
+        log_info(
+            f"Preview: {len(preview_points)} of {len(points)} points", self
+        )
+        yield from self.iter_import_photogrammetry_points(
+            preview_points, collection
+        )
+        preview_object_names = [
+            obj.name
+            for obj in collection.objects
+            if obj.name not in object_names
+        ]
+        yield PREVIEW_COMPLETE
+
+        # Replace the preview data, so that the collections are not
+        # duplicated. Images loaded for the preview are reused.
+        if self.preview_camera_step > 1:
+            for collection_name in preview_collection_names:
+                remove_collection(bpy.data.collections[collection_name])
+            yield from self.iter_import_photogrammetry_cameras(
+                cameras, collection, add_animation=False
+            )
+        yield
+        if len(preview_points) < len(points):
+            for object_name in preview_object_names:
+                remove_obj(bpy.data.objects[object_name])
+            yield from self.iter_import_photogrammetry_points(
+                points, collection
+            )
+        yield
+        self.import_photogrammetry_mesh(mesh_ifp, collection)
+
+    def _iter_scene_edits(self, cameras, points, mesh_ifp):
+        """Build the scene step by step."""
+        self._reconstruction_collection = add_collection(
+            "Reconstruction Collection"
+        )
+        if self.progressive_import:
+            yield from self._iter_progressive_scene_edits(
+                cameras, points, mesh_ifp
+            )
+            return
+
+        yield from self.iter_import_photogrammetry_cameras(
+            cameras, self._reconstruction_collection
+        )
+        yield
+        yield from self.iter_import_photogrammetry_points(
+            points, self._reconstruction_collection
+        )
+        yield
+        self.import_photogrammetry_mesh(
+            mesh_ifp, self._reconstruction_collection
+        )
+
+    def start_scene_edits(self, cameras, points, mesh_ifp):
+        """Create the generator of the step-wise scene edits."""
+        log_info("Number cameras: " + str(len(cameras)), self)
+        log_info("Number points: " + str(len(points)), self)
+        log_info("Mesh file path: " + str(mesh_ifp), self)
+
+        # One step per camera, per transformation and intrinsics keyframe,
+        # per chunk of points and one step for the mesh.
+        num_camera_steps = len(cameras) * self.import_cameras
+        num_point_steps = self.get_num_point_import_steps(len(points))
+        if self.progressive_import:
+            num_camera_steps += num_camera_steps // self.preview_camera_step
+            num_point_steps *= 2
+        self._num_steps = (
+            num_camera_steps
+            + 2 * len(cameras) * self.add_camera_motion_as_animation
+            + num_point_steps
+            + 4
+        )
+        self._scene_edits = self._iter_scene_edits(cameras, points, mesh_ifp)
+        if self.progressive_import:
+            ImportColmapOperator._message = "Building preview..."
+        else:
+            ImportColmapOperator._message = "Building scene..."
+
+    def run_scene_edits(self, duration, stop_at_preview=False):
+        """Apply scene edits for (approximately) the given duration."""
+        deadline = time.perf_counter() + duration
+        try:
+            with bpy.context.temp_override(window=self._window):
+                while time.perf_counter() < deadline:
+                    step = next(self._scene_edits)
+                    self._num_done_steps += 1
+                    if step is PREVIEW_COMPLETE:
+                        self._is_preview_complete = True
+                        ImportColmapOperator._message = "Refining..."
+                        if stop_at_preview:
+                            break
+        except StopIteration:
+            self._is_done = True
+        except Exception as e:
+            self._error = e
+            self._is_done = True
 
+        ImportColmapOperator._progress = min(
+            self._num_done_steps / max(self._num_steps, 1), 1.0
+        )
+
+    def _apply_scene_edits(self):
+        """Apply scene edits until the time slice is used up.
+
+        This function is called by :code:`bpy.app.timers`.
+        """
+        if self._is_cancelled or self._is_done:
+            return None
+        self.run_scene_edits(self.time_slice)
+        if self._is_done:
+            return None
+        # Return control to Blender, so that the user interface stays
+        # responsive between two time slices.
+        return 0.001
+
+    def start_background_scene_edits(self, context):
+        """Continue the scene edits in the background (see :code:`modal`)."""
+        ImportColmapOperator.is_active = True
+        wm = context.window_manager
+        wm.progress_begin(0, 100)
+        self._timer = wm.event_timer_add(0.1, window=context.window)
+        wm.modal_handler_add(self)
+        if self._scene_edits is not None:
+            bpy.app.timers.register(self._timer_function)
+
+    def modal(self, context, event):
+        """Monitor the background scene edits and handle cancellation."""
+        if event.type == "ESC":
+            self._is_cancelled = True
+            if self._is_preview_complete:
+                self.report({"WARNING"}, "Refinement cancelled")
+            else:
+                if self._reconstruction_collection is not None:
+                    remove_collection(self._reconstruction_collection)
+                self.report({"WARNING"}, "Import cancelled")
+            self.finish_scene_edits(context)
+            return {"CANCELLED"}
+
+        if event.type != "TIMER":
+            return {"PASS_THROUGH"}
+
+        if self._is_done:
+            return self.finish_scene_edits(context)
+
+        context.window_manager.progress_update(
+            int(100 * ImportColmapOperator._progress)
+        )
+        for area in context.screen.areas:
+            if area.type == "VIEW_3D":
+                area.tag_redraw()
+        return {"PASS_THROUGH"}
+
+    def finish_scene_edits(self, context):
+        """Clean up the state of the scene edits and return the result."""
+        if bpy.app.timers.is_registered(self._timer_function):
+            bpy.app.timers.unregister(self._timer_function)
+        wm = context.window_manager
+        if self._timer is not None:
+            wm.event_timer_remove(self._timer)
+            wm.progress_end()
+        ImportColmapOperator.is_active = False
+        ImportColmapOperator._progress = 0.0
+        for area in context.screen.areas:
+            if area.type == "VIEW_3D":
+                area.tag_redraw()
+        self.end_trace()
+
+        if self._is_cancelled:
+            return {"CANCELLED"}
+        if self._error is not None:
+            log_error(f"Import failed: {self._error}", self)
+            return {"CANCELLED"}
+        self.apply_general_options()
+        self.report({"INFO"}, "Import completed")
         return {"FINISHED"}
 
     def invoke(self, context, event):
@@ -562,6 +973,15 @@ class ImportColmapOperator(
         context.window_manager.fileselect_add(self)
         return {"RUNNING_MODAL"}
 
+    def draw_progressive_options(self, layout):
+        """Draw the options of the progressive import."""
+        progressive_box = layout.box()
+        progressive_box.prop(self, "progressive_import")
+        if self.progressive_import:
+            progressive_box.prop(self, "preview_camera_step")
+            progressive_box.prop(self, "preview_voxel_size")
+            progressive_box.prop(self, "preview_time_budget")
+
     def draw(self, context):
         """Draw the import options corresponding to this operator."""
         layout = self.layout
@@ -571,3 +991,71 @@ class ImportColmapOperator(
         self.draw_point_options(layout)
         self.draw_mesh_options(layout)
         self.draw_general_options(layout)
+        self.draw_progressive_options(layout)
+
+
+class ImportColmapAsyncOperator(ImportColmapOperator):
+    """Import a :code:`Colmap` model/workspace without blocking Blender.
+
+    The model is parsed on a worker thread. Afterwards, the scene is built
+    in time slices of bounded duration from :code:`bpy.app.timers`. The
+    import can be cancelled with ESC.
+    """
+
+    bl_idname = "import_scene.open_video_tracker_colmap_async"
+    bl_label = "Import Colmap Model Folder (Background)"
+
+    def execute(self, context):
+        """Start parsing the :code:`Colmap` model/workspace."""
+        self.set_console_log_level(context)
+
+        path = os.path.dirname(self.directory)
+        log_info("path: " + str(path), self)
+        self.begin_trace(os.path.join(path, "import_trace.json"))
+        self.image_dp = self.get_default_image_path(path, self.image_dp)
+
+        self.init_scene_edits(context)
+        self._parse_result = None
+
+        # The worker thread must not access Blender data. Thus, the
+        # properties are passed as arguments.
+        self._thread = Thread(
+            target=self._parse,
+            args=(
+                path,
+                self.use_workspace_images,
+                self.image_dp,
+                self.image_fp_type,
+                self.suppress_distortion_warnings,
+            ),
+        )
+        self._thread.daemon = True
+        self._thread.start()
+
+        ImportColmapOperator._progress = 0.0
+        ImportColmapOperator._message = "Parsing model..."
+        self.start_background_scene_edits(context)
+        return {"RUNNING_MODAL"}
+
+    def _parse(self, path, *args):
+        """Parse the model (runs on the worker thread)."""
+        try:
+            self._parse_result = ColmapFileHandler.parse_colmap_folder(
+                path, *args
+            )
+        except Exception as e:
+            self._error = e
+
+    def modal(self, context, event):
+        """Start the scene edits once the model has been parsed."""
+        if (
+            event.type == "TIMER"
+            and self._scene_edits is None
+            and not self._thread.is_alive()
+        ):
+            if self._error is None:
+                self.start_scene_edits(*self._parse_result)
+                bpy.app.timers.register(self._timer_function)
+            else:
+                self._is_done = True
+        return super().modal(context, event)
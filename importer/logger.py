@@ -1,5 +1,4 @@
 import logging
-import bpy
 import os
 
 # Create a custom logger
@@ -6,6 +6,7 @@ from .mesh_utility import (
     add_mesh_vertex_color_material,
 )
 from .logger import log_info, log_warning, log_error, log_debug
+from .tracing import traced
 
 
 class MeshImporter:
@@ -34,6 +35,7 @@ class MeshImporter:
         if self.import_mesh:
             mesh_box.prop(self, "add_mesh_color_emission")
 
+    @traced("import_mesh")
     def import_photogrammetry_mesh(self, mesh_fp, reconstruction_collection):
         """Import a mesh using the properties of this class."""
         if self.import_mesh and mesh_fp is not None:
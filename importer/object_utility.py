@@ -36,3 +36,20 @@ def add_collection(collection_name, parent_collection=None):
     parent_collection.children.link(new_collection)
 
     return new_collection
+
+
+def remove_obj(obj):
+    """Remove an object and its data (if not used otherwise)."""
+    data = obj.data
+    bpy.data.objects.remove(obj, do_unlink=True)
+    if isinstance(data, bpy.types.Mesh) and data.users == 0:
+        bpy.data.meshes.remove(data)
+
+
+def remove_collection(collection):
+    """Remove a collection including its objects and child collections."""
+    for child_collection in list(collection.children):
+        remove_collection(child_collection)
+    for obj in list(collection.objects):
+        remove_obj(obj)
+    bpy.data.collections.remove(collection)
@@ -1,6 +1,9 @@
 from collections import namedtuple
 import numpy as np
 
+# Number of points processed between two yields of the iter_* functions
+POINT_CHUNK_SIZE = 50000
+
 
 class Point(namedtuple("Point", ["coord", "color", "id", "scalars"])):
     """This class represents a three-dimensional point.
@@ -31,6 +34,26 @@ class Point(namedtuple("Point", ["coord", "color", "id", "scalars"])):
             colors.append(color_with_alpha)
         return coords, colors
 
+    @staticmethod
+    def iter_split_points(
+        points, normalize_colors=False, chunk_size=POINT_CHUNK_SIZE
+    ):
+        """Split points into coordinates and colors chunk by chunk.
+
+        This generator yields after each chunk and returns the coordinates
+        and colors of all points (see :code:`split_points()`).
+        """
+        coords = []
+        colors = []
+        for start in range(0, len(points), chunk_size):
+            chunk_coords, chunk_colors = Point.split_points(
+                points[start : start + chunk_size], normalize_colors
+            )
+            coords += chunk_coords
+            colors += chunk_colors
+            yield
+        return coords, colors
+
     @staticmethod
     def create_points(coords, colors, unnormalize_colors=False):
         if unnormalize_colors:
@@ -55,6 +78,29 @@ class Point(namedtuple("Point", ["coord", "color", "id", "scalars"])):
         )
         return centroid
 
+    @staticmethod
+    def iter_centered_points(points, chunk_size=POINT_CHUNK_SIZE):
+        """Center the points chunk by chunk.
+
+        This generator yields after each chunk and returns the mean free
+        points and the centroid (see :code:`get_centered_points()`).
+        """
+        coord_sum = np.zeros(3, dtype=float)
+        for start in range(0, len(points), chunk_size):
+            coord_sum += sum(
+                point.coord for point in points[start : start + chunk_size]
+            )
+            yield
+        centroid_coord = coord_sum / float(len(points))
+        mean_free_points = []
+        for start in range(0, len(points), chunk_size):
+            mean_free_points += [
+                point._replace(coord=point.coord - centroid_coord)
+                for point in points[start : start + chunk_size]
+            ]
+            yield
+        return mean_free_points, centroid_coord
+
     @staticmethod
     def get_centered_points(points):
         centroid_coord = Point._compute_centroid_coord(points)
@@ -68,3 +114,24 @@ class Point(namedtuple("Point", ["coord", "color", "id", "scalars"])):
             )
             mean_free_points.append(mean_free_point)
         return mean_free_points, centroid_coord
+
+    @staticmethod
+    def get_voxel_subsampled_points(points, relative_voxel_size):
+        """Return one point per occupied voxel.
+
+        The voxel size is given relative to the largest extent of the point
+        cloud. The order of the points is preserved.
+        """
+        if len(points) == 0:
+            return points
+        coords = np.array([point.coord for point in points], dtype=float)
+        min_coord = coords.min(axis=0)
+        extent = (coords.max(axis=0) - min_coord).max()
+        if extent == 0:
+            return points[:1]
+        voxel_size = relative_voxel_size * extent
+        voxel_indices = np.floor((coords - min_coord) / voxel_size).astype(
+            np.int64
+        )
+        _, first_indices = np.unique(voxel_indices, axis=0, return_index=True)
+        return [points[index] for index in np.sort(first_indices)]
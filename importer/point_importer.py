@@ -7,11 +7,11 @@ from bpy.props import (
     FloatProperty,
     FloatVectorProperty,
 )
-from .camera_utility import draw_points
+from .camera_utility import iter_draw_points
 from .point_utility import (
-    add_points_as_mesh_vertices,
+    iter_add_points_as_mesh_vertices,
 )
-from .point import Point
+from .point import POINT_CHUNK_SIZE, Point
 from .logger import log_info, log_warning, log_error, log_debug
 
 
@@ -106,17 +106,46 @@ class PointImporter:
 
     def import_photogrammetry_points(self, points, reconstruction_collection):
         """Import a point cloud using the properties of this class."""
+        for _ in self.iter_import_photogrammetry_points(
+            points, reconstruction_collection
+        ):
+            pass
+
+    def get_num_point_import_steps(self, num_points):
+        """Return the (approximate) number of steps of
+        :code:`iter_import_photogrammetry_points()`."""
+        if not self.import_points:
+            return 0
+        num_points //= max(self.point_cloud_display_sparsity, 1)
+        num_chunks = -(-num_points // POINT_CHUNK_SIZE)
+        num_passes = (
+            2 * self.center_points
+            + self.draw_points_with_gpu
+            + self.add_points_as_mesh_oject
+        )
+        return num_passes * num_chunks + 2 * self.add_points_as_mesh_oject
+
+    def iter_import_photogrammetry_points(
+        self, points, reconstruction_collection
+    ):
+        """Import a point cloud step by step.
+
+        This generator yields after each chunk of points, which allows to
+        distribute the import over several time slices.
+        """
         if self.import_points:
             if self.point_cloud_display_sparsity > 1:
                 points = points[:: self.point_cloud_display_sparsity]
 
-            if self.center_points:
-                points, centroid_shift = Point.get_centered_points(points)
+            if self.center_points and len(points) > 0:
+                points, centroid_shift = yield from Point.iter_centered_points(
+                    points
+                )
 
             obj_handle = None
 
             if self.draw_points_with_gpu:
-                obj_handle = draw_points(
+                obj_handle = yield from iter_draw_points(
                     points,
                     self.point_size,
                     self.add_points_to_point_cloud_handle,
@@ -125,7 +154,7 @@ class PointImporter:
                 )
 
             if self.add_points_as_mesh_oject:
-                obj_handle = add_points_as_mesh_vertices(
+                obj_handle = yield from iter_add_points_as_mesh_vertices(
                     points,
                     reconstruction_collection,
                     self.add_mesh_to_point_geometry_nodes,
@@ -135,6 +164,10 @@ class PointImporter:
                     op=self,
                 )
 
-            if self.center_points and obj_handle is not None:
+            if (
+                self.center_points
+                and len(points) > 0
+                and obj_handle is not None
+            ):
                 # store the xyz shift as custom property in the object handle
                 obj_handle["centroid_shift"] = centroid_shift
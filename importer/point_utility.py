@@ -9,6 +9,7 @@ from .object_utility import (
 )
 from .camera_utility import StopWatch
 from .logger import log_info, log_warning, log_error, log_debug
+from .tracing import traced
 
 
 def _copy_values_to_image(value_tripplets, image_name):
@@ -289,7 +290,21 @@ def create_geometry_nodes_node_group():
     return node_group
 
 
-def add_points_as_mesh_vertices(
+def add_points_as_mesh_vertices(*args, **kwargs):
+    """Add a point cloud as mesh.
+
+    See :code:`iter_add_points_as_mesh_vertices()` for the parameters.
+    """
+    iterator = iter_add_points_as_mesh_vertices(*args, **kwargs)
+    while True:
+        try:
+            next(iterator)
+        except StopIteration as stop:
+            return stop.value
+
+
+@traced("add_points_as_mesh_vertices")
+def iter_add_points_as_mesh_vertices(
     points,
     reconstruction_collection,
     add_mesh_to_point_geometry_nodes=True,
@@ -298,15 +313,22 @@ def add_points_as_mesh_vertices(
     add_color_as_custom_property=True,
     op=None,
 ):
-    """Add a point cloud as mesh."""
+    """Add a point cloud as mesh step by step.
+
+    This generator yields after each chunk of points and after each
+    expensive step. It returns the point cloud object.
+    """
     log_info("Adding Points as Mesh: ...", op)
     stop_watch = StopWatch()
     point_cloud_obj_name = "Mesh Point Cloud"
     point_cloud_mesh = bpy.data.meshes.new(point_cloud_obj_name)
     point_cloud_mesh.update()
     point_cloud_mesh.validate()
-    coords, colors = Point.split_points(points, normalize_colors=False)
+    coords, colors = yield from Point.iter_split_points(
+        points, normalize_colors=False
+    )
     point_cloud_mesh.from_pydata(coords, [], [])
+    yield
     point_cloud_obj = add_obj(
         point_cloud_mesh, point_cloud_obj_name, reconstruction_collection
     )
@@ -316,6 +338,7 @@ def add_points_as_mesh_vertices(
             name="point_color", type="FLOAT_COLOR", domain="POINT"
         )
         _add_colors_to_vertices(point_cloud_mesh, colors, "point_color")
+        yield
 
         geometry_nodes = point_cloud_obj.modifiers.new(
             "GeometryNodes", "NODES"
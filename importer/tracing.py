@@ -0,0 +1,278 @@
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import namedtuple
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+
+class Span(
+    namedtuple(
+        "Span",
+        [
+            "name",
+            "category",
+            "start",
+            "wall_time",
+            "cpu_time",
+            "child_cpu_time",
+            "memory_peak",
+            "thread_id",
+            "depth",
+            "args",
+        ],
+    )
+):
+    """This class represents a measured (and finished) span.
+
+    Times are given in seconds, :code:`start` is relative to the begin of
+    the trace. :code:`cpu_time` is the CPU time of the calling thread and
+    :code:`child_cpu_time` the CPU time of child processes that terminated
+    during the span (e.g. :code:`COLMAP`). :code:`memory_peak` is the peak of
+    the memory traced by :code:`tracemalloc` (in bytes) or None.
+    """
+
+
+def _get_child_cpu_time():
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+class _OpenSpan:
+    """Bookkeeping of a span that has not been finished yet."""
+
+    def __init__(self, name, category, args, start, cpu_start, memory_start):
+        self.name = name
+        self.category = category
+        self.args = args
+        self.start = start
+        self.cpu_start = cpu_start
+        self.child_cpu_start = _get_child_cpu_time()
+        self.memory_start = memory_start
+        self.memory_peak = memory_start
+
+
+class Tracer:
+    """Class that collects hierarchical spans of a single run."""
+
+    def __init__(self, trace_memory=False):
+        self.spans = []
+        self.trace_memory = trace_memory
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._started_tracemalloc = False
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+
+    def close(self):
+        """Stop the memory tracing (if started by this tracer)."""
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    def _get_stack(self):
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def _memory_tracing_enabled(self):
+        return self.trace_memory and tracemalloc.is_tracing()
+
+    def begin_span(self, name, category="", args=None):
+        """Open a span on the calling thread."""
+        stack = self._get_stack()
+        memory_start = None
+        if self._memory_tracing_enabled():
+            current, peak = tracemalloc.get_traced_memory()
+            # The peak is reset for each span, i.e. it must be propagated to
+            # the enclosing span.
+            if stack and stack[-1].memory_peak is not None:
+                stack[-1].memory_peak = max(stack[-1].memory_peak, peak)
+            tracemalloc.reset_peak()
+            memory_start = current
+        open_span = _OpenSpan(
+            name,
+            category,
+            dict(args or {}),
+            time.perf_counter(),
+            time.thread_time(),
+            memory_start,
+        )
+        stack.append(open_span)
+        return open_span
+
+    def end_span(self, open_span):
+        """Close the given span, which must be the innermost open span."""
+        end = time.perf_counter()
+        cpu_end = time.thread_time()
+        stack = self._get_stack()
+        if stack and stack[-1] is open_span:
+            stack.pop()
+        elif open_span in stack:
+            stack.remove(open_span)
+
+        memory_peak = None
+        if open_span.memory_start is not None and tracemalloc.is_tracing():
+            _, peak = tracemalloc.get_traced_memory()
+            open_span.memory_peak = max(open_span.memory_peak, peak)
+            memory_peak = open_span.memory_peak - open_span.memory_start
+            if stack and stack[-1].memory_peak is not None:
+                stack[-1].memory_peak = max(
+                    stack[-1].memory_peak, open_span.memory_peak
+                )
+
+        span = Span(
+            name=open_span.name,
+            category=open_span.category,
+            start=open_span.start - self._origin,
+            wall_time=end - open_span.start,
+            cpu_time=cpu_end - open_span.cpu_start,
+            child_cpu_time=_get_child_cpu_time() - open_span.child_cpu_start,
+            memory_peak=memory_peak,
+            thread_id=threading.get_ident(),
+            depth=len(stack),
+            args=open_span.args,
+        )
+        with self._lock:
+            self.spans.append(span)
+        return span
+
+    def get_chrome_trace(self):
+        """Return the spans in the Chrome trace event format.
+
+        The result can be viewed with :code:`chrome://tracing` or
+        :code:`https://ui.perfetto.dev`.
+        """
+        pid = os.getpid()
+        events = []
+        with self._lock:
+            spans = list(self.spans)
+        for span in spans:
+            args = dict(span.args)
+            args["cpu_time_ms"] = round(span.cpu_time * 1e3, 3)
+            if span.child_cpu_time > 0:
+                args["child_cpu_time_ms"] = round(span.child_cpu_time * 1e3, 3)
+            if span.memory_peak is not None:
+                args["memory_peak_kb"] = round(span.memory_peak / 1024, 1)
+            events.append(
+                {
+                    "name": span.name,
+                    "cat": span.category,
+                    "ph": "X",
+                    "ts": round(span.start * 1e6, 1),
+                    "dur": round(span.wall_time * 1e6, 1),
+                    "pid": pid,
+                    "tid": span.thread_id,
+                    "args": args,
+                }
+            )
+        events.sort(key=lambda event: event["ts"])
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write_chrome_trace(self, trace_path):
+        """Write the spans as Chrome trace json file."""
+        with open(trace_path, "w") as trace_file:
+            json.dump(self.get_chrome_trace(), trace_file)
+
+
+_tracer = None
+_trace_path = None
+_num_trace_users = 0
+_trace_lock = threading.Lock()
+
+
+def get_tracer():
+    """Return the active tracer (or None)."""
+    return _tracer
+
+
+def begin_trace(trace_path, trace_memory=False):
+    """Start recording spans.
+
+    Nested calls (e.g. an import started by the pipeline) share the active
+    trace. The trace is written to the path of the outermost call, once all
+    callers have called :code:`end_trace()`.
+    """
+    global _tracer, _trace_path, _num_trace_users
+    with _trace_lock:
+        if _tracer is None:
+            _tracer = Tracer(trace_memory)
+            _trace_path = trace_path
+        _num_trace_users += 1
+
+
+def end_trace():
+    """Stop recording spans and return the path of the written trace.
+
+    Returns None, if the trace is still used by another caller.
+    """
+    global _tracer, _trace_path, _num_trace_users
+    with _trace_lock:
+        if _tracer is None:
+            return None
+        _num_trace_users -= 1
+        if _num_trace_users > 0:
+            return None
+        tracer, trace_path = _tracer, _trace_path
+        _tracer, _trace_path = None, None
+    tracer.close()
+    tracer.write_chrome_trace(trace_path)
+    return trace_path
+
+
+@contextmanager
+def trace_span(name, category="", **args):
+    """Measure the enclosed code as span of the active trace.
+
+    This is a no-op, if no trace is active.
+    """
+    tracer = _tracer
+    if tracer is None:
+        yield
+        return
+    open_span = tracer.begin_span(name, category, args)
+    try:
+        yield
+    finally:
+        tracer.end_span(open_span)
+
+
+def traced(name=None, category=""):
+    """Decorator that measures each call of a function as span.
+
+    For generator functions the span covers the whole iteration.
+    """
+
+    def decorator(func):
+        span_name = name or func.__name__
+
+        if inspect.isgeneratorfunction(func):
+
+            @functools.wraps(func)
+            def generator_wrapper(*args, **kwargs):
+                with trace_span(span_name, category):
+                    return (yield from func(*args, **kwargs))
+
+            return generator_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with trace_span(span_name, category):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
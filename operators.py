@@ -1,15 +1,23 @@
-from threading import Thread
 import bpy
 import os
-import subprocess
+import sqlite3
 from .properties import OpenVideoTrackerProperties
+from .pipeline.database import compute_database_statistics
+from .pipeline.job_queue import SUCCEEDED
+from .pipeline.known_poses import KNOWN_POSES_DIR_NAME
+from .pipeline.runner import BackgroundPipeline, PipelineRunner, PipelineSettings, ToolPaths
+from .importer.importer import ImportColmapOperator
 from .utils import (
     get_addon_preferences, 
-    create_working_directory, 
+    clear_run_estimates,
+    get_artifact_cache,
+    get_history_path,
+    get_job_queue,
+    get_task_client,
+    get_working_directory,
     get_video_name, 
-    validate_executable_path, 
-    validate_video_path, 
-    import_colmap_data)
+    import_pipeline_model,
+    write_known_poses)
 
 class OPEN_VIDEO_TRACKER_OT_run_pipeline_modal(bpy.types.Operator):
     """Modal operator for running the photogrammetry pipeline"""
@@ -17,257 +25,100 @@ class OPEN_VIDEO_TRACKER_OT_run_pipeline_modal(bpy.types.Operator):
     bl_label = "Run Pipeline Modal"
     
     _timer = None
-    _process = None
-    _current_step = 0
-    model_dir = ""
-    image_dir = ""
+    _pipeline = None
 
     is_active = False
     _message = ""
-    
-    @property
-    def current_step(self):
-        # Access the current step from the thread
-        return self._current_step
-    
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self._current_step = 0
-        self._process = None
-        self._prev = None
-        
-    def update_current_step(self, step):
-        # Thread-safe update of current step
-        self._current_step = step
-        
+    _fraction = 0.0
+    # Progress parsed from the output of the running tools (by stage)
+    _stage_messages = {}
+
     def modal(self, context, event):
         if event.type == 'TIMER':
-            context.scene.open_video_tracker.progress = self.current_step
-            
-            # Check if thread is still alive
-            if self._thread and not self._thread.is_alive():
-                # Thread has finished
-                if self._process.returncode == 0 or not self._current_step < 7:
-                    if self.model_dir and os.path.exists(self.model_dir):
-                        import_colmap_data(context , self.model_dir , self.image_dir)
-                    self.report({'INFO'}, "Pipeline execution completed")
-                else:
-                    self.report({'ERROR'}, "Pipeline execution failed")
-                    self.cancel(context)
-                    return {'CANCELLED'}
-                self.cancel(context)
-                return {'FINISHED'}
-                
+            # The events of the pipeline thread are handled on the main thread
+            for pipeline_event in self._pipeline.get_events():
+                if pipeline_event.kind == 'log':
+                    print(f"~ {pipeline_event.data}")
+                elif pipeline_event.kind == 'progress':
+                    self.on_progress(context, pipeline_event.data)
+                elif pipeline_event.kind == 'finished':
+                    return self.on_finished(context, pipeline_event.data)
         return {'PASS_THROUGH'}
+
+    def on_progress(self, context, progress):
+        cls = OPEN_VIDEO_TRACKER_OT_run_pipeline_modal
+        context.scene.open_video_tracker.progress = progress.step
+        cls._fraction = progress.fraction
+        if progress.stage_progress is not None:
+            # Parsed from the tool output, which is printed anyway
+            cls._stage_messages[progress.stage] = (progress.step, progress.stage_progress.format())
+            return
+        print(progress.message)
+        if progress.level == 'INFO':
+            cls._message = progress.message
+            # Remove the progress of finished stages (running stages report
+            # their progress again)
+            for stage, (step, _) in list(cls._stage_messages.items()):
+                if step < progress.step or stage == progress.stage:
+                    del cls._stage_messages[stage]
+        else:
+            self.report({progress.level}, progress.message)
+
+    def on_finished(self, context, succeeded):
+        runner = self._pipeline.runner
+        if succeeded:
+            # The run has been added to the history of the estimator
+            clear_run_estimates()
+            import_pipeline_model(context, runner.settings, runner.model_dir, runner.images_dir, runner.registered_frame_names)
+            self.report({'INFO'}, "Pipeline execution completed")
+            self.cancel(context)
+            return {'FINISHED'}
+        self.report({'ERROR'}, runner.error or "Pipeline execution failed")
+        self.cancel(context)
+        return {'CANCELLED'}
         
     def execute(self, context):
-        # Reset progress
-
         blend_path = bpy.data.filepath
         if not blend_path:
             self.report({'ERROR'}, "Blend file is not saved")
             return {'CANCELLED'}
-        self.blend_dir = os.path.dirname(blend_path)
-        OPEN_VIDEO_TRACKER_OT_run_pipeline_modal.is_active = True
-        
-        # Start first step
-        self._thread = Thread(target=self.processs, args=(context,))
-        self._thread.daemon = True  # Dies when main thread dies
-        self._thread.start()
 
-        self.report({"INFO"} , "Processing... 😎")
-        self._timer = context.window_manager.event_timer_add(0.05, window=context.window)
-        context.window_manager.modal_handler_add(self)
-        return {'RUNNING_MODAL'}
-        
-    def processs(self, context):
-        """Execute the next step in the pipeline"""
         props:OpenVideoTrackerProperties = context.scene.open_video_tracker
         prefs = get_addon_preferences()
-        
-        # Validate inputs
-        is_valid, msg = validate_video_path(props.video_path)
-        if not is_valid:
-            self.report({'ERROR'}, f"Invalid video file: {msg}")
-            self.cancel(context)
-            return {'CANCELLED'}
-            
-        # Validate executable paths
-        ffmpeg_valid, ffmpeg_msg = validate_executable_path(prefs.ffmpeg_path)
-        colmap_valid, colmap_msg = validate_executable_path(prefs.colmap_path)
-        glomap_valid, glomap_msg = validate_executable_path(prefs.glomap_path)
-        
-        if not ffmpeg_valid:
-            self.report({'ERROR'}, f"Invalid FFmpeg path: {ffmpeg_msg}")
-            self.cancel(context)
-            return {'CANCELLED'}
-            
-        if not colmap_valid:
-            self.report({'ERROR'}, f"Invalid COLMAP path: {colmap_msg}")
-            self.cancel(context)
+        try:
+            task_client = get_task_client(os.path.dirname(blend_path))
+        except ValueError as e:
+            self.report({'ERROR'}, str(e))
             return {'CANCELLED'}
-            
-        if not glomap_valid:
-            self.report({'ERROR'}, f"Invalid GLOMAP path: {glomap_msg}")
-            self.cancel(context)
+        runner = PipelineRunner(
+            PipelineSettings.from_properties(props),
+            ToolPaths(prefs.ffmpeg_path, prefs.colmap_path, prefs.glomap_path),
+            os.path.dirname(blend_path),
+            trace=prefs.enable_tracing,
+            trace_memory=prefs.trace_memory,
+            history_path=get_history_path(),
+            artifact_cache=get_artifact_cache(),
+            task_client=task_client,
+        )
+        # Known from the ffprobe of the video path, used for the progress of the frame extraction
+        runner.expected_num_frames = props.video_num_frames or None
+        runner.video_fps = props.video_fps or None
+        if props.pipeline_mode == 'TRIANGULATE' and write_known_poses(context, runner.known_poses_dir, runner.images_dir, props.video_num_frames) == 0:
+            self.report({'ERROR'}, "The scene has no active camera")
             return {'CANCELLED'}
-            
-        # Get paths
-        blend_dir = self.blend_dir
-        video_name = get_video_name(props.video_path)
-        
-        # Create working directory structure
-        working_dir, images_dir, sparse_dir = create_working_directory(blend_dir, video_name)
-        database_path = os.path.join(working_dir, "database.db")
-        model_dir = os.path.join(sparse_dir, "0")
-        self.model_dir = model_dir  # Store for later use
-        self.image_dir = images_dir
-        # Step 1: Frame extraction using FFmpeg
-        self.report({'INFO'}, "Step 1/7: Extracting frames...")
-        self.update_current_step(1)
-        OPEN_VIDEO_TRACKER_OT_run_pipeline_modal._message = "Step 1/7: Extracting frames..."
-
-        try:
-            print("Step 1/7: Extracting frames...")
-            cmd = [
-                prefs.ffmpeg_path,
-                "-loglevel", "error",
-                "-stats",
-                "-i", props.video_path,
-                "-qscale:v", str(props.quality),
-                os.path.join(images_dir, "frame_%06d.jpg")
-            ]
-            self._process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
-            self.print_logs(self._process)
-            if self._process.returncode != 0:
-                self.report({'ERROR'}, "Frame extraction failed")
-                return  # Early exit from the thread function
-        
-            # Step 2: COLMAP feature extraction
-            self.report({'INFO'}, "Step 2/7: Extracting features...")
-            self.update_current_step(2)
-            print("Step 2/7: Extracting features...")
-            OPEN_VIDEO_TRACKER_OT_run_pipeline_modal._message = "Step 2/7: Extracting features..."
-            cmd = [
-                prefs.colmap_path,
-                "feature_extractor",
-                "--database_path", database_path,
-                "--image_path", images_dir,
-                "--ImageReader.single_camera", "1",
-                "--ImageReader.camera_model", props.camera_model,
-                "--SiftExtraction.use_gpu", "1" if props.use_gpu else "0",
-                "--SiftExtraction.max_image_size", str(props.max_image_size),
-                "--SiftExtraction.max_num_features", str(props.max_num_features)
-            ]
-            self._process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
-            self.print_logs(self._process)
-            if self._process.returncode != 0:
-                self.report({'ERROR'}, "Feature extraction failed")
-                return  # Early exit from the thread function
-
+        OPEN_VIDEO_TRACKER_OT_run_pipeline_modal.is_active = True
+        OPEN_VIDEO_TRACKER_OT_run_pipeline_modal._fraction = 0.0
+        OPEN_VIDEO_TRACKER_OT_run_pipeline_modal._stage_messages.clear()
         
-            # Step 3: COLMAP sequential matching
-            self.report({'INFO'}, "Step 3/7: Matching features...")
-            self.update_current_step(3)
-            print("Step 3/7: Matching features...")
-            OPEN_VIDEO_TRACKER_OT_run_pipeline_modal._message = "Step 3/7: Matching features..."
+        # The pipeline runs in an event loop on a worker thread and sends its
+        # progress through a queue, which is drained by the modal timer
+        self._pipeline = BackgroundPipeline(runner)
+        self._pipeline.start()
 
-            cmd = [
-                prefs.colmap_path,
-                "sequential_matcher",
-                "--database_path", database_path,
-                "--SequentialMatching.overlap", str(props.overlap)
-            ]
-            self._process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
-            self.print_logs(self._process)
-            if self._process.returncode != 0:
-                self.report({'ERROR'}, "Feature matching failed")
-                return  # Early exit from the thread function
-        
-            # Step 4: GLOMAP sparse reconstruction
-            self.report({'INFO'}, "Step 4/7: Running sparse reconstruction...")
-            self.update_current_step(4)
-            print("Step 4/7: Running sparse reconstruction...")
-            OPEN_VIDEO_TRACKER_OT_run_pipeline_modal._message = "Step 4/7: Running sparse reconstruction..."
-            cmd = [
-                prefs.glomap_path,
-                "mapper",
-                "--database_path", database_path,
-                "--image_path", images_dir,
-                "--output_path", sparse_dir,
-                "--TrackEstablishment.max_num_tracks", str(props.max_num_tracks*len(os.listdir(images_dir))),
-                "--constraint_type", props.constraint_type,
-                "--RelPoseEstimation.max_epipolar_error", str(props.max_epipolar_error),
-                "--GlobalPositioning.max_num_iterations", str(props.max_global_positioning_iterations),
-                "--BundleAdjustment.max_num_iterations", str(props.max_bundle_adjustment_iterations),
-                "--GlobalPositioning.use_gpu", "1" if props.use_gpu else "0",
-                "--BundleAdjustment.use_gpu", "1" if props.use_gpu else "0"
-            ]
-            self._process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
-            self.print_logs(self._process)
-            if self._process.returncode != 0:
-                self.report({'ERROR'}, "Sparse reconstruction failed")
-                return  # Early exit from the thread function
-        
-            # Step 5: Export TXT inside the model folder
-            self.report({'INFO'}, "Step 5/7: Exporting model (internal)...")
-            self.update_current_step(5)
-            print("Step 5/7: Exporting model (internal)...")
-            OPEN_VIDEO_TRACKER_OT_run_pipeline_modal._message = "Step 5/7: Exporting model (internal)..."
-            if os.path.exists(model_dir):
-                cmd = [
-                    prefs.colmap_path,
-                    "model_converter",
-                    "--input_path", model_dir,
-                    "--output_path", model_dir,
-                    "--output_type", "TXT"
-                ]
-                self._process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
-                self.print_logs(self._process)
-                if self._process.returncode != 0:
-                    self.report({'ERROR'}, "Internal model export failed")
-                    return  # Early exit from the thread function
-            
-            # Step 6: Export TXT to parent sparse directory
-            self.report({'INFO'}, "Step 6/7: Exporting model (external)...")
-            self.update_current_step(6)
-            print("Step 6/7: Exporting model (external)...")
-            OPEN_VIDEO_TRACKER_OT_run_pipeline_modal._message = "Step 6/7: Exporting model (external)..."
-            if os.path.exists(model_dir):
-                cmd = [
-                    prefs.colmap_path,
-                    "model_converter",
-                    "--input_path", model_dir,
-                    "--output_path", sparse_dir,
-                    "--output_type", "TXT"
-                ]
-                self._process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
-                self.print_logs(self._process)
-                if self._process.returncode != 0:
-                    self.report({'ERROR'}, "External model export failed")
-                    return  # Early exit from the thread function
-            else:
-                self.report({'WARNING'}, "No model found to export")
-                return  # Early exit if model doesn't exist
-            
-        except Exception as e:
-            self.report({'ERROR'}, "Unexpected error occurred")
-            print(f"Unexpected error: {e}")
-            return
-        # Step 7: Cleanup and finish
-        self.report({'INFO'}, "Step 7/7: Importing model...")
-        print("Step 7/7: Importing model...")
-        # This step is just for progress tracking
-        self.update_current_step(7)
-        OPEN_VIDEO_TRACKER_OT_run_pipeline_modal._message = "Step 7/7: Importing model..."
-                
-    def print_logs(self, process):
-        # Print output in real-time as it's produced
-        for line in iter(process.stdout.readline, ""):
-            if line:
-                print(f"~ {line.rstrip()}")
-                # Also report to Blender UI
-        process.wait()
+        self.report({"INFO"} , "Processing... 😎")
+        self._timer = context.window_manager.event_timer_add(0.05, window=context.window)
+        context.window_manager.modal_handler_add(self)
+        return {'RUNNING_MODAL'}
 
     def cancel(self, context):
         # Clean up timer
@@ -275,16 +126,185 @@ class OPEN_VIDEO_TRACKER_OT_run_pipeline_modal(bpy.types.Operator):
         wm = context.window_manager
         if self._timer:
             wm.event_timer_remove(self._timer)
+            self._timer = None
             
-        # Terminate process if running
-        if self._process and self._process.poll() is None:
-            try:
-                self._process.terminate()
-                self._process.wait(timeout=5)  # Wait for termination
-            except subprocess.TimeoutExpired:
-                self._process.kill()  # Force kill if it doesn't terminate
-            except Exception:
-                pass  # Ignore errors during termination
+        # Terminate the running tool (does not block the user interface)
+        if self._pipeline is not None:
+            self._pipeline.cancel()
             
         # Reset progress
-        context.scene.open_video_tracker.progress = 0
\ No newline at end of file
+        context.scene.open_video_tracker.progress = 0
+
+
+class OPEN_VIDEO_TRACKER_OT_add_job(bpy.types.Operator):
+    """Add the video with the current settings to the job queue"""
+    bl_idname = "open_video_tracker.add_job"
+    bl_label = "Add to Queue"
+
+    def execute(self, context):
+        props:OpenVideoTrackerProperties = context.scene.open_video_tracker
+        try:
+            job_queue = get_job_queue()
+        except ValueError as e:
+            self.report({'ERROR'}, str(e))
+            return {'CANCELLED'}
+        if job_queue is None:
+            self.report({'ERROR'}, "Blend file is not saved")
+            return {'CANCELLED'}
+        base_dir = os.path.dirname(bpy.data.filepath)
+        if props.pipeline_mode == 'TRIANGULATE':
+            working_dir = get_working_directory(base_dir, get_video_name(props.video_path))
+            # The job uses the poses at the time it was added
+            if write_known_poses(context, os.path.join(working_dir, KNOWN_POSES_DIR_NAME), os.path.join(working_dir, "images"), props.video_num_frames) == 0:
+                self.report({'ERROR'}, "The scene has no active camera")
+                return {'CANCELLED'}
+        try:
+            job = job_queue.add_job(PipelineSettings.from_properties(props), base_dir)
+        except ValueError as e:
+            self.report({'ERROR'}, str(e))
+            return {'CANCELLED'}
+        self.report({'INFO'}, f"Added {job.name} to the queue")
+        return {'FINISHED'}
+
+
+class OPEN_VIDEO_TRACKER_OT_run_job_queue(bpy.types.Operator):
+    """Track the queued videos. Several jobs run at the same time within the budget of the preferences"""
+    bl_idname = "open_video_tracker.run_job_queue"
+    bl_label = "Run Queue"
+
+    _timer = None
+    is_active = False
+
+    def modal(self, context, event):
+        if event.type == 'TIMER':
+            try:
+                job_queue = get_job_queue()
+            except ValueError as e:
+                self.report({'ERROR'}, str(e))
+                self.cancel(context)
+                return {'CANCELLED'}
+            for job in job_queue.update():
+                if job.state == SUCCEEDED:
+                    self.report({'INFO'}, f"Finished {job.name}")
+                    clear_run_estimates()
+                    if context.scene.open_video_tracker.auto_import_jobs:
+                        self._pending_imports.append(job)
+                else:
+                    self.report({'WARNING'}, f"{job.name}: {job.message}")
+
+            # Only one import runs at a time
+            if self._pending_imports and not ImportColmapOperator.is_active:
+                job = self._pending_imports.pop(0)
+                if import_pipeline_model(context, job.settings, job.model_dir, job.images_dir, job.registered_frame_names):
+                    job_queue.mark_imported(job)
+
+            for area in context.screen.areas:
+                if area.type == 'VIEW_3D':
+                    area.tag_redraw()
+            if job_queue.is_idle and not self._pending_imports:
+                self.cancel(context)
+                return {'FINISHED'}
+        return {'PASS_THROUGH'}
+
+    def execute(self, context):
+        try:
+            job_queue = get_job_queue()
+        except ValueError as e:
+            self.report({'ERROR'}, str(e))
+            return {'CANCELLED'}
+        if job_queue is None:
+            self.report({'ERROR'}, "Blend file is not saved")
+            return {'CANCELLED'}
+        if not job_queue.queued_jobs:
+            self.report({'WARNING'}, "No queued jobs")
+            return {'CANCELLED'}
+        OPEN_VIDEO_TRACKER_OT_run_job_queue.is_active = True
+        self._pending_imports = []
+        self._timer = context.window_manager.event_timer_add(0.5, window=context.window)
+        context.window_manager.modal_handler_add(self)
+        return {'RUNNING_MODAL'}
+
+    def cancel(self, context):
+        OPEN_VIDEO_TRACKER_OT_run_job_queue.is_active = False
+        if self._timer:
+            context.window_manager.event_timer_remove(self._timer)
+            self._timer = None
+
+
+class OPEN_VIDEO_TRACKER_OT_job_action(bpy.types.Operator):
+    """Cancel, retry, remove or import a job of the queue"""
+    bl_idname = "open_video_tracker.job_action"
+    bl_label = "Job Action"
+
+    job_id: bpy.props.StringProperty()
+    action: bpy.props.EnumProperty(
+        items=[
+            ('CANCEL', "Cancel", "Cancel the job"),
+            ('RETRY', "Retry", "Queue the job again"),
+            ('REMOVE', "Remove", "Remove the job from the queue (the working directory is kept)"),
+            ('IMPORT', "Import", "Import the model of the job"),
+            ('CANCEL_ALL', "Cancel All", "Cancel all queued and running jobs"),
+        ]
+    )
+
+    def execute(self, context):
+        try:
+            job_queue = get_job_queue()
+        except ValueError as e:
+            self.report({'ERROR'}, str(e))
+            return {'CANCELLED'}
+        if job_queue is None:
+            self.report({'ERROR'}, "Blend file is not saved")
+            return {'CANCELLED'}
+        if self.action == 'CANCEL_ALL':
+            for job in job_queue.jobs:
+                if not job.is_finished:
+                    job_queue.cancel_job(job.job_id)
+            return {'FINISHED'}
+
+        try:
+            job = job_queue.get_job(self.job_id)
+        except KeyError as e:
+            self.report({'ERROR'}, str(e))
+            return {'CANCELLED'}
+        if self.action == 'CANCEL':
+            job_queue.cancel_job(job.job_id)
+        elif self.action == 'RETRY':
+            job_queue.retry_job(job.job_id)
+        elif self.action == 'REMOVE':
+            job_queue.remove_job(job.job_id)
+        elif self.action == 'IMPORT':
+            if not os.path.exists(job.model_dir):
+                self.report({'ERROR'}, f"No model found in {job.model_dir}")
+                return {'CANCELLED'}
+            if not import_pipeline_model(context, job.settings, job.model_dir, job.images_dir, job.registered_frame_names):
+                self.report({'WARNING'}, f"{job.name} has registered no new frames")
+                return {'CANCELLED'}
+            job_queue.mark_imported(job)
+        return {'FINISHED'}
+
+
+class OPEN_VIDEO_TRACKER_OT_analyze_database(bpy.types.Operator):
+    """Read keypoint and match statistics from the COLMAP database of the current video"""
+    bl_idname = "open_video_tracker.analyze_database"
+    bl_label = "Analyze Matches"
+
+    def execute(self, context):
+        props:OpenVideoTrackerProperties = context.scene.open_video_tracker
+
+        blend_path = bpy.data.filepath
+        if not blend_path:
+            self.report({'ERROR'}, "Blend file is not saved")
+            return {'CANCELLED'}
+
+        working_dir = get_working_directory(os.path.dirname(blend_path), get_video_name(props.video_path))
+        database_path = os.path.join(working_dir, "database.db")
+        try:
+            statistics = compute_database_statistics(database_path, props.min_num_inliers)
+        except (FileNotFoundError, sqlite3.Error) as e:
+            self.report({'ERROR'}, f"Could not read database: {e}")
+            return {'CANCELLED'}
+
+        props.database_statistics.update_from_statistics(statistics)
+        self.report({'INFO'}, f"Found {len(statistics.weak_link_indices)} weak links")
+        return {'FINISHED'}
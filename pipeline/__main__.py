@@ -0,0 +1,228 @@
+"""Command line interface of the reconstruction pipeline.
+
+Runs the pipeline without Blender, e.g. on render farm nodes:
+
+    python -m open_video_tracker.pipeline shot_010.mp4 shot_020.mp4 \
+        --output-dir /projects/tracking --colmap /opt/colmap/bin/colmap
+
+The videos are processed one after another. Each video gets the working
+directory :code:`<output dir>/video_tracking/<video name>/` (like in
+Blender, where the output directory is the directory of the .blend file).
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+
+from .artifact_cache import (
+    DEFAULT_QUOTA_GB,
+    ArtifactCache,
+    get_default_cache_dir,
+)
+from .estimator import get_default_history_path
+from .probe import ProbeCache, ProbeError, get_default_probe_cache_path
+from .runner import (
+    NUM_STEPS,
+    PipelineProgress,
+    PipelineRunner,
+    PipelineSettings,
+    ToolPaths,
+)
+from .task_server import TaskClient
+
+
+def _add_settings_arguments(parser):
+    group = parser.add_argument_group(
+        "pipeline settings",
+        "See the corresponding settings in the Blender panel",
+    )
+    defaults = PipelineSettings._field_defaults
+    for field in PipelineSettings._fields:
+        if field not in defaults:
+            continue
+        default = defaults[field]
+        option = "--" + field.replace("_", "-")
+        if isinstance(default, bool):
+            group.add_argument(
+                option, action=argparse.BooleanOptionalAction, default=default
+            )
+        else:
+            group.add_argument(
+                option,
+                type=type(default),
+                default=default,
+                help=f"(default: {default})",
+            )
+
+
+def create_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m open_video_tracker.pipeline",
+        description="Reconstruct the camera motion of videos with FFmpeg, "
+        "COLMAP and GLOMAP.",
+    )
+    parser.add_argument("videos", nargs="+", help="Video files to track")
+    parser.add_argument(
+        "--output-dir",
+        help="Directory of the working directories (default: directory of "
+        "each video)",
+    )
+    for tool_name in ToolPaths._fields:
+        parser.add_argument(
+            "--" + tool_name,
+            default=shutil.which(tool_name),
+            help=f"Path of the {tool_name} executable (default: from PATH)",
+        )
+    parser.add_argument(
+        "--ffprobe",
+        default=shutil.which("ffprobe"),
+        help="Path of the ffprobe executable, used for the frame count of "
+        "the progress (default: from PATH)",
+    )
+    parser.add_argument(
+        "--json",
+        action="store_true",
+        help="Write the progress as json lines to stdout and the tool output "
+        "to stderr",
+    )
+    parser.add_argument(
+        "--quiet", action="store_true", help="Do not print the tool output"
+    )
+    parser.add_argument(
+        "--trace",
+        action="store_true",
+        help="Write a Chrome trace (trace.json) to each working directory",
+    )
+    parser.add_argument("--trace-memory", action="store_true")
+    parser.add_argument(
+        "--history",
+        default=get_default_history_path(),
+        help="File of the successful runs, from which the runtime estimates "
+        "of the Blender panel are learned (default: %(default)s, empty: do "
+        "not record)",
+    )
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="Reuse the frames and features of identical videos from the "
+        "shared cache (and store them there)",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=get_default_cache_dir(),
+        help="Directory of the shared cache (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--cache-quota",
+        type=float,
+        default=DEFAULT_QUOTA_GB,
+        help="Disk quota of the shared cache in GB (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--task-server",
+        help="Address (host:port) of a task server, whose workers extract "
+        "the features of the shards (see --num-feature-shards). The output "
+        "directory must be shared with the workers",
+    )
+    _add_settings_arguments(parser)
+    return parser
+
+
+def _create_callbacks(video_path, use_json, quiet):
+    if use_json:
+
+        def progress_callback(progress):
+            event = dict(progress._asdict(), video=video_path, time=time.time())
+            if progress.stage_progress is not None:
+                event["stage_progress"] = progress.stage_progress._asdict()
+            print(json.dumps(event), flush=True)
+
+        log_stream = sys.stderr
+    else:
+
+        def progress_callback(progress):
+            prefix = "" if progress.level == "INFO" else f"{progress.level}: "
+            print(prefix + progress.message, flush=True)
+
+        log_stream = sys.stdout
+
+    def log_callback(line):
+        if not quiet:
+            print(f"~ {line}", file=log_stream)
+
+    return progress_callback, log_callback
+
+
+def main(argv=None):
+    args = create_parser().parse_args(argv)
+    tool_paths = ToolPaths(
+        *(getattr(args, tool_name) for tool_name in ToolPaths._fields)
+    )
+
+    probe_cache = ProbeCache(get_default_probe_cache_path())
+    artifact_cache = None
+    if args.cache:
+        artifact_cache = ArtifactCache(args.cache_dir, args.cache_quota)
+    task_client = None
+    if args.task_server:
+        # Paths below the output directory are mapped by the workers
+        shared_dir = args.output_dir and os.path.abspath(args.output_dir)
+        task_client = TaskClient(args.task_server, shared_dir)
+
+    num_failed = 0
+    for video_path in args.videos:
+        video_path = os.path.abspath(video_path)
+        settings = PipelineSettings(
+            video_path=video_path,
+            **{
+                field: getattr(args, field)
+                for field in PipelineSettings._field_defaults
+            },
+        )
+        progress_callback, log_callback = _create_callbacks(
+            video_path, args.json, args.quiet
+        )
+        runner = PipelineRunner(
+            settings,
+            tool_paths,
+            os.path.abspath(args.output_dir or os.path.dirname(video_path)),
+            progress_callback=progress_callback,
+            log_callback=log_callback,
+            trace=args.trace,
+            trace_memory=args.trace_memory,
+            history_path=args.history or None,
+            artifact_cache=artifact_cache,
+            task_client=task_client,
+        )
+        if args.ffprobe:
+            try:
+                info = probe_cache.probe(args.ffprobe, video_path)
+                runner.expected_num_frames = info.num_frames
+                runner.video_fps = info.fps
+            except ProbeError as e:
+                print(f"Could not probe {video_path}: {e}", file=sys.stderr)
+        try:
+            succeeded = runner.run()
+        except KeyboardInterrupt:
+            runner.cancel()
+            return 130
+        if succeeded:
+            progress_callback(
+                PipelineProgress(
+                    NUM_STEPS,
+                    NUM_STEPS,
+                    "done",
+                    f"Model written to {runner.model_dir}",
+                    "INFO",
+                )
+            )
+        else:
+            num_failed += 1
+    return 1 if num_failed > 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,273 @@
+"""Cache of extracted frames and feature databases shared by all projects.
+
+The entries are addressed by a hash of the video content and the settings
+that affect them, so the same plate in two .blend files (or two videos with
+the same name) is only extracted once. A frames entry holds the extracted
+frames and the thumbnail and preview files, a features entry holds the
+:code:`database.db` after the feature extraction. Frames are hardlinked into
+the working directories (copied across file systems), databases are copied,
+since they are modified by the matching.
+
+Each entry directory contains :code:`entry.json` with its size and the time
+of its last use. After storing an entry, the least recently used entries are
+removed until the cache fits into its quota.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+
+from .estimator import get_default_data_dir
+
+CACHE_DIR_NAME = "cache"
+ENTRY_FILE_NAME = "entry.json"
+DATABASE_FILE_NAME = "database.db"
+FRAMES_DIR_NAME = "images"
+DEFAULT_QUOTA_GB = 50.0
+
+# The content hash reads samples of large videos (see hash_video)
+SAMPLE_SIZE = 4 * 1024**2
+NUM_SAMPLES = 16
+
+
+def get_default_cache_dir():
+    return os.path.join(get_default_data_dir(), CACHE_DIR_NAME)
+
+
+def hash_video(video_path):
+    """Return a content hash of a video.
+
+    Videos up to :code:`NUM_SAMPLES * SAMPLE_SIZE` bytes are hashed
+    completely. Of larger videos the size and evenly spaced samples are
+    hashed, which identifies copies of a video without reading gigabytes.
+    """
+    size = os.path.getsize(video_path)
+    digest = hashlib.sha256(str(size).encode())
+    with open(video_path, "rb") as video_file:
+        if size <= NUM_SAMPLES * SAMPLE_SIZE:
+            for chunk in iter(lambda: video_file.read(SAMPLE_SIZE), b""):
+                digest.update(chunk)
+        else:
+            step = (size - SAMPLE_SIZE) // (NUM_SAMPLES - 1)
+            for index in range(NUM_SAMPLES):
+                video_file.seek(index * step)
+                digest.update(video_file.read(SAMPLE_SIZE))
+    return digest.hexdigest()
+
+
+def _hash_values(values):
+    return hashlib.sha256(
+        json.dumps(values, sort_keys=True).encode()
+    ).hexdigest()
+
+
+def get_frames_key(video_hash, settings):
+    """Return the key of the extracted frames of a video."""
+    return "frames-" + _hash_values(
+        {
+            "video": video_hash,
+            "quality": str(settings.quality),
+            "thumbnails": settings.matching_mode == "SIMILARITY",
+            "preview": bool(settings.filter_frames),
+        }
+    )
+
+
+def get_features_key(video_hash, settings):
+    """Return the key of the feature database of a video."""
+    values = {
+        "frames": get_frames_key(video_hash, settings),
+        "camera_model": settings.camera_model,
+        "use_gpu": bool(settings.use_gpu),
+        "max_image_size": settings.max_image_size,
+        "max_num_features": settings.max_num_features,
+    }
+    # The database only contains the frames that passed the filter
+    if settings.filter_frames:
+        values["min_relative_sharpness"] = settings.min_relative_sharpness
+        values["min_frame_change"] = settings.min_frame_change
+    return "features-" + _hash_values(values)
+
+
+def _link_or_copy(source, destination):
+    try:
+        os.link(source, destination)
+    except OSError:
+        # Other file system or no hardlink support
+        shutil.copyfile(source, destination)
+
+
+class ArtifactCache:
+    """Content addressed cache directory with a disk quota (in GB)."""
+
+    def __init__(self, cache_dir, quota_gb=DEFAULT_QUOTA_GB):
+        self.cache_dir = cache_dir
+        self.quota_gb = quota_gb
+
+    def get_entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def _read_entry(self, entry_dir):
+        try:
+            with open(os.path.join(entry_dir, ENTRY_FILE_NAME)) as entry_file:
+                return json.load(entry_file)
+        except (OSError, ValueError):
+            return None
+
+    def _write_entry(self, entry_dir, entry):
+        temp_path = os.path.join(entry_dir, ENTRY_FILE_NAME + ".tmp")
+        with open(temp_path, "w") as entry_file:
+            json.dump(entry, entry_file)
+        os.replace(temp_path, os.path.join(entry_dir, ENTRY_FILE_NAME))
+
+    def _touch(self, entry_dir, entry):
+        entry["last_used"] = time.time()
+        try:
+            self._write_entry(entry_dir, entry)
+        except OSError:
+            pass  # Only affects the eviction order
+
+    def _store(self, key, fill):
+        """Create an entry with :code:`fill(temp_dir)` and evict old entries.
+
+        Returns False, if the entry already exists.
+        """
+        entry_dir = self.get_entry_dir(key)
+        if self._read_entry(entry_dir) is not None:
+            return False
+        temp_dir = os.path.join(self.cache_dir, f".{key}.{uuid.uuid4().hex}")
+        os.makedirs(temp_dir)
+        try:
+            fill(temp_dir)
+            size = sum(
+                os.path.getsize(os.path.join(dirpath, filename))
+                for dirpath, _, filenames in os.walk(temp_dir)
+                for filename in filenames
+            )
+            self._write_entry(
+                temp_dir, {"key": key, "size": size, "last_used": time.time()}
+            )
+            try:
+                os.rename(temp_dir, entry_dir)
+            except OSError:
+                # Stored by another run in the meantime
+                return False
+        finally:
+            if os.path.isdir(temp_dir):
+                shutil.rmtree(temp_dir, ignore_errors=True)
+        self.evict()
+        return True
+
+    def get_entries(self):
+        """Return the entries, the least recently used first."""
+        if not os.path.isdir(self.cache_dir):
+            return []
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            entry = self._read_entry(os.path.join(self.cache_dir, name))
+            if entry is not None:
+                entries.append(entry)
+        return sorted(entries, key=lambda entry: entry["last_used"])
+
+    @property
+    def size(self):
+        """Total size of the entries (bytes)."""
+        return sum(entry["size"] for entry in self.get_entries())
+
+    def evict(self):
+        """Remove the least recently used entries that exceed the quota."""
+        entries = self.get_entries()
+        total_size = sum(entry["size"] for entry in entries)
+        max_size = self.quota_gb * 1024**3
+        for entry in entries:
+            if total_size <= max_size:
+                break
+            # Hardlinked frames stay in the working directories
+            shutil.rmtree(self.get_entry_dir(entry["key"]), ignore_errors=True)
+            total_size -= entry["size"]
+
+    def clear(self):
+        for entry in self.get_entries():
+            shutil.rmtree(self.get_entry_dir(entry["key"]), ignore_errors=True)
+
+    def store_frames(self, key, images_dir, extra_paths=()):
+        """Store the frames and the files of :code:`extra_paths` (e.g. the
+        thumbnails), which are restored to the same file names."""
+
+        def fill(temp_dir):
+            frames_dir = os.path.join(temp_dir, FRAMES_DIR_NAME)
+            os.makedirs(frames_dir)
+            for name in os.listdir(images_dir):
+                _link_or_copy(
+                    os.path.join(images_dir, name),
+                    os.path.join(frames_dir, name),
+                )
+            for path in extra_paths:
+                name = os.path.basename(path)
+                _link_or_copy(path, os.path.join(temp_dir, name))
+
+        return self._store(key, fill)
+
+    def restore_frames(self, key, images_dir, extra_dir):
+        """Link the cached frames into :code:`images_dir` and the other files
+        into :code:`extra_dir`. Returns the number of frames or None, if the
+        entry does not exist (or was removed while restoring it)."""
+        entry_dir = self.get_entry_dir(key)
+        entry = self._read_entry(entry_dir)
+        if entry is None:
+            return None
+        frames_dir = os.path.join(entry_dir, FRAMES_DIR_NAME)
+        try:
+            # Frames of a previous run would be mixed with the cached ones
+            for name in os.listdir(images_dir):
+                os.remove(os.path.join(images_dir, name))
+            frame_names = os.listdir(frames_dir)
+            for name in frame_names:
+                _link_or_copy(
+                    os.path.join(frames_dir, name),
+                    os.path.join(images_dir, name),
+                )
+            for name in os.listdir(entry_dir):
+                path = os.path.join(entry_dir, name)
+                if name != ENTRY_FILE_NAME and os.path.isfile(path):
+                    # Usually the extras of a previous run (possibly links
+                    # to this entry)
+                    extra_path = os.path.join(extra_dir, name)
+                    if os.path.lexists(extra_path):
+                        os.remove(extra_path)
+                    _link_or_copy(path, extra_path)
+        except OSError:
+            return None
+        self._touch(entry_dir, entry)
+        return len(frame_names)
+
+    def store_database(self, key, database_path):
+        """Store a copy of a COLMAP database."""
+
+        def fill(temp_dir):
+            shutil.copyfile(
+                database_path, os.path.join(temp_dir, DATABASE_FILE_NAME)
+            )
+
+        return self._store(key, fill)
+
+    def restore_database(self, key, database_path):
+        """Copy a cached database to :code:`database_path`. Returns False, if
+        the entry does not exist."""
+        entry_dir = self.get_entry_dir(key)
+        entry = self._read_entry(entry_dir)
+        if entry is None:
+            return False
+        temp_path = database_path + ".tmp"
+        try:
+            shutil.copyfile(
+                os.path.join(entry_dir, DATABASE_FILE_NAME), temp_path
+            )
+            os.replace(temp_path, database_path)
+        except OSError:
+            return False
+        self._touch(entry_dir, entry)
+        return True
@@ -0,0 +1,149 @@
+"""Small engine that runs pipeline stages as a directed acyclic graph.
+
+Each :code:`Stage` declares the artifacts it reads (:code:`inputs`) and
+writes (:code:`outputs`) and the resources it needs. A stage becomes ready,
+once all of its inputs have been produced. :code:`StageGraph.run()` starts
+the ready stages concurrently, as long as the resources of the running
+stages fit into the given budget.
+"""
+
+import asyncio
+from collections import namedtuple
+
+
+class StageResources(namedtuple("StageResources", ["cpus", "memory_gb"])):
+    """Estimated number of busy cores and peak memory (in GB) of a stage."""
+
+    def __add__(self, other):
+        return StageResources(
+            self.cpus + other.cpus, self.memory_gb + other.memory_gb
+        )
+
+
+NO_RESOURCES = StageResources(0, 0.0)
+
+
+class Stage(
+    namedtuple(
+        "Stage",
+        ["name", "run", "inputs", "outputs", "resources", "step", "message"],
+        defaults=[(), (), NO_RESOURCES, 0, ""],
+    )
+):
+    """A unit of work of the pipeline.
+
+    :code:`run` is a coroutine function without arguments that returns True
+    on success. :code:`step` and :code:`message` are used for the progress
+    reports.
+    """
+
+
+class StageGraph:
+    """Dependency graph of stages, which are connected by their artifacts.
+
+    Raises a ValueError, if an input is neither produced by a stage nor
+    listed in :code:`available_artifacts`, if an artifact is produced by
+    more than one stage or if the graph contains a cycle.
+    """
+
+    def __init__(self, stages, available_artifacts=()):
+        self.stages = list(stages)
+        self.available_artifacts = set(available_artifacts)
+
+        self.producers = {}
+        for stage in self.stages:
+            for artifact in stage.outputs:
+                is_available = artifact in self.available_artifacts
+                if artifact in self.producers or is_available:
+                    raise ValueError(f"{artifact} is produced more than once")
+                self.producers[artifact] = stage.name
+        for stage in self.stages:
+            for artifact in stage.inputs:
+                if (
+                    artifact not in self.producers
+                    and artifact not in self.available_artifacts
+                ):
+                    raise ValueError(
+                        f"No stage produces {artifact} (input of {stage.name})"
+                    )
+        self.order = self._sort_topologically()
+
+    def get_dependencies(self, stage):
+        """Return the names of the stages that produce the inputs of a stage."""
+        return {
+            self.producers[artifact]
+            for artifact in stage.inputs
+            if artifact in self.producers
+        }
+
+    def _sort_topologically(self):
+        stages_by_name = {stage.name: stage for stage in self.stages}
+        order = []
+        state = {}
+
+        def visit(stage):
+            if state.get(stage.name) == "done":
+                return
+            if state.get(stage.name) == "visiting":
+                raise ValueError(f"Cycle through stage {stage.name}")
+            state[stage.name] = "visiting"
+            for name in sorted(self.get_dependencies(stage)):
+                visit(stages_by_name[name])
+            state[stage.name] = "done"
+            order.append(stage)
+
+        for stage in self.stages:
+            visit(stage)
+        return order
+
+    async def run(self, max_resources, on_start=None, on_finish=None):
+        """Run all stages and return True, if all of them succeeded.
+
+        :code:`on_start(stage)` and :code:`on_finish(stage)` are called
+        before a stage is started and after it has finished. After the first failed stage no further stages are started and the
+        running stages are cancelled. Exceptions of a stage are re-raised.
+        """
+        pending = list(self.order)
+        produced = set(self.available_artifacts)
+        running = {}
+        try:
+            while pending or running:
+                used = sum(
+                    (stage.resources for stage in running.values()),
+                    NO_RESOURCES,
+                )
+                for stage in list(pending):
+                    if not all(artifact in produced for artifact in stage.inputs):
+                        continue
+                    demand = used + stage.resources
+                    # A single stage always runs, even if it exceeds the budget
+                    if running and (
+                        demand.cpus > max_resources.cpus
+                        or demand.memory_gb > max_resources.memory_gb
+                    ):
+                        continue
+                    if on_start is not None:
+                        on_start(stage)
+                    task = asyncio.ensure_future(stage.run())
+                    running[task] = stage
+                    pending.remove(stage)
+                    used = demand
+
+                if not running:
+                    raise RuntimeError("No stage can be started")
+                finished, _ = await asyncio.wait(
+                    running, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in finished:
+                    stage = running.pop(task)
+                    if on_finish is not None:
+                        on_finish(stage)
+                    if not task.result():
+                        return False
+                    produced.update(stage.outputs)
+            return True
+        finally:
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
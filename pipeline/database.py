@@ -0,0 +1,226 @@
+import os
+import sqlite3
+from collections import namedtuple
+
+import numpy as np
+
+
+# From https://github.com/colmap/colmap/blob/dev/src/colmap/scene/database.cc
+#   pair_id = image_id1 * MAX_NUM_IMAGES + image_id2, with image_id1 < image_id2
+MAX_NUM_IMAGES = 2147483647
+
+
+class DatabaseStatistics(
+    namedtuple(
+        "DatabaseStatistics",
+        [
+            "image_ids",
+            "image_names",
+            "keypoint_counts",
+            "num_matched_pairs",
+            "num_verified_pairs",
+            "sequential_inlier_counts",
+            "weak_link_indices",
+        ],
+    )
+):
+    """Feature and match statistics of a :code:`Colmap` database.
+
+    All per-image arrays follow the image name order, which is the order used
+    by the sequential matcher. :code:`sequential_inlier_counts[i]` is the
+    number of verified inlier matches between image i and image i + 1.
+    """
+
+
+def image_ids_to_pair_id(image_id1, image_id2):
+    """Return the :code:`Colmap` pair id(s) of the given image id(s)."""
+    image_id1 = np.asarray(image_id1, dtype=np.int64)
+    image_id2 = np.asarray(image_id2, dtype=np.int64)
+    swap = image_id1 > image_id2
+    first = np.where(swap, image_id2, image_id1)
+    second = np.where(swap, image_id1, image_id2)
+    return first * MAX_NUM_IMAGES + second
+
+
+def pair_id_to_image_ids(pair_id):
+    """Return the image ids encoded in the given :code:`Colmap` pair id(s)."""
+    pair_id = np.asarray(pair_id, dtype=np.int64)
+    image_id2 = pair_id % MAX_NUM_IMAGES
+    image_id1 = (pair_id - image_id2) // MAX_NUM_IMAGES
+    return image_id1, image_id2
+
+
+def blob_to_array(blob, dtype, shape=(-1,)):
+    """Decode a blob stored in the database without copying it."""
+    return np.frombuffer(blob, dtype=dtype).reshape(*shape)
+
+
+def open_database(database_path):
+    """Open a :code:`Colmap` database in read-only mode."""
+    if not os.path.isfile(database_path):
+        raise FileNotFoundError(f"Database not found: {database_path}")
+    uri = "file:" + os.path.abspath(database_path).replace("\\", "/") + "?mode=ro"
+    return sqlite3.connect(uri, uri=True)
+
+
+def _fetch_int_columns(connection, query, num_columns):
+    """Fetch integer columns of a query into a (N, num_columns) array."""
+    rows = connection.execute(query).fetchall()
+    if len(rows) == 0:
+        return np.empty((0, num_columns), dtype=np.int64)
+    return np.array(rows, dtype=np.int64).reshape(-1, num_columns)
+
+
+def read_images(connection):
+    """Return the image ids and names sorted by image name."""
+    rows = connection.execute("SELECT image_id, name FROM images").fetchall()
+    rows.sort(key=lambda row: row[1])
+    image_ids = np.array([row[0] for row in rows], dtype=np.int64)
+    image_names = [row[1] for row in rows]
+    return image_ids, image_names
+
+
+def read_camera_sizes(connection):
+    """Return the (width, height) of each camera."""
+    return connection.execute("SELECT width, height FROM cameras").fetchall()
+
+
+def read_camera_sizes_by_id(connection):
+    """Return a dict mapping camera ids to the (width, height) of the camera."""
+    rows = connection.execute("SELECT camera_id, width, height FROM cameras")
+    return {camera_id: (width, height) for camera_id, width, height in rows}
+
+
+def read_image_cameras(connection):
+    """Return a dict mapping image names to the image and camera ids."""
+    rows = connection.execute("SELECT image_id, name, camera_id FROM images")
+    return {name: (image_id, camera_id) for image_id, name, camera_id in rows}
+
+
+def read_camera_ids(connection):
+    """Return the camera ids in ascending order."""
+    return [
+        row[0]
+        for row in connection.execute(
+            "SELECT camera_id FROM cameras ORDER BY camera_id"
+        )
+    ]
+
+
+def read_keypoint_counts(connection):
+    """Return a dict mapping image ids to the number of keypoints."""
+    id_count = _fetch_int_columns(
+        connection, "SELECT image_id, rows FROM keypoints", 2
+    )
+    return dict(zip(id_count[:, 0].tolist(), id_count[:, 1].tolist()))
+
+
+def read_keypoints(connection, image_id):
+    """Return the keypoints of an image as (N, 2), (N, 4) or (N, 6) array."""
+    row = connection.execute(
+        "SELECT rows, cols, data FROM keypoints WHERE image_id=?", (image_id,)
+    ).fetchone()
+    if row is None or row[0] == 0:
+        return np.empty((0, 2), dtype=np.float32)
+    num_rows, num_cols, data = row
+    return blob_to_array(data, np.float32, (num_rows, num_cols))
+
+
+def read_matches(connection, image_id1, image_id2, verified=True):
+    """Return the (inlier) matches of an image pair as (N, 2) array.
+
+    The columns refer to the keypoint indices of the image with the smaller
+    image id and of the image with the larger image id (in this order).
+    """
+    table = "two_view_geometries" if verified else "matches"
+    pair_id = int(image_ids_to_pair_id(image_id1, image_id2))
+    row = connection.execute(
+        f"SELECT rows, data FROM {table} WHERE pair_id=?", (pair_id,)
+    ).fetchone()
+    if row is None or row[0] == 0:
+        return np.empty((0, 2), dtype=np.uint32)
+    return blob_to_array(row[1], np.uint32, (row[0], 2))
+
+
+def read_pair_match_counts(connection, verified=True):
+    """Return the image id pairs and the number of matches of each pair.
+
+    Only the row counts of the match tables are read, i.e. the blobs are not
+    decoded. This keeps the query fast for databases with millions of matches.
+    """
+    table = "two_view_geometries" if verified else "matches"
+    pair_count = _fetch_int_columns(
+        connection, f"SELECT pair_id, rows FROM {table} WHERE rows > 0", 2
+    )
+    image_id1, image_id2 = pair_id_to_image_ids(pair_count[:, 0])
+    return np.stack([image_id1, image_id2], axis=1), pair_count[:, 1]
+
+
+def compute_sequential_inlier_counts(image_ids, pair_image_ids, pair_counts):
+    """Return the number of inliers between consecutive images.
+
+    Consecutive pairs without verified geometry are reported with 0 inliers.
+    """
+    num_links = max(len(image_ids) - 1, 0)
+    sequential_counts = np.zeros(num_links, dtype=np.int64)
+    if num_links == 0 or len(pair_counts) == 0:
+        return sequential_counts
+
+    # Map image ids to their position in the (name sorted) sequence
+    max_image_id = int(max(image_ids.max(), pair_image_ids.max()))
+    id_to_index = np.full(max_image_id + 1, -1, dtype=np.int64)
+    id_to_index[image_ids] = np.arange(len(image_ids))
+
+    index1 = id_to_index[pair_image_ids[:, 0]]
+    index2 = id_to_index[pair_image_ids[:, 1]]
+    valid = (index1 >= 0) & (index2 >= 0)
+    first = np.minimum(index1, index2)[valid]
+    second = np.maximum(index1, index2)[valid]
+    counts = pair_counts[valid]
+
+    is_sequential = second - first == 1
+    sequential_counts[first[is_sequential]] = counts[is_sequential]
+    return sequential_counts
+
+
+def find_weak_links(sequential_inlier_counts, min_num_inliers):
+    """Return the indices i of the links (i, i + 1) with too few inliers."""
+    return np.flatnonzero(
+        np.asarray(sequential_inlier_counts) < min_num_inliers
+    )
+
+
+def compute_database_statistics(database_path, min_num_inliers=30):
+    """Compute feature and match statistics of a :code:`Colmap` database."""
+    connection = open_database(database_path)
+    try:
+        image_ids, image_names = read_images(connection)
+        id_to_keypoint_count = read_keypoint_counts(connection)
+        keypoint_counts = np.array(
+            [id_to_keypoint_count.get(image_id, 0) for image_id in image_ids],
+            dtype=np.int64,
+        )
+        num_matched_pairs = connection.execute(
+            "SELECT COUNT(*) FROM matches WHERE rows > 0"
+        ).fetchone()[0]
+        verified_pairs, inlier_counts = read_pair_match_counts(
+            connection, verified=True
+        )
+    finally:
+        connection.close()
+
+    sequential_inlier_counts = compute_sequential_inlier_counts(
+        image_ids, verified_pairs, inlier_counts
+    )
+    weak_link_indices = find_weak_links(
+        sequential_inlier_counts, min_num_inliers
+    )
+    return DatabaseStatistics(
+        image_ids=image_ids,
+        image_names=image_names,
+        keypoint_counts=keypoint_counts,
+        num_matched_pairs=num_matched_pairs,
+        num_verified_pairs=len(verified_pairs),
+        sequential_inlier_counts=sequential_inlier_counts,
+        weak_link_indices=weak_link_indices,
+    )
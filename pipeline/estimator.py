@@ -0,0 +1,315 @@
+"""Estimate the duration and the disk usage of a pipeline run.
+
+The duration of each stage is modeled as :code:`coefficient * work`, where
+the work is computed from the video (number of frames, resolution) and the
+settings (e.g. :code:`max_image_size`, :code:`overlap`). The coefficients
+start with rough defaults and are replaced by the ratio of the measured
+durations and the work of the previous successful runs, which are appended
+to a history file after each run. The disk usage is modeled the same way.
+"""
+
+import json
+import os
+from collections import namedtuple
+
+from .progress import format_duration
+
+HISTORY_FILE_NAME = "run_history.jsonl"
+# Only the most recent runs are used, e.g. after replacing the GPU
+MAX_NUM_RUNS = 50
+
+# Relative size of the extracted frames for each quality (-qscale:v) value
+QUALITY_SIZE_FACTORS = {"1": 1.0, "2": 0.6, "4": 0.35, "8": 0.2, "16": 0.12}
+# The feature extraction on the CPU is much slower
+CPU_FEATURE_FACTOR = 5.0
+
+# Seconds per unit of work (see compute_stage_work) of a mid-range machine
+DEFAULT_TIME_COEFFICIENTS = {
+    "frame_extraction": 0.004,
+    "filter_frames": 0.002,
+    "feature_extraction": 0.02,
+    "select_similar_pairs": 0.0001,
+    "matching": 0.002,
+    "repair_weak_links": 0.05,
+    "sparse_reconstruction": 0.2,
+    "image_registration": 0.1,
+    "point_triangulation": 0.05,
+    "model_export_internal": 0.005,
+    "model_export_external": 0.005,
+}
+
+# Bytes per unit of work (see compute_disk_work)
+DEFAULT_DISK_COEFFICIENTS = {
+    "frames": 400000.0,
+    "database": 150000.0,
+    "model": 60000.0,
+}
+
+
+class VideoStatistics(
+    namedtuple("VideoStatistics", ["num_frames", "width", "height"])
+):
+    """Number of frames and resolution of a video."""
+
+
+class Estimate(
+    namedtuple(
+        "Estimate",
+        ["stage_seconds", "disk_bytes", "num_runs"],
+    )
+):
+    """Estimated duration (by stage) and disk usage (by kind of data).
+
+    :code:`num_runs` is the number of previous runs used for the estimate
+    (0: default coefficients only).
+    """
+
+    @property
+    def total_seconds(self):
+        return sum(self.stage_seconds.values())
+
+    @property
+    def total_disk_bytes(self):
+        return sum(self.disk_bytes.values())
+
+
+def get_default_data_dir():
+    """Return the directory of data shared by Blender and the command line."""
+    return os.path.join(os.path.expanduser("~"), ".open_video_tracker")
+
+
+def get_default_history_path():
+    return os.path.join(get_default_data_dir(), HISTORY_FILE_NAME)
+
+
+def get_stage_names(settings):
+    """Return the names of the stages that run with the given settings."""
+    if settings.pipeline_mode == "EXTEND":
+        return [
+            "frame_extraction",
+            "feature_extraction",
+            "matching",
+            "image_registration",
+            "model_export_internal",
+            "model_export_external",
+        ]
+    if settings.pipeline_mode == "REGISTER_MISSING":
+        return [
+            "matching",
+            "image_registration",
+            "model_export_internal",
+            "model_export_external",
+        ]
+    names = ["frame_extraction"]
+    if settings.filter_frames:
+        names.append("filter_frames")
+    names.append("feature_extraction")
+    if settings.matching_mode == "SIMILARITY":
+        names.append("select_similar_pairs")
+    names.append("matching")
+    if settings.repair_weak_links:
+        names.append("repair_weak_links")
+    if settings.pipeline_mode == "TRIANGULATE":
+        names.append("point_triangulation")
+    else:
+        names.append("sparse_reconstruction")
+    names += [
+        "model_export_internal",
+        "model_export_external",
+    ]
+    return names
+
+
+def compute_stage_work(settings, video):
+    """Return the units of work of each stage."""
+    num_frames = video.num_frames
+    megapixels = video.width * video.height / 1e6
+    scale = min(1.0, settings.max_image_size / max(video.width, video.height))
+    feature_megapixels = megapixels * scale**2
+    if settings.matching_mode == "SIMILARITY":
+        pairs_per_frame = settings.num_similar_frames + 1
+    else:
+        pairs_per_frame = settings.overlap
+    work = {
+        "frame_extraction": num_frames * megapixels,
+        "filter_frames": num_frames,
+        "feature_extraction": num_frames
+        * feature_megapixels
+        * (1.0 if settings.use_gpu else CPU_FEATURE_FACTOR),
+        "select_similar_pairs": num_frames * settings.num_similar_frames,
+        "matching": num_frames
+        * pairs_per_frame
+        * settings.max_num_features
+        / 1000,
+        "repair_weak_links": num_frames,
+        "sparse_reconstruction": num_frames * settings.max_num_tracks / 1000,
+        "image_registration": num_frames,
+        "point_triangulation": num_frames,
+        "model_export_internal": num_frames,
+        "model_export_external": num_frames,
+    }
+    return {name: work[name] for name in get_stage_names(settings)}
+
+
+def compute_disk_work(settings, video):
+    """Return the units of work of the frames, the database and the model."""
+    num_frames = video.num_frames
+    megapixels = video.width * video.height / 1e6
+    quality_factor = QUALITY_SIZE_FACTORS.get(str(settings.quality), 1.0)
+    return {
+        "frames": num_frames * megapixels * quality_factor,
+        "database": num_frames * settings.max_num_features / 1000,
+        "model": num_frames * settings.max_num_tracks / 1000,
+    }
+
+
+def get_disk_usage(report):
+    """Return the measured bytes of the frames, the database and the model
+    of a run report."""
+    stages = report["stages"]
+
+    def get_output_bytes(name):
+        return (stages.get(name) or {}).get("output_bytes") or 0
+
+    return {
+        "frames": get_output_bytes("frame_extraction"),
+        "database": max(
+            get_output_bytes(name)
+            for name in ("feature_extraction", "matching", "repair_weak_links")
+        ),
+        "model": get_output_bytes("sparse_reconstruction")
+        + get_output_bytes("model_export_internal")
+        + get_output_bytes("model_export_external"),
+    }
+
+
+def create_history_record(report):
+    """Return the data of a run report that is used by the estimator."""
+    inputs = report["inputs"]
+    return {
+        "started": report["started"],
+        "settings": report["settings"],
+        "video": {
+            "num_frames": inputs.get("num_frames", 0)
+            + inputs.get("num_rejected_frames", 0),
+            "width": inputs.get("width", 0),
+            "height": inputs.get("height", 0),
+        },
+        "stage_seconds": {
+            name: stage["wall_time_s"]
+            for name, stage in report["stages"].items()
+            if stage["wall_time_s"] is not None
+        },
+        "disk_bytes": get_disk_usage(report),
+    }
+
+
+def record_run(history_path, report):
+    """Append a successful run to the history.
+
+    Only full runs are recorded, since the other modes process a part of
+    the video.
+    """
+    if report["settings"].get("pipeline_mode", "FULL") != "FULL":
+        return
+    record = create_history_record(report)
+    if not record["video"]["num_frames"] or not record["video"]["width"]:
+        return
+    os.makedirs(os.path.dirname(history_path), exist_ok=True)
+    with open(history_path, "a") as history_file:
+        history_file.write(json.dumps(record) + "\n")
+
+
+def read_history(history_path, max_num_runs=MAX_NUM_RUNS):
+    """Return the most recent records of the history."""
+    if not os.path.isfile(history_path):
+        return []
+    records = []
+    with open(history_path) as history_file:
+        for line in history_file:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                pass  # Partially written line
+    return records[-max_num_runs:]
+
+
+class Estimator:
+    """Estimate runs with coefficients fitted to the previous runs."""
+
+    def __init__(self, records=(), settings_type=None):
+        self.time_coefficients = dict(DEFAULT_TIME_COEFFICIENTS)
+        self.disk_coefficients = dict(DEFAULT_DISK_COEFFICIENTS)
+        self.num_runs = 0
+        if records:
+            self.fit(records, settings_type)
+
+    @classmethod
+    def from_history(cls, history_path, settings_type):
+        return cls(read_history(history_path), settings_type)
+
+    def fit(self, records, settings_type):
+        """Fit the coefficients to the measured runs.
+
+        Each coefficient is the ratio of the summed measurements and the
+        summed work, i.e. long runs have a larger weight.
+        """
+        time_sums = {}
+        disk_sums = {}
+        for record in records:
+            try:
+                settings = settings_type(
+                    **{
+                        field: value
+                        for field, value in record["settings"].items()
+                        if field in settings_type._fields
+                    }
+                )
+                video = VideoStatistics(**record["video"])
+                stage_work = compute_stage_work(settings, video)
+                disk_work = compute_disk_work(settings, video)
+            except (KeyError, TypeError, ZeroDivisionError):
+                continue  # Incomplete record
+            for name, seconds in record["stage_seconds"].items():
+                if stage_work.get(name):
+                    sums = time_sums.setdefault(name, [0.0, 0.0])
+                    sums[0] += seconds
+                    sums[1] += stage_work[name]
+            for name, num_bytes in record["disk_bytes"].items():
+                if disk_work.get(name) and num_bytes:
+                    sums = disk_sums.setdefault(name, [0.0, 0.0])
+                    sums[0] += num_bytes
+                    sums[1] += disk_work[name]
+            self.num_runs += 1
+        for name, (measured, work) in time_sums.items():
+            self.time_coefficients[name] = measured / work
+        for name, (measured, work) in disk_sums.items():
+            self.disk_coefficients[name] = measured / work
+
+    def estimate(self, settings, video):
+        """Return the :code:`Estimate` of a run."""
+        stage_seconds = {
+            name: self.time_coefficients.get(name, 0.0) * work
+            for name, work in compute_stage_work(settings, video).items()
+        }
+        disk_bytes = {
+            name: self.disk_coefficients[name] * work
+            for name, work in compute_disk_work(settings, video).items()
+        }
+        return Estimate(stage_seconds, disk_bytes, self.num_runs)
+
+
+def check_budget(estimate, max_seconds=None, max_disk_bytes=None):
+    """Return warnings for an estimate that exceeds the budget."""
+    warnings = []
+    if max_seconds and estimate.total_seconds > max_seconds:
+        warnings.append(
+            "Estimated duration exceeds the budget of "
+            f"{format_duration(max_seconds)}"
+        )
+    if max_disk_bytes and estimate.total_disk_bytes > max_disk_bytes:
+        warnings.append(
+            "Estimated disk usage exceeds the budget of "
+            f"{max_disk_bytes / 1024**3:.1f} GB"
+        )
+    return warnings
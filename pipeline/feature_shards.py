@@ -0,0 +1,110 @@
+"""Sharded feature extraction.
+
+The frames are split into contiguous shards, whose features are extracted
+into separate databases (see :code:`PipelineRunner`), e.g. by several
+feature_extractor processes. Afterwards, the shards are merged into a
+single database, whose image ids follow the frame order like the ids of a
+single feature_extractor run.
+"""
+
+import os
+import shutil
+import sqlite3
+
+SHARDS_DIR_NAME = "feature_shards"
+
+
+def split_into_shards(names, num_shards):
+    """Split the sorted names into at most :code:`num_shards` contiguous
+    shards of (almost) equal size."""
+    names = sorted(names)
+    num_shards = max(1, min(num_shards, len(names)))
+    bounds = [
+        index * len(names) // num_shards for index in range(num_shards + 1)
+    ]
+    return [names[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+def write_image_list(image_list_path, names):
+    with open(image_list_path, "w") as image_list_file:
+        for name in names:
+            image_list_file.write(name + "\n")
+
+
+def _has_table(connection, table_name):
+    row = connection.execute(
+        "SELECT name FROM sqlite_master WHERE type='table' AND name=?",
+        (table_name,),
+    ).fetchone()
+    return row is not None
+
+
+def _get_max_id(connection, table_name, column):
+    query = f"SELECT COALESCE(MAX({column}), 0) FROM {table_name}"
+    return connection.execute(query).fetchone()[0]
+
+
+def _append_shard(connection, camera_id):
+    """Append the images of the attached database :code:`shard`."""
+    image_offset = _get_max_id(connection, "images", "image_id")
+    connection.execute(
+        "INSERT INTO images (image_id, name, camera_id) "
+        "SELECT image_id + ?, name, ? FROM shard.images",
+        (image_offset, camera_id),
+    )
+    for table_name in ("keypoints", "descriptors"):
+        connection.execute(
+            f"INSERT INTO {table_name} (image_id, rows, cols, data) "
+            f"SELECT image_id + ?, rows, cols, data FROM shard.{table_name}",
+            (image_offset,),
+        )
+    # Databases of COLMAP 3.12 and later assign the images to frames of a
+    # rig, whose sensor is the camera
+    if _has_table(connection, "frames"):
+        frame_offset = _get_max_id(connection, "frames", "frame_id")
+        rig_id = connection.execute("SELECT MIN(rig_id) FROM rigs").fetchone()
+        connection.execute(
+            "INSERT INTO frames (frame_id, rig_id) "
+            "SELECT frame_id + ?, ? FROM shard.frames",
+            (frame_offset, rig_id[0]),
+        )
+        connection.execute(
+            "INSERT INTO frame_data (frame_id, data_id, sensor_id, "
+            "sensor_type) SELECT frame_id + ?, data_id + ?, ?, sensor_type "
+            "FROM shard.frame_data",
+            (frame_offset, image_offset, camera_id),
+        )
+
+
+def merge_feature_databases(shard_paths, database_path):
+    """Merge the feature databases of the shards into one database.
+
+    The shards must have been extracted with a single camera of the same
+    model and image size. The merged images share the camera of the first
+    shard and are numbered in the order of the shards. Returns the number
+    of images.
+    """
+    temp_path = database_path + ".tmp"
+    shutil.copyfile(shard_paths[0], temp_path)
+    connection = sqlite3.connect(temp_path)
+    try:
+        camera_id = connection.execute(
+            "SELECT MIN(camera_id) FROM cameras"
+        ).fetchone()[0]
+        for shard_path in shard_paths[1:]:
+            connection.execute("ATTACH DATABASE ? AS shard", (shard_path,))
+            try:
+                _append_shard(connection, camera_id)
+                connection.commit()
+            except BaseException:
+                connection.rollback()
+                raise
+            finally:
+                connection.execute("DETACH DATABASE shard")
+        num_images = connection.execute(
+            "SELECT COUNT(*) FROM images"
+        ).fetchone()[0]
+    finally:
+        connection.close()
+    os.replace(temp_path, database_path)
+    return num_images
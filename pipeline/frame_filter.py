@@ -0,0 +1,225 @@
+import json
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .thumbnails import get_frame_names
+
+
+PREVIEW_WIDTH = 320
+PREVIEW_HEIGHT = 180
+PREVIEW_FILE_NAME = "preview.gray"
+REJECTED_IMAGES_DIR_NAME = "rejected_images"
+REJECTED_FRAMES_FILE_NAME = "rejected_frames.json"
+
+
+def get_preview_output_args(
+    preview_path, width=PREVIEW_WIDTH, height=PREVIEW_HEIGHT
+):
+    """Return FFmpeg output arguments that write a downscaled gray frame.
+
+    Like the thumbnails, the previews are written as additional output of the
+    frame extraction command, i.e. the video is decoded only once. The file
+    of a previous run is overwritten (:code:`-y`).
+    """
+    return [
+        "-y",
+        "-vf", f"scale={width}:{height}:flags=area,format=gray",
+        "-f", "rawvideo",
+        preview_path,
+    ]
+
+
+def _read_previews(preview_path, start, end, width, height):
+    frame_size = width * height
+    previews = np.memmap(preview_path, dtype=np.uint8, mode="r")
+    num_frames = len(previews) // frame_size
+    end = min(end, num_frames)
+    return np.asarray(
+        previews[start * frame_size : end * frame_size], dtype=np.float32
+    ).reshape(-1, height, width)
+
+
+def _score_frame_range(preview_path, start, end, width, height):
+    """Compute sharpness and change of the frames in [start, end).
+
+    The sharpness is the variance of the Laplacian. The change of frame i is
+    the mean absolute difference to frame i - 1 (infinite for the first).
+    This function runs in a worker process.
+    """
+    first = max(start - 1, 0)
+    frames = _read_previews(preview_path, first, end, width, height)
+
+    laplacian = (
+        frames[:, :-2, 1:-1]
+        + frames[:, 2:, 1:-1]
+        + frames[:, 1:-1, :-2]
+        + frames[:, 1:-1, 2:]
+        - 4.0 * frames[:, 1:-1, 1:-1]
+    )
+    sharpness = laplacian.reshape(len(frames), -1).var(axis=1)
+
+    change = np.empty(len(frames), dtype=np.float64)
+    change[0] = np.inf
+    change[1:] = np.abs(np.diff(frames, axis=0)).mean(axis=(1, 2))
+
+    offset = start - first
+    return sharpness[offset:], change[offset:]
+
+
+def score_frames(
+    preview_path,
+    num_frames,
+    width=PREVIEW_WIDTH,
+    height=PREVIEW_HEIGHT,
+    num_workers=None,
+    chunk_size=256,
+):
+    """Compute sharpness and change of all frames in parallel processes."""
+    ranges = [
+        (start, min(start + chunk_size, num_frames))
+        for start in range(0, num_frames, chunk_size)
+    ]
+    if num_workers == 1 or len(ranges) <= 1:
+        results = [
+            _score_frame_range(preview_path, start, end, width, height)
+            for start, end in ranges
+        ]
+    else:
+        with ProcessPoolExecutor(max_workers=num_workers) as executor:
+            futures = [
+                executor.submit(
+                    _score_frame_range, preview_path, start, end, width, height
+                )
+                for start, end in ranges
+            ]
+            results = [future.result() for future in futures]
+
+    if len(results) == 0:
+        return np.empty(0), np.empty(0)
+    sharpness = np.concatenate([result[0] for result in results])
+    change = np.concatenate([result[1] for result in results])
+    return sharpness, change
+
+
+def select_frames(
+    sharpness,
+    change,
+    min_relative_sharpness,
+    min_frame_change,
+    window=15,
+    max_consecutive_rejections=10,
+):
+    """Return a mask of the frames to keep and the reason for each rejection.
+
+    A frame is blurry, if its sharpness is below :code:`min_relative_sharpness`
+    times the median sharpness of the surrounding :code:`window` frames. A
+    frame is a near duplicate, if the change accumulated since the last kept
+    frame is below :code:`min_frame_change`. The first and the last frame are
+    always kept and at most :code:`max_consecutive_rejections` frames in a
+    row are rejected, so the remaining sequence stays connected.
+    """
+    num_frames = len(sharpness)
+    keep = np.ones(num_frames, dtype=bool)
+    reasons = np.full(num_frames, "", dtype=object)
+    if num_frames < 3:
+        return keep, reasons
+
+    half_window = window // 2
+    padded = np.pad(sharpness, half_window, mode="edge")
+    local_median = np.median(
+        np.lib.stride_tricks.sliding_window_view(padded, 2 * half_window + 1),
+        axis=1,
+    )
+    is_blurry = sharpness < min_relative_sharpness * local_median
+
+    # The duplicate detection depends on the previously kept frame, i.e.
+    # it requires a (cheap) sequential pass over the precomputed changes.
+    accumulated_change = 0.0
+    num_consecutive_rejections = 0
+    for index in range(1, num_frames - 1):
+        accumulated_change += change[index]
+        if num_consecutive_rejections >= max_consecutive_rejections:
+            reason = ""
+        elif is_blurry[index]:
+            reason = "blurry"
+        elif accumulated_change < min_frame_change:
+            reason = "duplicate"
+        else:
+            reason = ""
+
+        if reason:
+            keep[index] = False
+            reasons[index] = reason
+            num_consecutive_rejections += 1
+        else:
+            accumulated_change = 0.0
+            num_consecutive_rejections = 0
+    return keep, reasons
+
+
+def filter_frames(
+    images_dir,
+    preview_path,
+    min_relative_sharpness,
+    min_frame_change,
+    num_workers=None,
+):
+    """Move blurry and near duplicate frames out of the image directory.
+
+    The rejected frames are moved to a sibling directory and listed in a
+    json file next to it. Returns the number of kept and rejected frames.
+    """
+    frame_names = get_frame_names(images_dir)
+    sharpness, change = score_frames(
+        preview_path, len(frame_names), num_workers=num_workers
+    )
+    if len(sharpness) != len(frame_names):
+        raise ValueError(
+            f"Got {len(sharpness)} previews and {len(frame_names)} frames."
+        )
+    keep, reasons = select_frames(
+        sharpness, change, min_relative_sharpness, min_frame_change
+    )
+
+    working_dir = os.path.dirname(os.path.normpath(images_dir))
+    rejected_dir = os.path.join(working_dir, REJECTED_IMAGES_DIR_NAME)
+    # The frames of a previous run have been extracted again, i.e. a frame
+    # that is kept this time must not remain in the rejected frames
+    shutil.rmtree(rejected_dir, ignore_errors=True)
+    os.makedirs(rejected_dir)
+    rejected_frames = []
+    for index in np.flatnonzero(~keep):
+        frame_name = frame_names[index]
+        os.replace(
+            os.path.join(images_dir, frame_name),
+            os.path.join(rejected_dir, frame_name),
+        )
+        rejected_frames.append(
+            {
+                "name": frame_name,
+                "reason": reasons[index],
+                "sharpness": float(sharpness[index]),
+                "change": float(change[index]),
+            }
+        )
+
+    with open(
+        os.path.join(working_dir, REJECTED_FRAMES_FILE_NAME), "w"
+    ) as rejected_frames_file:
+        json.dump(
+            {"rejected_frames": rejected_frames}, rejected_frames_file, indent=2
+        )
+    return int(keep.sum()), len(rejected_frames)
+
+
+def read_rejected_frame_names(working_dir):
+    """Return the names of the frames rejected by :code:`filter_frames`."""
+    rejected_frames_path = os.path.join(working_dir, REJECTED_FRAMES_FILE_NAME)
+    if not os.path.isfile(rejected_frames_path):
+        return []
+    with open(rejected_frames_path) as rejected_frames_file:
+        data = json.load(rejected_frames_file)
+    return [frame["name"] for frame in data.get("rejected_frames", [])]
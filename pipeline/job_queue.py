@@ -0,0 +1,390 @@
+"""Queue of pipeline jobs that run concurrently within resource budgets.
+
+Each job is a :code:`PipelineRunner` of one video with its own settings and
+working directory. :code:`JobQueue.update()` is the scheduler: it collects
+finished jobs and starts queued jobs, as long as the number of running jobs
+and the estimated CPU and memory demand of their current stages stay within
+the :code:`ResourceBudget`. The demand of a job is the sum of the declared
+resources of its running stages, so the frame extraction of one job can
+overlap the mapping of another.
+
+The queue is stored as json file and survives restarts of Blender. Jobs
+that were running when the queue was saved are queued again and resume in
+their working directory.
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from collections import namedtuple
+
+from .dag import NO_RESOURCES, StageResources
+from .resources import get_available_resources
+from .runner import (
+    STAGE_RESOURCES,
+    PipelineRunner,
+    PipelineSettings,
+    get_working_directory,
+)
+
+QUEUED = "QUEUED"
+RUNNING = "RUNNING"
+SUCCEEDED = "SUCCEEDED"
+FAILED = "FAILED"
+CANCELLED = "CANCELLED"
+FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+QUEUE_FILE_NAME = "job_queue.json"
+LOG_FILE_NAME = "pipeline.log"
+
+
+class ResourceBudget(
+    namedtuple(
+        "ResourceBudget",
+        ["max_jobs", "max_cpus", "max_memory_gb"],
+        defaults=[2, None, None],
+    )
+):
+    """Limits of the concurrently running jobs.
+
+    :code:`max_cpus` and :code:`max_memory_gb` default to the CPUs and the
+    memory available to the process (see :code:`pipeline.resources`). A
+    single job is always started, even if its demand exceeds the budget.
+    """
+
+    def resolve(self):
+        """Return a budget without None values."""
+        available = get_available_resources()
+        return self._replace(
+            max_cpus=self.max_cpus or available.cpus,
+            max_memory_gb=self.max_memory_gb or available.memory_gb,
+        )
+
+    def get_job_resources(self, num_jobs):
+        """Return the share of each of :code:`num_jobs` concurrent jobs of
+        a resolved budget, which limits the threads of their tools."""
+        num_jobs = max(1, min(num_jobs, self.max_jobs))
+        return StageResources(
+            max(1, self.max_cpus // num_jobs),
+            self.max_memory_gb / num_jobs,
+        )
+
+
+class Job:
+    """A pipeline run of one video in the queue."""
+
+    def __init__(
+        self,
+        settings,
+        base_dir,
+        job_id=None,
+        state=QUEUED,
+        message="",
+        error=None,
+        imported=False,
+        created=None,
+        registered_frame_names=(),
+    ):
+        self.job_id = job_id or uuid.uuid4().hex[:8]
+        self.settings = settings
+        self.base_dir = base_dir
+        self.state = state
+        self.message = message
+        self.error = error
+        self.imported = imported
+        self.created = created or time.time()
+        # Frames registered by the run (imported alone for REGISTER_MISSING)
+        self.registered_frame_names = list(registered_frame_names)
+        self.step = 0
+        self.fraction = 0.0
+        self.stage = None
+        self.runner = None
+        self.thread = None
+
+    @property
+    def name(self):
+        return os.path.basename(self.working_dir)
+
+    @property
+    def working_dir(self):
+        return get_working_directory(
+            self.base_dir,
+            os.path.splitext(os.path.basename(self.settings.video_path))[0],
+        )
+
+    @property
+    def model_dir(self):
+        return os.path.join(self.working_dir, "sparse", "0")
+
+    @property
+    def images_dir(self):
+        return os.path.join(self.working_dir, "images")
+
+    @property
+    def is_finished(self):
+        return self.state in FINISHED_STATES
+
+    @property
+    def resources(self):
+        """Declared resources of the running stages of the job."""
+        if self.runner is None:
+            return NO_RESOURCES
+        return self.runner.running_resources
+
+    def to_dict(self):
+        return {
+            "job_id": self.job_id,
+            "settings": self.settings._asdict(),
+            "base_dir": self.base_dir,
+            # Interrupted jobs are resumed after a restart
+            "state": QUEUED if self.state == RUNNING else self.state,
+            "message": self.message,
+            "error": self.error,
+            "imported": self.imported,
+            "created": self.created,
+            "registered_frame_names": self.registered_frame_names,
+        }
+
+    @classmethod
+    def from_dict(cls, values):
+        values = dict(values)
+        # Ignore settings of other versions of the addon
+        settings = {
+            field: value
+            for field, value in values.pop("settings").items()
+            if field in PipelineSettings._fields
+        }
+        return cls(PipelineSettings(**settings), **values)
+
+
+class JobQueue:
+    """Schedule pipeline jobs and persist the queue as json file.
+
+    :code:`update()` must be called periodically (e.g. from a Blender timer)
+    from a single thread. The runners of the jobs run on worker threads and
+    only update the progress attributes of their job.
+    """
+
+    def __init__(
+        self,
+        queue_path,
+        tool_paths,
+        budget=None,
+        trace=False,
+        history_path=None,
+        probe_cache=None,
+        artifact_cache=None,
+        task_client=None,
+    ):
+        self.queue_path = queue_path
+        self.tool_paths = tool_paths
+        self.budget = budget or ResourceBudget()
+        self.trace = trace
+        self.history_path = history_path
+        # Cached ffprobe results of the videos (optional, never probes)
+        self.probe_cache = probe_cache
+        self.artifact_cache = artifact_cache
+        # Client of the task server of the feature extraction (optional)
+        self.task_client = task_client
+        self.jobs = []
+        self._needs_save = False
+        self.load()
+
+    def load(self):
+        """Read the jobs from the queue file (if it exists)."""
+        if not os.path.isfile(self.queue_path):
+            return
+        with open(self.queue_path) as queue_file:
+            data = json.load(queue_file)
+        self.jobs = [Job.from_dict(values) for values in data["jobs"]]
+
+    def save(self):
+        """Write the jobs to the queue file."""
+        os.makedirs(os.path.dirname(self.queue_path), exist_ok=True)
+        temp_path = self.queue_path + ".tmp"
+        with open(temp_path, "w") as queue_file:
+            json.dump(
+                {"jobs": [job.to_dict() for job in self.jobs]},
+                queue_file,
+                indent=2,
+            )
+        os.replace(temp_path, self.queue_path)
+        self._needs_save = False
+
+    def get_job(self, job_id):
+        for job in self.jobs:
+            if job.job_id == job_id:
+                return job
+        raise KeyError(f"Unknown job: {job_id}")
+
+    def add_job(self, settings, base_dir):
+        """Append a job to the queue and return it.
+
+        Raises a ValueError, if an unfinished job uses the same working
+        directory.
+        """
+        job = Job(settings, base_dir)
+        for other_job in self.jobs:
+            if (
+                not other_job.is_finished
+                and other_job.working_dir == job.working_dir
+            ):
+                raise ValueError(
+                    f"{job.name} is already queued ({other_job.working_dir})"
+                )
+        self.jobs.append(job)
+        self.save()
+        return job
+
+    def remove_job(self, job_id):
+        """Cancel (if running) and remove a job from the queue."""
+        job = self.get_job(job_id)
+        self.cancel_job(job_id)
+        self.jobs.remove(job)
+        self.save()
+
+    def cancel_job(self, job_id):
+        """Cancel a queued or running job."""
+        job = self.get_job(job_id)
+        if job.state == QUEUED:
+            job.state = CANCELLED
+        elif job.state == RUNNING:
+            job.runner.cancel()
+            # The state is updated by update(), once the thread has finished
+        self.save()
+
+    def retry_job(self, job_id):
+        """Queue a finished job again."""
+        job = self.get_job(job_id)
+        if job.is_finished:
+            job.state = QUEUED
+            job.error = None
+            job.message = ""
+            job.imported = False
+            self.save()
+
+    def cancel_all(self):
+        """Cancel all jobs and wait for the running jobs to stop."""
+        for job in self.jobs:
+            if not job.is_finished:
+                self.cancel_job(job.job_id)
+        for job in self.jobs:
+            if job.thread is not None:
+                job.thread.join()
+        self.update()
+
+    @property
+    def running_jobs(self):
+        return [job for job in self.jobs if job.state == RUNNING]
+
+    @property
+    def queued_jobs(self):
+        return [job for job in self.jobs if job.state == QUEUED]
+
+    @property
+    def is_idle(self):
+        return not self.running_jobs and not self.queued_jobs
+
+    def _can_start(self, budget):
+        running_jobs = self.running_jobs
+        if not running_jobs:
+            return True
+        if len(running_jobs) >= budget.max_jobs:
+            return False
+        demand = STAGE_RESOURCES["frame_extraction"]
+        cpus = demand.cpus + sum(
+            running_job.resources.cpus for running_job in running_jobs
+        )
+        memory_gb = demand.memory_gb + sum(
+            running_job.resources.memory_gb for running_job in running_jobs
+        )
+        return cpus <= budget.max_cpus and memory_gb <= budget.max_memory_gb
+
+    def _start_job(self, job, budget):
+        log_path = os.path.join(job.working_dir, LOG_FILE_NAME)
+
+        def on_progress(progress):
+            job.step = progress.step
+            job.fraction = progress.fraction
+            job.stage = progress.stage
+            job.message = progress.message
+
+        def run():
+            os.makedirs(job.working_dir, exist_ok=True)
+            with open(log_path, "a") as log_file:
+                job.runner.log_callback = lambda line: print(
+                    line, file=log_file
+                )
+                job.runner.run()
+
+        job.runner = PipelineRunner(
+            job.settings,
+            self.tool_paths,
+            job.base_dir,
+            progress_callback=on_progress,
+            trace=self.trace,
+            history_path=self.history_path,
+            artifact_cache=self.artifact_cache,
+            task_client=self.task_client,
+            # The jobs that may run at the same time share the budget
+            max_resources=budget.get_job_resources(
+                len(self.running_jobs) + len(self.queued_jobs)
+            ),
+        )
+        if self.probe_cache is not None:
+            info = self.probe_cache.get(job.settings.video_path)
+            if info is not None:
+                job.runner.expected_num_frames = info.num_frames
+                job.runner.video_fps = info.fps
+        job.state = RUNNING
+        job.error = None
+        job.stage = "frame_extraction"
+        job.thread = threading.Thread(target=run, daemon=True)
+        job.thread.start()
+
+    def _finish_job(self, job):
+        runner = job.runner
+        if runner.succeeded:
+            job.state = SUCCEEDED
+            job.message = "Finished"
+        elif runner.is_cancelled:
+            job.state = CANCELLED
+            job.message = "Cancelled"
+        else:
+            job.state = FAILED
+            job.error = runner.error or "Pipeline execution failed"
+            job.message = job.error
+        job.step = runner.current_step
+        job.registered_frame_names = list(runner.registered_frame_names)
+        job.stage = None
+        job.runner = None
+        job.thread = None
+
+    def update(self):
+        """Collect finished jobs and start queued jobs.
+
+        Returns the jobs that finished since the last call.
+        """
+        finished_jobs = []
+        for job in self.running_jobs:
+            if not job.thread.is_alive():
+                self._finish_job(job)
+                finished_jobs.append(job)
+                self._needs_save = True
+
+        budget = self.budget.resolve()
+        for job in self.queued_jobs:
+            if not self._can_start(budget):
+                break
+            self._start_job(job, budget)
+            self._needs_save = True
+
+        if self._needs_save:
+            self.save()
+        return finished_jobs
+
+    def mark_imported(self, job):
+        job.imported = True
+        self.save()
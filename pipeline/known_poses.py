@@ -0,0 +1,70 @@
+"""Prepare a model with known camera poses for the point triangulation.
+
+The poses (e.g. of a matchmoved camera) are written as binary :code:`Colmap`
+model with the image names of the extracted frames. Colmap's
+point_triangulator requires that the image and camera ids of the model match
+the ones of the database, which are assigned by the feature extraction.
+Thus, the ids are replaced after the feature extraction and the intrinsics
+are scaled to the size of the extracted frames.
+"""
+
+import os
+
+from ..importer.read_write_model import read_model, write_model
+from .database import (
+    open_database,
+    read_camera_sizes_by_id,
+    read_image_cameras,
+)
+
+KNOWN_POSES_DIR_NAME = "known_poses"
+
+
+def scale_camera(camera, width, height):
+    """Return a (SIMPLE_)PINHOLE camera scaled to the given image size."""
+    scale_x = width / camera.width
+    scale_y = height / camera.height
+    if camera.model == "SIMPLE_PINHOLE":
+        f, cx, cy = camera.params
+        params = [f * scale_x, cx * scale_x, cy * scale_y]
+    elif camera.model == "PINHOLE":
+        fx, fy, cx, cy = camera.params
+        params = [fx * scale_x, fy * scale_y, cx * scale_x, cy * scale_y]
+    else:
+        raise ValueError(f"Unsupported camera model: {camera.model}")
+    return camera._replace(width=width, height=height, params=params)
+
+
+def write_triangulation_input(known_poses_dir, database_path, output_dir):
+    """Write the known poses with the ids of the database.
+
+    Images without features (e.g. rejected frames) are skipped. Images that
+    share a camera in the database use the intrinsics of the first of these
+    images. Returns the number of written images.
+    """
+    cameras, images, _ = read_model(known_poses_dir, ".bin")
+    connection = open_database(database_path)
+    try:
+        image_cameras = read_image_cameras(connection)
+        camera_sizes = read_camera_sizes_by_id(connection)
+    finally:
+        connection.close()
+
+    input_cameras = {}
+    input_images = {}
+    for image in sorted(images.values(), key=lambda image: image.name):
+        if image.name not in image_cameras:
+            continue
+        image_id, camera_id = image_cameras[image.name]
+        if camera_id not in input_cameras:
+            width, height = camera_sizes[camera_id]
+            input_cameras[camera_id] = scale_camera(
+                cameras[image.camera_id], width, height
+            )._replace(id=camera_id)
+        input_images[image_id] = image._replace(
+            id=image_id, camera_id=camera_id, xys=[], point3D_ids=[]
+        )
+
+    os.makedirs(output_dir, exist_ok=True)
+    write_model(input_cameras, input_images, {}, output_dir, ".bin")
+    return len(input_images)
@@ -0,0 +1,206 @@
+import numpy as np
+
+from .database import compute_database_statistics
+from .thumbnails import get_frame_names, normalize_thumbnails, read_thumbnails
+
+
+def find_gap_regions(weak_link_indices, num_images, window):
+    """Return the (merged) frame ranges surrounding the given weak links.
+
+    A weak link i connects the frames i and i + 1. The corresponding region
+    covers the :code:`window` frames before and after the link. Overlapping
+    regions are merged. The ranges are returned as inclusive (start, end)
+    tuples.
+    """
+    regions = []
+    for index in np.sort(np.asarray(weak_link_indices, dtype=np.int64)):
+        start = max(int(index) - window + 1, 0)
+        end = min(int(index) + window, num_images - 1)
+        if regions and start <= regions[-1][1]:
+            regions[-1] = (regions[-1][0], max(regions[-1][1], end))
+        else:
+            regions.append((start, end))
+    return regions
+
+
+def compute_bridging_pairs(weak_link_indices, num_images, window):
+    """Return the image index pairs (a, b) that bridge the given weak links.
+
+    For each weak link i all pairs with a <= i < b and b - a <= window are
+    generated. The result is a sorted (N, 2) array without duplicates, i.e.
+    the number of pairs grows with the number of weak links and not with the
+    length of the image sequence.
+    """
+    weak_link_indices = np.asarray(weak_link_indices, dtype=np.int64)
+    if len(weak_link_indices) == 0 or num_images < 2:
+        return np.empty((0, 2), dtype=np.int64)
+
+    offsets = np.arange(window)
+    steps = np.arange(1, window + 1)
+    # first[k, o] = weak_link[k] - o, second[k, o, s] = first[k, o] + s
+    first = weak_link_indices[:, None] - offsets[None, :]
+    second = first[:, :, None] + steps[None, None, :]
+    first = np.broadcast_to(first[:, :, None], second.shape)
+    links = np.broadcast_to(
+        weak_link_indices[:, None, None], second.shape
+    )
+
+    valid = (first >= 0) & (second < num_images) & (second > links)
+    pair_keys = np.unique(first[valid] * num_images + second[valid])
+    return np.stack([pair_keys // num_images, pair_keys % num_images], axis=1)
+
+
+def compute_neighbor_pairs(image_indices, num_images, window):
+    """Return the image index pairs (a, b) that connect the given images to
+    their neighbors.
+
+    All pairs with 0 < b - a <= window, of which a or b is one of the given
+    images, are generated. The result is a sorted (N, 2) array without
+    duplicates, i.e. the number of pairs grows with the number of given
+    images and not with the length of the image sequence.
+    """
+    image_indices = np.asarray(image_indices, dtype=np.int64)
+    if len(image_indices) == 0 or num_images < 2:
+        return np.empty((0, 2), dtype=np.int64)
+
+    offsets = np.arange(1, window + 1)
+    # Pairs with the preceding and with the following images
+    first = np.concatenate(
+        [
+            (image_indices[:, None] - offsets[None, :]).ravel(),
+            np.repeat(image_indices, window),
+        ]
+    )
+    second = np.concatenate(
+        [
+            np.repeat(image_indices, window),
+            (image_indices[:, None] + offsets[None, :]).ravel(),
+        ]
+    )
+    valid = (first >= 0) & (second < num_images)
+    pair_keys = np.unique(first[valid] * num_images + second[valid])
+    return np.stack([pair_keys // num_images, pair_keys % num_images], axis=1)
+
+
+def select_similar_pairs(
+    thumbnails, num_neighbors, min_similarity, block_size=1024
+):
+    """Return image index pairs selected by thumbnail similarity.
+
+    Each image is paired with its successor (to keep the sequence connected)
+    and with its :code:`num_neighbors` most similar images whose similarity
+    is at least :code:`min_similarity`. Similar images may be far apart in
+    time, which allows to close loops. The similarity matrix is computed in
+    blocks of rows to bound the memory consumption. The result is a sorted
+    (N, 2) array with a < b and without duplicates.
+    """
+    num_images = len(thumbnails)
+    if num_images < 2:
+        return np.empty((0, 2), dtype=np.int64)
+
+    vectors = normalize_thumbnails(thumbnails)
+    num_neighbors = min(num_neighbors, num_images - 1)
+
+    sequential = np.arange(num_images - 1)
+    pair_keys = [sequential * num_images + sequential + 1]
+    for block_start in range(0, num_images, block_size):
+        block_end = min(block_start + block_size, num_images)
+        similarity = vectors[block_start:block_end] @ vectors.T
+        rows = np.arange(block_end - block_start)
+        # Exclude the trivial match of each image with itself
+        similarity[rows, rows + block_start] = -np.inf
+
+        if num_neighbors > 0:
+            neighbors = np.argpartition(
+                -similarity, num_neighbors - 1, axis=1
+            )[:, :num_neighbors]
+            neighbor_similarity = similarity[rows[:, None], neighbors]
+            first = np.broadcast_to(
+                (rows + block_start)[:, None], neighbors.shape
+            )
+            valid = neighbor_similarity >= min_similarity
+            first = first[valid]
+            second = neighbors[valid]
+            pair_keys.append(
+                np.minimum(first, second) * num_images
+                + np.maximum(first, second)
+            )
+
+    pair_keys = np.unique(np.concatenate(pair_keys))
+    return np.stack([pair_keys // num_images, pair_keys % num_images], axis=1)
+
+
+def write_pair_list(pair_list_path, image_names, pairs):
+    """Write image pairs in the format expected by :code:`matches_importer`."""
+    with open(pair_list_path, "w") as pair_list_file:
+        for first, second in pairs:
+            pair_list_file.write(
+                f"{image_names[first]} {image_names[second]}\n"
+            )
+
+
+def write_repair_pair_list(
+    database_path, pair_list_path, min_num_inliers, window
+):
+    """Write a pair list that re-matches the weak links of a database.
+
+    Returns the frame ranges containing weak links and the number of
+    written pairs.
+    """
+    statistics = compute_database_statistics(database_path, min_num_inliers)
+    regions = find_gap_regions(
+        statistics.weak_link_indices, len(statistics.image_names), window
+    )
+    pairs = compute_bridging_pairs(
+        statistics.weak_link_indices, len(statistics.image_names), window
+    )
+    write_pair_list(pair_list_path, statistics.image_names, pairs)
+    return regions, len(pairs)
+
+
+def write_similarity_pair_list(
+    thumbnail_path,
+    images_dir,
+    pair_list_path,
+    num_neighbors,
+    min_similarity,
+    rejected_frame_names=(),
+):
+    """Write a pair list selected by the similarity of the frame thumbnails.
+
+    The thumbnails cover all extracted frames. Thumbnails of frames that
+    have been removed from the image directory (see
+    :code:`rejected_frame_names`) are ignored. Returns the number of written
+    pairs.
+    """
+    image_names = get_frame_names(images_dir)
+    thumbnails = read_thumbnails(thumbnail_path)
+    extracted_names = sorted(image_names + list(rejected_frame_names))
+    if len(thumbnails) != len(extracted_names):
+        raise ValueError(
+            f"Got {len(thumbnails)} thumbnails and {len(extracted_names)}"
+            " frames."
+        )
+    rejected = set(rejected_frame_names)
+    thumbnails = thumbnails[
+        [name not in rejected for name in extracted_names]
+    ]
+    pairs = select_similar_pairs(thumbnails, num_neighbors, min_similarity)
+    write_pair_list(pair_list_path, image_names, pairs)
+    return len(pairs)
+
+
+def write_neighbor_pair_list(images_dir, pair_list_path, frame_names, window):
+    """Write a pair list that matches the given frames with their
+    :code:`window` preceding and following frames of the image directory.
+
+    Returns the number of written pairs.
+    """
+    image_names = get_frame_names(images_dir)
+    selected = set(frame_names)
+    image_indices = [
+        index for index, name in enumerate(image_names) if name in selected
+    ]
+    pairs = compute_neighbor_pairs(image_indices, len(image_names), window)
+    write_pair_list(pair_list_path, image_names, pairs)
+    return len(pairs)
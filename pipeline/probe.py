@@ -0,0 +1,220 @@
+"""Read the stream information of videos with ffprobe and cache it.
+
+Probing a video on a network share can take seconds, so the results are
+stored in a json file, keyed by the path, the size and the modification
+time of the video. A changed video is probed again.
+"""
+
+import json
+import os
+import subprocess
+import threading
+from collections import namedtuple
+
+from .estimator import get_default_data_dir
+
+PROBE_CACHE_FILE_NAME = "probe_cache.json"
+# Only the most recently probed videos are kept
+MAX_NUM_CACHE_ENTRIES = 1000
+PROBE_TIMEOUT = 30
+
+
+class VideoInfo(
+    namedtuple(
+        "VideoInfo",
+        [
+            "width",
+            "height",
+            "fps",
+            "duration",
+            "num_frames",
+            "codec",
+            "rotation",
+            "bit_rate",
+        ],
+    )
+):
+    """Stream information of the first video stream.
+
+    :code:`duration` is given in seconds and :code:`bit_rate` in bits per
+    second (None, if unknown). :code:`num_frames` is the frame count of the
+    container or, if it is missing, computed from the duration and frame
+    rate. :code:`rotation` is the display rotation in degrees.
+    """
+
+
+class ProbeError(Exception):
+    """ffprobe failed or the file contains no video stream."""
+
+
+def _parse_rate(rate):
+    try:
+        numerator, denominator = rate.split("/")
+        return float(numerator) / float(denominator)
+    except (AttributeError, ValueError, ZeroDivisionError):
+        return None
+
+
+def _parse_number(value, number_type=float):
+    try:
+        return number_type(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _get_rotation(stream):
+    for side_data in stream.get("side_data_list", []):
+        if "rotation" in side_data:
+            return int(side_data["rotation"]) % 360
+    rotation = _parse_number(stream.get("tags", {}).get("rotate"), int)
+    return rotation % 360 if rotation is not None else 0
+
+
+def parse_probe_output(data):
+    """Return the :code:`VideoInfo` of the json output of ffprobe."""
+    for stream in data.get("streams", []):
+        if stream.get("codec_type") == "video":
+            break
+    else:
+        raise ProbeError("No video stream found")
+
+    fps = _parse_rate(stream.get("avg_frame_rate")) or _parse_rate(
+        stream.get("r_frame_rate")
+    )
+    duration = _parse_number(stream.get("duration")) or _parse_number(
+        data.get("format", {}).get("duration")
+    )
+    num_frames = _parse_number(stream.get("nb_frames"), int)
+    if not num_frames and fps and duration:
+        num_frames = int(round(duration * fps))
+    bit_rate = _parse_number(stream.get("bit_rate"), int) or _parse_number(
+        data.get("format", {}).get("bit_rate"), int
+    )
+    return VideoInfo(
+        width=stream.get("width"),
+        height=stream.get("height"),
+        fps=fps,
+        duration=duration,
+        num_frames=num_frames,
+        codec=stream.get("codec_name"),
+        rotation=_get_rotation(stream),
+        bit_rate=bit_rate,
+    )
+
+
+def probe_video(ffprobe_path, video_path, timeout=PROBE_TIMEOUT):
+    """Run ffprobe and return the :code:`VideoInfo` of a video.
+
+    Raises a ProbeError, if ffprobe fails.
+    """
+    cmd = [
+        ffprobe_path,
+        "-v", "quiet",
+        "-print_format", "json",
+        "-show_format",
+        "-show_streams",
+        video_path,
+    ]
+    try:
+        result = subprocess.run(
+            cmd, capture_output=True, text=True, timeout=timeout
+        )
+    except subprocess.TimeoutExpired:
+        raise ProbeError("ffprobe timeout")
+    except OSError as e:
+        raise ProbeError(f"Could not run ffprobe: {e}")
+    if result.returncode != 0:
+        raise ProbeError(f"ffprobe error: {result.stderr}")
+    try:
+        data = json.loads(result.stdout)
+    except ValueError:
+        raise ProbeError("Failed to parse ffprobe output")
+    return parse_probe_output(data)
+
+
+def get_default_probe_cache_path():
+    return os.path.join(get_default_data_dir(), PROBE_CACHE_FILE_NAME)
+
+
+class ProbeCache:
+    """Persistent cache of :code:`VideoInfo` (thread safe)."""
+
+    def __init__(self, cache_path, max_num_entries=MAX_NUM_CACHE_ENTRIES):
+        self.cache_path = cache_path
+        self.max_num_entries = max_num_entries
+        self._entries = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_key(video_path):
+        """Return the key of a video or None, if it does not exist."""
+        try:
+            stat = os.stat(video_path)
+        except OSError:
+            return None
+        path = os.path.abspath(video_path)
+        return f"{path}|{stat.st_size}|{stat.st_mtime_ns}"
+
+    def _load(self):
+        if self._entries is not None:
+            return
+        self._entries = {}
+        try:
+            with open(self.cache_path) as cache_file:
+                self._entries = json.load(cache_file)["entries"]
+        except (OSError, ValueError, KeyError):
+            pass  # Missing or damaged cache
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        temp_path = f"{self.cache_path}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w") as cache_file:
+            json.dump({"entries": self._entries}, cache_file)
+        os.replace(temp_path, self.cache_path)
+
+    def get(self, video_path, key=None):
+        """Return the cached :code:`VideoInfo` of a video or None."""
+        key = key or self.get_key(video_path)
+        if key is None:
+            return None
+        with self._lock:
+            self._load()
+            values = self._entries.get(key)
+        if values is None:
+            return None
+        try:
+            return VideoInfo(**values)
+        except TypeError:
+            return None  # Written by another version
+
+    def put(self, video_path, info, key=None):
+        key = key or self.get_key(video_path)
+        if key is None:
+            return
+        with self._lock:
+            self._load()
+            # Drop the older entries of the same file
+            path = key.rsplit("|", 2)[0]
+            for other_key in list(self._entries):
+                if other_key.rsplit("|", 2)[0] == path:
+                    del self._entries[other_key]
+            self._entries[key] = info._asdict()
+            # The entries are kept in insertion order
+            while len(self._entries) > self.max_num_entries:
+                del self._entries[next(iter(self._entries))]
+            try:
+                self._save()
+            except OSError:
+                pass  # The cache is only an optimization
+
+    def probe(self, ffprobe_path, video_path, timeout=PROBE_TIMEOUT):
+        """Return the cached information or probe the video.
+
+        Raises a ProbeError, if ffprobe fails.
+        """
+        key = self.get_key(video_path)
+        info = self.get(video_path, key) if key is not None else None
+        if info is None:
+            info = probe_video(ffprobe_path, video_path, timeout)
+            self.put(video_path, info, key)
+        return info
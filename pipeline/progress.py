@@ -0,0 +1,170 @@
+"""Parse the output of FFmpeg, COLMAP and GLOMAP into stage progress.
+
+A parser turns a single output line into a :code:`(done, total, unit)`
+tuple (or None, if the line contains no progress). A
+:code:`ProgressTracker` combines the parsed values of a stage into the
+fraction, the throughput and the estimated remaining time.
+"""
+
+import re
+import time
+from collections import namedtuple
+
+
+class StageProgress(
+    namedtuple(
+        "StageProgress", ["done", "total", "unit", "fraction", "rate", "eta"]
+    )
+):
+    """Progress of a running stage.
+
+    :code:`total`, :code:`fraction`, :code:`rate` (units per second) and
+    :code:`eta` (remaining seconds) are None, if they are unknown.
+    """
+
+    def format(self):
+        """Return a short description, e.g. '120/500 images, 35.2/s, 0:11'."""
+        if self.total is not None:
+            text = f"{self.done}/{self.total} {self.unit}"
+        else:
+            text = f"{self.done} {self.unit}"
+        if self.rate is not None:
+            text += f", {self.rate:.1f}/s"
+        if self.eta is not None:
+            text += f", {format_duration(self.eta)} left"
+        return text
+
+
+def format_duration(seconds):
+    """Format a duration as h:mm:ss or m:ss."""
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
+
+
+class FFmpegStatsParser:
+    """Parse the :code:`-stats` lines of FFmpeg (:code:`frame=  123 ...`).
+
+    The total is only known, if the number of frames of the video is given.
+    """
+
+    pattern = re.compile(r"frame=\s*(\d+)")
+    unit = "frames"
+    measures_rate = True
+
+    def __init__(self, num_frames=None):
+        self.num_frames = num_frames
+
+    def parse(self, line):
+        match = self.pattern.search(line)
+        if match is None:
+            return None
+        return int(match.group(1)), self.num_frames, self.unit
+
+
+class ColmapProgressParser:
+    """Parse the :code:`[i/N]` counters of the COLMAP feature extraction
+    (:code:`Processed file [i/N]`) and matching (:code:`Matching image
+    [i/N]`, :code:`Matching block [i/N]`)."""
+
+    pattern = re.compile(
+        r"(Processed file|Matching image|Matching block) \[(\d+)/(\d+)\]"
+    )
+    measures_rate = True
+    units = {
+        "Processed file": "images",
+        "Matching image": "images",
+        "Matching block": "blocks",
+    }
+
+    def parse(self, line):
+        match = self.pattern.search(line)
+        if match is None:
+            return None
+        unit = self.units[match.group(1)]
+        return int(match.group(2)), int(match.group(3)), unit
+
+
+class GlomapPhaseParser:
+    """Parse the phase headers of the GLOMAP mapper (:code:`Running ...`).
+
+    The phases are counted, i.e. the progress is coarse and the remaining
+    time is extrapolated from the elapsed time.
+    """
+
+    measures_rate = False
+    phases = (
+        "view graph calibration",
+        "relative pose estimation",
+        "rotation averaging",
+        "track establishment",
+        "global positioning",
+        "bundle adjustment",
+        "retriangulation",
+        "postprocessing",
+    )
+    pattern = re.compile(r"Running (.+?) \.\.\.")
+    unit = "phases"
+
+    def parse(self, line):
+        match = self.pattern.search(line)
+        if match is None or match.group(1) not in self.phases:
+            return None
+        # A phase is done, once the next one starts
+        return self.phases.index(match.group(1)), len(self.phases), self.unit
+
+
+class ProgressTracker:
+    """Compute the rate and the remaining time of a stage.
+
+    :code:`update()` returns a :code:`StageProgress` at most every
+    :code:`min_interval` seconds (and always for the last unit).
+    """
+
+    def __init__(self, parser, min_interval=0.5, clock=time.perf_counter):
+        self.parser = parser
+        self.min_interval = min_interval
+        self.clock = clock
+        self.start_time = clock()
+        self.last_report_time = None
+        self.first_sample = None
+
+    def update(self, line):
+        parsed = self.parser.parse(line)
+        if parsed is None:
+            return None
+        done, total, unit = parsed
+        now = self.clock()
+        is_complete = total is not None and done >= total
+        if (
+            self.last_report_time is not None
+            and now - self.last_report_time < self.min_interval
+            and not is_complete
+        ):
+            return None
+        self.last_report_time = now
+
+        # The rate is measured from the first counter, since the tools spend
+        # some time on loading before they start counting
+        if self.first_sample is None:
+            self.first_sample = (done, now)
+        first_done, first_time = self.first_sample
+        rate = None
+        if (
+            self.parser.measures_rate
+            and now > first_time
+            and done > first_done
+        ):
+            rate = (done - first_done) / (now - first_time)
+
+        fraction = eta = None
+        if total:
+            fraction = min(done / total, 1.0)
+            if rate is not None:
+                eta = max(total - done, 0) / rate
+            elif fraction > 0:
+                elapsed = now - self.start_time
+                eta = elapsed / fraction - elapsed
+        return StageProgress(done, total, unit, fraction, rate, eta)
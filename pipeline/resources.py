@@ -0,0 +1,309 @@
+"""CPU and memory limits of the process and the threads of the tools.
+
+In containers the CPU quota and the memory limit of the cgroup (v1 or v2)
+and the CPU affinity of the process are usually smaller than the number of
+cores (:code:`os.cpu_count()`) and the physical memory, which COLMAP and
+GLOMAP use by default. The :code:`ResourceGovernor` divides the available
+resources between the running stages and passes the number of threads to
+the tools, so that they do not oversubscribe the CPUs and stay below the
+memory limit. Tools without a thread option are pinned to as many CPUs and
+the data memory of each tool is limited to the memory share of its stage.
+"""
+
+import itertools
+import math
+import os
+import re
+import subprocess
+import threading
+from collections import namedtuple
+
+try:
+    import resource
+except ImportError:
+    resource = None  # Not available on Windows
+
+from .dag import NO_RESOURCES, StageResources
+from .telemetry import get_total_memory_gb
+
+CGROUP_ROOT = "/sys/fs/cgroup"
+# Directories of the cgroup v1 hierarchies below the root
+_CGROUP_V1_DIR_NAMES = {
+    "cpu": ("cpu", "cpu,cpuacct", "cpuacct,cpu"),
+    "memory": ("memory",),
+}
+# cgroup v1 reports "no limit" as a large number close to 2^63
+_MAX_MEMORY_LIMIT = 2**60
+HELP_TIMEOUT = 10  # seconds
+_OPTION_PATTERN = re.compile(r"--([A-Za-z_][\w.]*)")
+# Options of each (executable, command), see get_tool_options
+_tool_options = {}
+_tool_options_lock = threading.Lock()
+# Start of the CPUs of the next pinned tool, see select_cpus
+_cpu_offsets = itertools.count()
+
+
+def _read_cgroup_file(path):
+    try:
+        with open(path) as cgroup_file:
+            return cgroup_file.read().strip()
+    except OSError:
+        return None
+
+
+def _read_process_cgroups():
+    """Return the cgroup path of each controller of the process (the key
+    of the cgroup v2 path is an empty string)."""
+    paths = {}
+    content = _read_cgroup_file("/proc/self/cgroup")
+    for line in (content or "").splitlines():
+        # hierarchy-ID:controller-list:cgroup-path
+        fields = line.split(":", 2)
+        if len(fields) != 3:
+            continue
+        for controller in fields[1].split(","):
+            paths[controller] = fields[2]
+    return paths
+
+
+def get_cgroup_dirs(controller, root=CGROUP_ROOT):
+    """Return the existing cgroup directories of the process for the
+    controller (:code:`cpu` or :code:`memory`), innermost first.
+
+    The limits of the parent cgroups apply as well. Inside a container
+    only the directories below its cgroup namespace are visible.
+    """
+    paths = _read_process_cgroups()
+    if controller in paths:
+        base_dirs = [
+            os.path.join(root, dir_name)
+            for dir_name in _CGROUP_V1_DIR_NAMES[controller]
+        ]
+        path = paths[controller]
+    elif "" in paths:
+        base_dirs = [root]
+        path = paths[""]
+    else:
+        return []
+    cgroup_dirs = []
+    for base_dir in base_dirs:
+        relative_path = path.strip("/")
+        while True:
+            cgroup_dir = os.path.join(base_dir, relative_path)
+            if os.path.isdir(cgroup_dir) and cgroup_dir not in cgroup_dirs:
+                cgroup_dirs.append(cgroup_dir)
+            if not relative_path:
+                break
+            relative_path = os.path.dirname(relative_path)
+    return cgroup_dirs
+
+
+def _read_cpu_limit(cgroup_dir):
+    # cgroup v2: "<quota> <period>" or "max <period>"
+    content = _read_cgroup_file(os.path.join(cgroup_dir, "cpu.max"))
+    if content is not None:
+        quota, _, period = content.partition(" ")
+        if quota == "max" or not period:
+            return None
+        return int(quota) / int(period)
+    # cgroup v1: a quota of -1 means no limit
+    quota = _read_cgroup_file(os.path.join(cgroup_dir, "cpu.cfs_quota_us"))
+    period = _read_cgroup_file(os.path.join(cgroup_dir, "cpu.cfs_period_us"))
+    if quota is None or period is None or int(quota) <= 0:
+        return None
+    return int(quota) / int(period)
+
+
+def _read_memory_limit(cgroup_dir):
+    content = _read_cgroup_file(os.path.join(cgroup_dir, "memory.max"))
+    if content is None:
+        content = _read_cgroup_file(
+            os.path.join(cgroup_dir, "memory.limit_in_bytes")
+        )
+    if content is None or content == "max":
+        return None
+    limit = int(content)
+    return limit if limit < _MAX_MEMORY_LIMIT else None
+
+
+def _get_min_limit(read_limit, cgroup_dirs):
+    limits = []
+    for cgroup_dir in cgroup_dirs:
+        try:
+            limit = read_limit(cgroup_dir)
+        except ValueError:
+            continue  # Unexpected format
+        if limit is not None:
+            limits.append(limit)
+    return min(limits, default=None)
+
+
+def get_cpu_limit(root=CGROUP_ROOT):
+    """Return the CPU quota of the cgroup (in CPUs, e.g. 1.5) or None."""
+    return _get_min_limit(_read_cpu_limit, get_cgroup_dirs("cpu", root))
+
+
+def get_memory_limit_gb(root=CGROUP_ROOT):
+    """Return the memory limit of the cgroup (in GB) or None."""
+    limit = _get_min_limit(
+        _read_memory_limit, get_cgroup_dirs("memory", root)
+    )
+    return None if limit is None else limit / 1024**3
+
+
+def get_affinity_cpu_count():
+    """Return the number of CPUs the process may run on."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except (AttributeError, OSError):
+        # Not available on Windows and macOS
+        return os.cpu_count() or 1
+
+
+def get_available_resources(root=CGROUP_ROOT):
+    """Return the CPUs and the memory (in GB) available to the process.
+
+    The CPUs are limited by the affinity and the (rounded down) CPU quota,
+    the memory by the physical memory and the memory limit of the cgroup.
+    Unknown memory is infinite.
+    """
+    cpus = get_affinity_cpu_count()
+    cpu_limit = get_cpu_limit(root)
+    if cpu_limit is not None:
+        cpus = min(cpus, max(1, math.floor(cpu_limit)))
+    memory_limits = [
+        limit
+        for limit in (get_total_memory_gb(), get_memory_limit_gb(root))
+        if limit is not None
+    ]
+    return StageResources(cpus, min(memory_limits, default=float("inf")))
+
+
+def limit_resources(resources, max_resources):
+    """Return the minimum of both resources."""
+    return StageResources(
+        min(resources.cpus, max_resources.cpus),
+        min(resources.memory_gb, max_resources.memory_gb),
+    )
+
+
+def get_tool_options(executable, command, timeout=HELP_TIMEOUT):
+    """Return the names of the options that the help of a tool command
+    (e.g. :code:`glomap mapper`) lists (cached).
+
+    COLMAP and GLOMAP fail on unknown options, so options of newer versions
+    are only passed if they are listed. Returns an empty set, if the help
+    can not be read.
+    """
+    key = (executable, command)
+    with _tool_options_lock:
+        if key in _tool_options:
+            return _tool_options[key]
+    try:
+        result = subprocess.run(
+            [executable, command, "--help"],
+            capture_output=True,
+            text=True,
+            timeout=timeout,
+        )
+        options = set(_OPTION_PATTERN.findall(result.stdout + result.stderr))
+    except (OSError, subprocess.SubprocessError):
+        options = set()
+    with _tool_options_lock:
+        _tool_options[key] = options
+    return options
+
+
+def select_cpus(num_cpus):
+    """Return :code:`num_cpus` CPUs of the affinity of the process.
+
+    Consecutive calls start at different CPUs, so that concurrently pinned
+    tools are spread over the CPUs. Returns None, if the process does not
+    have more CPUs (or the affinity is not available).
+    """
+    try:
+        cpus = sorted(os.sched_getaffinity(0))
+    except (AttributeError, OSError):
+        return None
+    if num_cpus >= len(cpus):
+        return None
+    start = next(_cpu_offsets) * num_cpus
+    return {cpus[(start + index) % len(cpus)] for index in range(num_cpus)}
+
+
+def limit_process(pid, cpus=None, memory_gb=None):
+    """Limit a child process to the CPUs and its data memory (in GB).
+
+    The memory is limited with :code:`RLIMIT_DATA`, i.e. allocations beyond
+    the limit fail in the tool. The address space (:code:`RLIMIT_AS`)
+    includes the reservations of the GPU drivers and the thread stacks and
+    is not limited. Limits that the platform does not support are ignored.
+    """
+    if cpus:
+        try:
+            os.sched_setaffinity(pid, cpus)
+        except (AttributeError, OSError):
+            pass
+    if memory_gb is None or not math.isfinite(memory_gb) or memory_gb <= 0:
+        return
+    if resource is None or not hasattr(resource, "prlimit"):
+        return
+    limit = int(memory_gb * 1024**3)
+    try:
+        resource.prlimit(pid, resource.RLIMIT_DATA, (limit, limit))
+    except (OSError, ValueError):
+        pass  # E.g. the process has already finished
+
+
+class Allocation(
+    namedtuple("Allocation", ["num_concurrent", "num_threads"])
+):
+    """Number of concurrently running work units (e.g. feature extraction
+    shards) of a stage and the number of threads of each unit."""
+
+
+class ResourceGovernor:
+    """Assign threads to the tools of the running stages.
+
+    A stage gets the resources of the budget that are not demanded by the
+    other running stages (see :code:`StageResources` of the stages). Its
+    threads are limited by the CPUs and by the memory of this share, where
+    each thread is expected to need the memory per CPU of the demand of
+    the stage. The resulting threads are divided between the work units of
+    the stage.
+    """
+
+    def __init__(self, max_resources, stage_resources):
+        self.max_resources = max_resources
+        self.stage_resources = stage_resources
+
+    def get_share(self, stage_name, running_stage_names=()):
+        """Return the resources that are available to a stage."""
+        others = sum(
+            (
+                self.stage_resources[name]
+                for name in running_stage_names
+                if name != stage_name and name in self.stage_resources
+            ),
+            NO_RESOURCES,
+        )
+        return StageResources(
+            max(1, self.max_resources.cpus - others.cpus),
+            max(0.0, self.max_resources.memory_gb - others.memory_gb),
+        )
+
+    def allocate(self, stage_name, running_stage_names=(), num_units=1):
+        """Return the :code:`Allocation` of a stage with :code:`num_units`
+        work units."""
+        share = self.get_share(stage_name, running_stage_names)
+        num_threads = share.cpus
+        demand = self.stage_resources.get(stage_name)
+        if demand is not None and demand.cpus > 0 and demand.memory_gb > 0:
+            memory_per_thread = demand.memory_gb / demand.cpus
+            if math.isfinite(share.memory_gb):
+                num_threads = min(
+                    num_threads, int(share.memory_gb // memory_per_thread)
+                )
+        num_threads = max(1, num_threads)
+        num_concurrent = max(1, min(num_units, num_threads))
+        return Allocation(num_concurrent, num_threads // num_concurrent)
@@ -0,0 +1,1750 @@
+import asyncio
+import codecs
+import os
+import queue
+import re
+import shutil
+import sqlite3
+import threading
+from collections import namedtuple
+
+from ..importer.read_write_model import read_images_binary
+from ..importer.tracing import begin_trace, end_trace, trace_span
+from .artifact_cache import get_features_key, get_frames_key, hash_video
+from .dag import NO_RESOURCES, Stage, StageGraph, StageResources
+from .frame_filter import (
+    PREVIEW_FILE_NAME,
+    filter_frames,
+    get_preview_output_args,
+    read_rejected_frame_names,
+)
+from .database import (
+    open_database,
+    read_camera_ids,
+    read_camera_sizes,
+    read_images,
+    read_keypoint_counts,
+)
+from .estimator import record_run
+from .feature_shards import (
+    SHARDS_DIR_NAME,
+    merge_feature_databases,
+    split_into_shards,
+    write_image_list,
+)
+from .known_poses import KNOWN_POSES_DIR_NAME, write_triangulation_input
+from .matching import (
+    write_neighbor_pair_list,
+    write_repair_pair_list,
+    write_similarity_pair_list,
+)
+from .progress import (
+    ColmapProgressParser,
+    FFmpegStatsParser,
+    GlomapPhaseParser,
+    ProgressTracker,
+)
+from .resources import (
+    ResourceGovernor,
+    get_available_resources,
+    get_tool_options,
+    limit_process,
+    limit_resources,
+    select_cpus,
+)
+from .task_server import SUCCEEDED, TaskError
+from .telemetry import (
+    REPORT_FILE_NAME,
+    ProcessSampler,
+    RunTelemetry,
+    get_path_size,
+)
+from .thumbnails import THUMBNAIL_FILE_NAME, get_thumbnail_output_args
+
+
+NUM_STEPS = 7
+CHUNK_SIZE = 65536
+SAMPLING_INTERVAL = 0.2
+_LINE_SEPARATOR = re.compile(r"\r\n|\r|\n")
+VIDEO_EXTENSIONS = [".mp4", ".avi", ".mov", ".mkv", ".wmv", ".flv", ".webm"]
+
+# Rough estimates of the external tools with the default settings
+STAGE_RESOURCES = {
+    "frame_extraction": StageResources(2, 1.0),
+    "filter_frames": StageResources(1, 1.0),
+    "feature_extraction": StageResources(4, 4.0),
+    "select_similar_pairs": StageResources(1, 0.5),
+    "matching": StageResources(4, 4.0),
+    "repair_weak_links": StageResources(4, 4.0),
+    "sparse_reconstruction": StageResources(8, 8.0),
+    "model_export_internal": StageResources(1, 1.0),
+    "model_export_external": StageResources(1, 1.0),
+    "image_registration": StageResources(4, 4.0),
+    "point_triangulation": StageResources(4, 4.0),
+}
+# Thread options of the solvers of GLOMAP and of the COLMAP bundle adjuster.
+# Not every version has them, so they are only passed if the help lists
+# them (otherwise the tool is pinned to the CPUs of its threads).
+GLOMAP_MAPPER_THREAD_OPTIONS = (
+    "--GlobalPositioning.num_threads",
+    "--BundleAdjustment.num_threads",
+)
+BUNDLE_ADJUSTER_THREAD_OPTIONS = ("--BundleAdjustment.num_threads",)
+_FRAME_NUMBER = re.compile(r"frame_(\d+)\.jpg$")
+
+
+class PipelineSettings(
+    namedtuple(
+        "PipelineSettings",
+        [
+            "video_path",
+            "quality",
+            "filter_frames",
+            "min_relative_sharpness",
+            "min_frame_change",
+            "max_image_size",
+            "use_gpu",
+            "camera_model",
+            "max_num_features",
+            "max_num_tracks",
+            "constraint_type",
+            "max_epipolar_error",
+            "max_global_positioning_iterations",
+            "max_bundle_adjustment_iterations",
+            "overlap",
+            "matching_mode",
+            "num_similar_frames",
+            "min_similarity",
+            "repair_weak_links",
+            "repair_overlap",
+            "min_num_inliers",
+            "pipeline_mode",
+            "num_feature_shards",
+        ],
+        defaults=[
+            "2",
+            False,
+            0.5,
+            1.0,
+            2000,
+            True,
+            "SIMPLE_RADIAL",
+            8192,
+            1000,
+            "POINTS_AND_CAMERAS_BALANCED",
+            1,
+            100,
+            200,
+            10,
+            "SEQUENTIAL",
+            10,
+            0.5,
+            False,
+            30,
+            30,
+            "FULL",
+            1,
+        ],
+    )
+):
+    """Parameters of a pipeline run.
+
+    The fields and defaults correspond to the scene properties of the addon
+    (see :code:`OpenVideoTrackerProperties`). :code:`pipeline_mode` is
+    :code:`FULL` (reconstruct the whole video), :code:`EXTEND` (register
+    the frames appended to the video since the last run into its model),
+    :code:`REGISTER_MISSING` (register the frames of the database that are
+    missing in the model) or :code:`TRIANGULATE` (triangulate the points of
+    the known camera poses in :code:`known_poses/`, see
+    :code:`pipeline.known_poses`). With :code:`num_feature_shards` > 1
+    the feature extraction is split into concurrent processes (see
+    :code:`pipeline.feature_shards`).
+    """
+
+    @classmethod
+    def from_properties(cls, props):
+        """Create the settings from an object with the same attributes."""
+        return cls(**{field: getattr(props, field) for field in cls._fields})
+
+
+class ToolPaths(namedtuple("ToolPaths", ["ffmpeg", "colmap", "glomap"])):
+    """Paths of the external executables used by the pipeline."""
+
+
+class PipelineProgress(
+    namedtuple(
+        "PipelineProgress",
+        ["step", "num_steps", "stage", "message", "level", "stage_progress"],
+        defaults=[None],
+    )
+):
+    """Progress event of a pipeline run.
+
+    :code:`level` is one of :code:`INFO`, :code:`WARNING` and :code:`ERROR`
+    (like the report types of Blender operators). :code:`stage_progress` is
+    a :code:`StageProgress` parsed from the output of the running tool (or
+    None for events that start a stage or report a result).
+    """
+
+    @property
+    def fraction(self):
+        """Fraction of the whole pipeline (based on the step and the
+        progress of the stage)."""
+        if self.stage_progress is None or self.stage_progress.fraction is None:
+            return self.step / self.num_steps
+        return (self.step - 1 + self.stage_progress.fraction) / self.num_steps
+
+
+def get_working_directory(base_path, video_name):
+    """Get the working directory of the video tracking process"""
+    return os.path.join(base_path, "video_tracking", video_name)
+
+
+def create_working_directory(base_path, video_name):
+    """Create a working directory for the video tracking process"""
+    working_dir = get_working_directory(base_path, video_name)
+    images_dir = os.path.join(working_dir, "images")
+    sparse_dir = os.path.join(working_dir, "sparse")
+
+    # Create directories if they don't exist
+    os.makedirs(images_dir, exist_ok=True)
+    os.makedirs(sparse_dir, exist_ok=True)
+
+    return working_dir, images_dir, sparse_dir
+
+
+def _get_frame_number(frame_name):
+    """Return the number of an extracted frame (or None)."""
+    match = _FRAME_NUMBER.match(frame_name)
+    return int(match.group(1)) if match is not None else None
+
+
+def get_video_name(video_path):
+    """Extract the video name from the video path"""
+    basename = os.path.basename(video_path)
+    name, _ = os.path.splitext(basename)
+    return name
+
+
+def validate_executable_path(path):
+    """Validate that an executable path exists and is executable"""
+    if not path:
+        return False, "Path is empty"
+
+    if not os.path.exists(path):
+        return False, f"Path does not exist: {path}"
+
+    if not os.path.isfile(path):
+        return False, f"Path is not a file: {path}"
+
+    return True, "Valid"
+
+
+def validate_video_path(path):
+    """Validate that a video path exists and has a valid extension"""
+    if not path:
+        return False, "Path is empty"
+
+    if not os.path.exists(path):
+        return False, f"Path does not exist: {path}"
+
+    if not os.path.isfile(path):
+        return False, f"Path is not a file: {path}"
+
+    _, ext = os.path.splitext(path.lower())
+
+    if ext not in VIDEO_EXTENSIONS:
+        return False, f"Invalid file extension: {ext}"
+
+    return True, "Valid"
+
+
+def print_progress(progress):
+    """Default progress callback that prints the progress messages."""
+    print(progress.message)
+
+
+def print_log_line(line):
+    """Default log callback that prints the output of the external tools."""
+    print(f"~ {line}")
+
+
+class PipelineRunner:
+    """Run the reconstruction pipeline of a video without Blender.
+
+    The runner writes the working directory layout
+    :code:`<base_dir>/video_tracking/<video name>/` with the extracted frames
+    in :code:`images`, the :code:`database.db` and the model in
+    :code:`sparse/0`. Progress events (:code:`PipelineProgress`) and the
+    output lines of the external tools are passed to the given callbacks,
+    which are called from the thread executing :code:`run()`.
+    """
+
+    def __init__(
+        self,
+        settings,
+        tool_paths,
+        base_dir,
+        progress_callback=print_progress,
+        log_callback=print_log_line,
+        trace=False,
+        trace_memory=False,
+        max_resources=None,
+        history_path=None,
+        artifact_cache=None,
+        task_client=None,
+    ):
+        self.settings = settings
+        self.tool_paths = tool_paths
+        self.base_dir = base_dir
+        self.progress_callback = progress_callback
+        self.log_callback = log_callback
+        self.trace = trace
+        self.trace_memory = trace_memory
+        # Limited to the CPUs and memory of the process (e.g. its cgroup)
+        self.max_resources = get_available_resources()
+        if max_resources is not None:
+            self.max_resources = limit_resources(
+                self.max_resources, max_resources
+            )
+        self.governor = ResourceGovernor(self.max_resources, STAGE_RESOURCES)
+        # Successful runs are appended to the history of the estimator
+        self.history_path = history_path
+        # Shared cache of frames and feature databases (optional)
+        self.artifact_cache = artifact_cache
+        # Runs the feature extraction shards on workers (optional, see
+        # pipeline.task_server)
+        self.task_client = task_client
+        self._video_hash = None
+        # Frames added by the current run (extend mode)
+        self.new_frame_names = []
+        # Frames registered by the current run (extend and register mode)
+        self.registered_frame_names = []
+        self.missing_frame_names = []
+
+        video_name = get_video_name(settings.video_path)
+        self.working_dir = get_working_directory(base_dir, video_name)
+        self.images_dir = os.path.join(self.working_dir, "images")
+        self.sparse_dir = os.path.join(self.working_dir, "sparse")
+        self.model_dir = os.path.join(self.sparse_dir, "0")
+        self.database_path = os.path.join(self.working_dir, "database.db")
+        self.known_poses_dir = os.path.join(
+            self.working_dir, KNOWN_POSES_DIR_NAME
+        )
+
+        self.current_step = 0
+        self.message = ""
+        self.error = None
+        self.succeeded = None
+        self._process = None
+        self._is_cancelled = False
+        self._loop = None
+        self._task = None
+        self._running_stages = set()
+        self._stages = {}
+        # Number of frames of the video (if known), e.g. from ffprobe
+        self.expected_num_frames = None
+        # Frame rate of the video (if known), used to seek to new frames
+        self.video_fps = None
+        self.telemetry = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_cancelled(self):
+        return self._is_cancelled
+
+    def _report(self, level, message, stage=None):
+        if level == "ERROR" and self.error is None:
+            self.error = message
+        self.progress_callback(
+            PipelineProgress(
+                self.current_step, NUM_STEPS, stage, message, level
+            )
+        )
+
+    def _report_stage_progress(self, stage_name, stage_progress):
+        stage = self._stages[stage_name]
+        self.progress_callback(
+            PipelineProgress(
+                stage.step,
+                NUM_STEPS,
+                stage_name,
+                f"{stage.message} {stage_progress.format()}",
+                "INFO",
+                stage_progress,
+            )
+        )
+
+    def _start_step(self, step, stage, message):
+        self.current_step = step
+        self.message = message
+        self._report("INFO", message, stage)
+
+    def _validate(self):
+        is_valid, msg = validate_video_path(self.settings.video_path)
+        if not is_valid:
+            return f"Invalid video file: {msg}"
+        for name, path in (
+            ("FFmpeg", self.tool_paths.ffmpeg),
+            ("COLMAP", self.tool_paths.colmap),
+            ("GLOMAP", self.tool_paths.glomap),
+        ):
+            is_valid, msg = validate_executable_path(path)
+            if not is_valid:
+                return f"Invalid {name} path: {msg}"
+        has_model = os.path.isdir(self.model_dir) and os.path.isfile(
+            self.database_path
+        )
+        pipeline_mode = self.settings.pipeline_mode
+        if pipeline_mode in ("EXTEND", "REGISTER_MISSING") and not has_model:
+            return "No model to extend, run the full pipeline first"
+        known_poses_path = os.path.join(self.known_poses_dir, "images.bin")
+        if pipeline_mode == "TRIANGULATE" and not os.path.isfile(
+            known_poses_path
+        ):
+            return f"No known camera poses found in {self.known_poses_dir}"
+        return None
+
+    async def run_command(
+        self,
+        cmd,
+        span_name,
+        stage=None,
+        parser=None,
+        num_threads=None,
+        memory_gb=None,
+        pin_threads=False,
+    ):
+        """Run an external tool and pass its output to the log callback.
+
+        If a progress parser (see :code:`pipeline.progress`) is given, the
+        progress of the :code:`stage` is reported while the tool runs.
+        The OpenMP threads of the tool are limited to :code:`num_threads`
+        (default: the threads of the stage), a tool without a thread option
+        is pinned to as many CPUs (:code:`pin_threads`). The data memory of
+        the tool is limited to :code:`memory_gb` (default: the memory share
+        of the stage, see :code:`ResourceGovernor`). Returns True, if the tool finished successfully. The
+        tool is terminated, if the task is cancelled.
+        """
+        if parser is not None:
+            tracker = ProgressTracker(parser)
+
+            def handle_line(line):
+                self.log_callback(line)
+                stage_progress = tracker.update(line)
+                if stage_progress is not None:
+                    self._report_stage_progress(stage, stage_progress)
+
+        else:
+            handle_line = self.log_callback
+
+        if num_threads is None and stage is not None:
+            num_threads = self.get_num_threads(stage)
+        env = None
+        if num_threads is not None:
+            env = dict(os.environ, OMP_NUM_THREADS=str(num_threads))
+        if memory_gb is None and stage is not None:
+            memory_gb = self.governor.get_share(
+                stage, list(self._running_stages)
+            ).memory_gb
+        cpus = None
+        if pin_threads and num_threads is not None:
+            cpus = select_cpus(num_threads)
+
+        with trace_span(span_name, "subprocess"):
+            if self._is_cancelled:
+                return False
+            process = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                env=env,
+            )
+            limit_process(process.pid, cpus, memory_gb)
+            self._process = process
+            sampler = ProcessSampler(process.pid)
+            sampling_task = asyncio.ensure_future(self._sample(sampler))
+            try:
+                # Pass the output in real-time as it's produced
+                await asyncio.gather(
+                    self._pump_lines(process.stdout, handle_line),
+                    self._pump_lines(process.stderr, handle_line),
+                )
+                # Usually the last chance to read the final usage
+                sampler.sample()
+                await process.wait()
+            except asyncio.CancelledError:
+                await self._terminate(process)
+                raise
+            finally:
+                sampling_task.cancel()
+                if self.telemetry is not None:
+                    self.telemetry.record_command(
+                        stage or span_name,
+                        span_name,
+                        sampler.finish(),
+                        process.returncode,
+                    )
+        return process.returncode == 0
+
+    async def run_remote_command(self, cmd, span_name, stage=None):
+        """Run a tool command on a worker of the task server.
+
+        The worker runs its own executable of the tool. Returns True, if the
+        command succeeded (possibly after retries).
+        """
+        tool = ToolPaths._fields[self.tool_paths.index(cmd[0])]
+        with trace_span(span_name, "task"):
+            if self._is_cancelled:
+                return False
+            try:
+                result = await self.task_client.run(tool, cmd[1:])
+            except TaskError as e:
+                self._report("ERROR", str(e), stage)
+                return False
+        for line in result["log"]:
+            self.log_callback(line)
+        if result["state"] != SUCCEEDED:
+            self._report(
+                "WARNING",
+                f"{span_name} failed on {result.get('worker')} after "
+                f"{result['attempts']} attempts",
+                stage,
+            )
+            return False
+        return True
+
+    async def _sample(self, sampler):
+        while True:
+            sampler.sample()
+            await asyncio.sleep(SAMPLING_INTERVAL)
+
+    async def _pump_lines(self, stream, handle_line):
+        # Read chunks instead of lines: FFmpeg separates its -stats updates
+        # with carriage returns, which would make a single very long line
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        pending = ""
+        while True:
+            chunk = await stream.read(CHUNK_SIZE)
+            text = decoder.decode(chunk, final=not chunk)
+            lines = _LINE_SEPARATOR.split(pending + text)
+            pending = lines.pop()
+            for line in lines:
+                if line:
+                    handle_line(line.rstrip())
+            if not chunk:
+                break
+        if pending:
+            handle_line(pending.rstrip())
+
+    async def _terminate(self, process, timeout=5):
+        if process.returncode is not None:
+            return
+        try:
+            process.terminate()
+            await asyncio.wait_for(process.wait(), timeout)
+        except asyncio.TimeoutError:
+            process.kill()  # Force kill if it doesn't terminate
+            await process.wait()
+        except ProcessLookupError:
+            pass  # The process has already finished
+
+    def cancel(self):
+        """Stop the pipeline and terminate the running tool.
+
+        Can be called from any thread. Returns immediately, :code:`run()`
+        returns once the tool has been terminated.
+        """
+        with self._lock:
+            self._is_cancelled = True
+            loop, task = self._loop, self._task
+        if loop is not None and task is not None:
+            try:
+                loop.call_soon_threadsafe(task.cancel)
+            except RuntimeError:
+                pass  # The loop has already been closed
+
+    def run(self):
+        """Run all steps of the pipeline in a new event loop.
+
+        Returns True, if the model has been reconstructed and exported. The
+        result is also stored in :code:`succeeded`.
+        """
+        return asyncio.run(self.run_async())
+
+    async def run_async(self):
+        """Coroutine version of :code:`run()`."""
+        with self._lock:
+            self._loop = asyncio.get_running_loop()
+            self._task = asyncio.current_task()
+            is_cancelled = self._is_cancelled
+        try:
+            self.succeeded = not is_cancelled and await self._run()
+        except asyncio.CancelledError:
+            self._report("WARNING", "Pipeline cancelled")
+            self.succeeded = False
+        finally:
+            with self._lock:
+                self._loop = self._task = None
+        return self.succeeded
+
+    async def _run(self):
+        error = self._validate()
+        if error is not None:
+            self._report("ERROR", error)
+            return False
+
+        create_working_directory(
+            self.base_dir, get_video_name(self.settings.video_path)
+        )
+        self.telemetry = RunTelemetry()
+        if self.trace:
+            begin_trace(
+                os.path.join(self.working_dir, "trace.json"),
+                self.trace_memory,
+            )
+        succeeded = False
+        try:
+            succeeded = await self._run_steps()
+            return succeeded
+        except Exception as e:
+            self._report("ERROR", f"Unexpected error: {e}")
+            return False
+        finally:
+            self._write_report(succeeded)
+            if self.trace:
+                trace_path = end_trace()
+                if trace_path is not None:
+                    self._report("INFO", f"Trace written to {trace_path}")
+
+    def create_stages(self):
+        """Return the stages of the pipeline for the current settings.
+
+        The artifacts connecting the stages are named after the files of the
+        working directory. :code:`video` is the only external input.
+        """
+        settings = self.settings
+        if settings.pipeline_mode == "EXTEND":
+            return self._create_extend_stages()
+        if settings.pipeline_mode == "REGISTER_MISSING":
+            return self._create_register_missing_stages()
+        frame_outputs = ["frames"]
+        if settings.matching_mode == "SIMILARITY":
+            frame_outputs.append("thumbnails")
+        if settings.filter_frames:
+            frame_outputs.append("preview")
+        images = "filtered_frames" if settings.filter_frames else "frames"
+        matches = "repaired_matches" if settings.repair_weak_links else "matches"
+        if settings.pipeline_mode == "TRIANGULATE":
+            # The poses are known, i.e. the global mapper is not required
+            reconstruction_stage = Stage(
+                "point_triangulation",
+                self._triangulate_points,
+                [matches],
+                ["sparse_model"],
+                STAGE_RESOURCES["point_triangulation"],
+                4,
+                "Step 4/7: Triangulating points of the known poses...",
+            )
+        else:
+            reconstruction_stage = Stage(
+                "sparse_reconstruction",
+                self._reconstruct,
+                [matches],
+                ["sparse_model"],
+                STAGE_RESOURCES["sparse_reconstruction"],
+                4,
+                "Step 4/7: Running sparse reconstruction...",
+            )
+
+        stages = [
+            Stage(
+                "frame_extraction",
+                self._extract_frames,
+                ["video"],
+                frame_outputs,
+                STAGE_RESOURCES["frame_extraction"],
+                1,
+                "Step 1/7: Extracting frames...",
+            ),
+            Stage(
+                "feature_extraction",
+                self._extract_features,
+                [images],
+                ["features"],
+                STAGE_RESOURCES["feature_extraction"],
+                2,
+                "Step 2/7: Extracting features...",
+            ),
+            Stage(
+                "matching",
+                self._match_features,
+                ["features"]
+                + (["pair_list"] if settings.matching_mode == "SIMILARITY" else []),
+                ["matches"],
+                STAGE_RESOURCES["matching"],
+                3,
+                "Step 3/7: Matching features...",
+            ),
+            reconstruction_stage,
+        ] + self._create_export_stages()
+        if settings.filter_frames:
+            stages.append(
+                Stage(
+                    "filter_frames",
+                    self._filter_frames,
+                    ["frames", "preview"],
+                    ["filtered_frames"],
+                    STAGE_RESOURCES["filter_frames"],
+                    1,
+                    "Step 1/7: Filtering frames...",
+                )
+            )
+        if settings.matching_mode == "SIMILARITY":
+            # Runs concurrently with the feature extraction
+            stages.append(
+                Stage(
+                    "select_similar_pairs",
+                    self._select_similar_pairs,
+                    ["thumbnails", images],
+                    ["pair_list"],
+                    STAGE_RESOURCES["select_similar_pairs"],
+                    3,
+                    "Step 3/7: Selecting similar pairs...",
+                )
+            )
+        if settings.repair_weak_links:
+            stages.append(
+                Stage(
+                    "repair_weak_links",
+                    self._repair_weak_links,
+                    ["matches"],
+                    ["repaired_matches"],
+                    STAGE_RESOURCES["repair_weak_links"],
+                    3,
+                    "Step 3/7: Repairing weak links...",
+                )
+            )
+        return stages
+
+    def _create_export_stages(self):
+        # Both exports only read the binary model
+        return [
+            Stage(
+                "model_export_internal",
+                self._export_internal_model,
+                ["sparse_model"],
+                ["internal_txt_model"],
+                STAGE_RESOURCES["model_export_internal"],
+                5,
+                "Step 5/7: Exporting model (internal)...",
+            ),
+            Stage(
+                "model_export_external",
+                self._export_external_model,
+                ["sparse_model"],
+                ["external_txt_model"],
+                STAGE_RESOURCES["model_export_external"],
+                6,
+                "Step 6/7: Exporting model (external)...",
+            ),
+        ]
+
+    def _create_extend_stages(self):
+        """Return the stages that add the appended frames to the model.
+
+        Only the new frames are extracted, their features are matched with
+        the preceding frames and they are registered into the existing
+        model, followed by a bundle adjustment.
+        """
+        return [
+            Stage(
+                "frame_extraction",
+                self._extract_new_frames,
+                ["video"],
+                ["new_frames"],
+                STAGE_RESOURCES["frame_extraction"],
+                1,
+                "Step 1/7: Extracting new frames...",
+            ),
+            Stage(
+                "feature_extraction",
+                self._extract_new_features,
+                ["new_frames"],
+                ["features"],
+                STAGE_RESOURCES["feature_extraction"],
+                2,
+                "Step 2/7: Extracting features of the new frames...",
+            ),
+            Stage(
+                "matching",
+                self._match_new_frames,
+                ["features"],
+                ["matches"],
+                STAGE_RESOURCES["matching"],
+                3,
+                "Step 3/7: Matching the new frames...",
+            ),
+            Stage(
+                "image_registration",
+                self._register_new_frames,
+                ["matches"],
+                ["sparse_model"],
+                STAGE_RESOURCES["image_registration"],
+                4,
+                "Step 4/7: Registering the new frames...",
+            ),
+        ] + self._create_export_stages()
+
+    def _create_register_missing_stages(self):
+        """Return the stages that register the frames of the database that
+        are missing in the model.
+
+        The missing frames are matched with their neighbors in the
+        :code:`repair_overlap` window and registered into the existing
+        model. The registered frames are not changed.
+        """
+        return [
+            Stage(
+                "matching",
+                self._match_missing_frames,
+                [],
+                ["matches"],
+                STAGE_RESOURCES["matching"],
+                3,
+                "Step 3/7: Matching the missing frames...",
+            ),
+            Stage(
+                "image_registration",
+                self._register_missing_frames,
+                ["matches"],
+                ["sparse_model"],
+                STAGE_RESOURCES["image_registration"],
+                4,
+                "Step 4/7: Registering the missing frames...",
+            ),
+        ] + self._create_export_stages()
+
+    def _start_stage(self, stage):
+        self._running_stages.add(stage.name)
+        self.telemetry.start_stage(stage.name)
+        self._start_step(
+            max(self.current_step, stage.step), stage.name, stage.message
+        )
+
+    def _finish_stage(self, stage):
+        self._running_stages.discard(stage.name)
+        output_bytes = sum(
+            get_path_size(path)
+            for artifact in stage.outputs
+            for path in self.get_artifact_paths(artifact)
+            if os.path.exists(path)
+        )
+        self.telemetry.finish_stage(stage.name, output_bytes)
+
+    def get_artifact_paths(self, artifact):
+        """Return the files and directories of an artifact of the stages."""
+        txt_names = ("cameras.txt", "images.txt", "points3D.txt")
+        return {
+            "frames": [self.images_dir],
+            "filtered_frames": [self.images_dir],
+            "thumbnails": [self.thumbnail_path],
+            "preview": [self.preview_path],
+            "features": [self.database_path],
+            "pair_list": [self.similar_pairs_path],
+            "matches": [self.database_path],
+            "repaired_matches": [self.database_path],
+            "sparse_model": [self.model_dir],
+            "internal_txt_model": [
+                os.path.join(self.model_dir, name) for name in txt_names
+            ],
+            "external_txt_model": [
+                os.path.join(self.sparse_dir, name) for name in txt_names
+            ],
+        }.get(artifact, [])
+
+    def get_input_statistics(self):
+        """Return the number of frames, the image size and the number of
+        features per image (as far as they have been computed)."""
+        statistics = {
+            "video_bytes": get_path_size(self.settings.video_path),
+            "num_frames": len(os.listdir(self.images_dir))
+            if os.path.isdir(self.images_dir)
+            else 0,
+        }
+        if self.settings.filter_frames:
+            statistics["num_rejected_frames"] = len(
+                read_rejected_frame_names(self.working_dir)
+            )
+        try:
+            connection = open_database(self.database_path)
+        except FileNotFoundError:
+            return statistics
+        try:
+            camera_sizes = read_camera_sizes(connection)
+            keypoint_counts = list(read_keypoint_counts(connection).values())
+        except sqlite3.Error:
+            return statistics
+        finally:
+            connection.close()
+        if camera_sizes:
+            statistics["width"], statistics["height"] = camera_sizes[0]
+        if keypoint_counts:
+            statistics["mean_features_per_image"] = sum(keypoint_counts) / len(
+                keypoint_counts
+            )
+        return statistics
+
+    @property
+    def report_path(self):
+        return os.path.join(self.working_dir, REPORT_FILE_NAME)
+
+    def _write_report(self, succeeded):
+        try:
+            report = self.telemetry.write_report(
+                self.report_path,
+                self.settings,
+                self.tool_paths,
+                succeeded,
+                self.error,
+                self.get_input_statistics(),
+            )
+        except (OSError, ValueError) as e:
+            self._report("WARNING", f"Could not write the run report: {e}")
+            return
+        if succeeded and self.history_path is not None:
+            try:
+                record_run(self.history_path, report)
+            except OSError as e:
+                self._report(
+                    "WARNING", f"Could not update the run history: {e}"
+                )
+
+    def get_num_threads(self, stage_name):
+        """Return the number of threads of the tools of a stage."""
+        return self.governor.allocate(
+            stage_name, list(self._running_stages)
+        ).num_threads
+
+    def _get_thread_args(self, option, stage_name):
+        return [option, str(self.get_num_threads(stage_name))]
+
+    async def _get_supported_thread_args(self, cmd, options, stage_name):
+        """Return the thread options of the tool command (the executable
+        and command of :code:`cmd`) that its version supports."""
+        supported_options = await asyncio.to_thread(
+            get_tool_options, cmd[0], cmd[1]
+        )
+        num_threads = str(self.get_num_threads(stage_name))
+        thread_args = []
+        for option in options:
+            if option[2:] in supported_options:
+                thread_args += [option, num_threads]
+        return thread_args
+
+    @property
+    def running_resources(self):
+        """Sum of the resources of the running stages."""
+        return sum(
+            (STAGE_RESOURCES[name] for name in list(self._running_stages)),
+            NO_RESOURCES,
+        )
+
+    async def _run_steps(self):
+        stages = self.create_stages()
+        self._stages = {stage.name: stage for stage in stages}
+        graph = StageGraph(stages, ["video"])
+        try:
+            succeeded = await graph.run(
+                self.max_resources, self._start_stage, self._finish_stage
+            )
+        finally:
+            self._running_stages.clear()
+        if not succeeded or self._is_cancelled:
+            if self._is_cancelled:
+                self._report("WARNING", "Pipeline cancelled")
+            return False
+
+        # The import is done by the client (e.g. the Blender operator)
+        self._start_step(7, "import", "Step 7/7: Importing model...")
+        return True
+
+    def _fail(self, message):
+        self._report("ERROR", message)
+        return False
+
+    @property
+    def thumbnail_path(self):
+        return os.path.join(self.working_dir, THUMBNAIL_FILE_NAME)
+
+    @property
+    def preview_path(self):
+        return os.path.join(self.working_dir, PREVIEW_FILE_NAME)
+
+    async def _extract_frames(self):
+        """Frame extraction using FFmpeg"""
+        settings = self.settings
+        cmd = [
+            self.tool_paths.ffmpeg,
+            "-loglevel", "error",
+            "-stats",
+            "-threads", str(self.get_num_threads("frame_extraction")),
+            "-i", settings.video_path,
+            "-qscale:v", str(settings.quality),
+            os.path.join(self.images_dir, "frame_%06d.jpg"),
+        ]
+        if settings.matching_mode == "SIMILARITY":
+            cmd += get_thumbnail_output_args(self.thumbnail_path)
+        if settings.filter_frames:
+            cmd += get_preview_output_args(self.preview_path)
+        if self.artifact_cache is not None:
+            key = get_frames_key(await self._get_video_hash(), settings)
+            with trace_span("restore_frames", "pipeline"):
+                num_frames = await asyncio.to_thread(
+                    self.artifact_cache.restore_frames,
+                    key,
+                    self.images_dir,
+                    self.working_dir,
+                )
+            if num_frames is not None:
+                self._report(
+                    "INFO",
+                    f"Reused {num_frames} cached frames",
+                    "frame_extraction",
+                )
+                return True
+        # The files of a previous run may be hardlinks to cache entries,
+        # which FFmpeg would overwrite in place
+        await asyncio.to_thread(self._remove_extracted_files)
+        succeeded = await self.run_command(
+            cmd,
+            "frame_extraction",
+            "frame_extraction",
+            FFmpegStatsParser(self.expected_num_frames),
+        )
+        if not succeeded:
+            return self._fail("Frame extraction failed")
+        if self.artifact_cache is not None:
+            extra_paths = []
+            if settings.matching_mode == "SIMILARITY":
+                extra_paths.append(self.thumbnail_path)
+            if settings.filter_frames:
+                extra_paths.append(self.preview_path)
+            await self._store_in_cache(
+                self.artifact_cache.store_frames,
+                key,
+                self.images_dir,
+                extra_paths,
+            )
+        return True
+
+    def _remove_extracted_files(self):
+        """Remove the frames, thumbnails and previews of a previous run."""
+        for name in os.listdir(self.images_dir):
+            os.remove(os.path.join(self.images_dir, name))
+        for path in (self.thumbnail_path, self.preview_path):
+            if os.path.lexists(path):
+                os.remove(path)
+
+    async def _get_video_hash(self):
+        if self._video_hash is None:
+            with trace_span("hash_video", "pipeline"):
+                self._video_hash = await asyncio.to_thread(
+                    hash_video, self.settings.video_path
+                )
+        return self._video_hash
+
+    async def _store_in_cache(self, store, *args):
+        # A full or read-only cache must not fail the run
+        try:
+            with trace_span(store.__name__, "pipeline"):
+                await asyncio.to_thread(store, *args)
+        except OSError as e:
+            self._report("WARNING", f"Could not update the cache: {e}")
+
+    async def _filter_frames(self):
+        """Remove blurry and near duplicate frames"""
+        settings = self.settings
+        with trace_span("filter_frames", "pipeline"):
+            num_kept, num_rejected = await asyncio.to_thread(
+                filter_frames,
+                self.images_dir,
+                self.preview_path,
+                settings.min_relative_sharpness,
+                settings.min_frame_change,
+            )
+        self._report(
+            "INFO",
+            f"Kept {num_kept} frames, rejected {num_rejected} frames",
+            "filter_frames",
+        )
+        return True
+
+    def _get_feature_extractor_command(
+        self, database_path, num_threads=None
+    ):
+        settings = self.settings
+        cmd = [
+            self.tool_paths.colmap,
+            "feature_extractor",
+            "--database_path", database_path,
+            "--image_path", self.images_dir,
+            "--ImageReader.single_camera", "1",
+            "--ImageReader.camera_model", settings.camera_model,
+            "--SiftExtraction.use_gpu", "1" if settings.use_gpu else "0",
+            "--SiftExtraction.max_image_size", str(settings.max_image_size),
+            "--SiftExtraction.max_num_features",
+            str(settings.max_num_features),
+        ]
+        # Remote workers use the threads of their machine
+        if num_threads is not None:
+            cmd += ["--SiftExtraction.num_threads", str(num_threads)]
+        return cmd
+
+    async def _extract_features(self):
+        """COLMAP feature extraction"""
+        settings = self.settings
+        if self.artifact_cache is not None:
+            key = get_features_key(await self._get_video_hash(), settings)
+            with trace_span("restore_database", "pipeline"):
+                restored = await asyncio.to_thread(
+                    self.artifact_cache.restore_database,
+                    key,
+                    self.database_path,
+                )
+            if restored:
+                self._report(
+                    "INFO", "Reused cached features", "feature_extraction"
+                )
+                return True
+        if settings.num_feature_shards > 1:
+            succeeded = await self._extract_sharded_features()
+        else:
+            succeeded = await self.run_command(
+                self._get_feature_extractor_command(
+                    self.database_path,
+                    self.get_num_threads("feature_extraction"),
+                ),
+                "feature_extraction",
+                "feature_extraction",
+                ColmapProgressParser(),
+            )
+        if not succeeded:
+            return self._fail("Feature extraction failed")
+        if self.artifact_cache is not None:
+            await self._store_in_cache(
+                self.artifact_cache.store_database, key, self.database_path
+            )
+        return True
+
+    async def _extract_sharded_features(self):
+        """Extract the features of contiguous frame shards concurrently and
+        merge the shard databases."""
+        shards_dir = os.path.join(self.working_dir, SHARDS_DIR_NAME)
+        # Databases of a previous run would be extended
+        await asyncio.to_thread(shutil.rmtree, shards_dir, ignore_errors=True)
+        os.makedirs(shards_dir)
+        frame_names = [
+            name
+            for name in os.listdir(self.images_dir)
+            if _get_frame_number(name) is not None
+        ]
+        shards = split_into_shards(
+            frame_names, self.settings.num_feature_shards
+        )
+        # Local shards share the cores and the memory of the stage, i.e.
+        # only as many shards run at the same time as the memory allows
+        allocation = None
+        if self.task_client is None:
+            allocation = self.governor.allocate(
+                "feature_extraction", list(self._running_stages), len(shards)
+            )
+        shard_paths = []
+        commands = []
+        for index, names in enumerate(shards):
+            image_list_path = os.path.join(shards_dir, f"shard_{index}.txt")
+            write_image_list(image_list_path, names)
+            shard_path = os.path.join(shards_dir, f"shard_{index}.db")
+            shard_paths.append(shard_path)
+            commands.append(
+                self._get_feature_extractor_command(
+                    shard_path, allocation and allocation.num_threads
+                )
+                + ["--image_list_path", image_list_path]
+            )
+        self._report(
+            "INFO",
+            f"Extracting features of {len(frame_names)} frames in "
+            f"{len(shards)} shards",
+            "feature_extraction",
+        )
+        if allocation is None:
+            results = await asyncio.gather(
+                *(
+                    self.run_remote_command(cmd, f"feature_extraction_{index}")
+                    for index, cmd in enumerate(commands)
+                )
+            )
+        else:
+            semaphore = asyncio.Semaphore(allocation.num_concurrent)
+            # The concurrent shards divide the memory share of the stage
+            share = self.governor.get_share(
+                "feature_extraction", list(self._running_stages)
+            )
+            memory_gb = share.memory_gb / allocation.num_concurrent
+
+            async def run_shard(cmd, span_name):
+                async with semaphore:
+                    return await self.run_command(
+                        cmd,
+                        span_name,
+                        num_threads=allocation.num_threads,
+                        memory_gb=memory_gb,
+                    )
+
+            results = await asyncio.gather(
+                *(
+                    run_shard(cmd, f"feature_extraction_{index}")
+                    for index, cmd in enumerate(commands)
+                )
+            )
+        if not all(results):
+            return False
+        if os.path.exists(self.database_path):
+            os.remove(self.database_path)
+        with trace_span("merge_feature_databases", "pipeline"):
+            await asyncio.to_thread(
+                merge_feature_databases, shard_paths, self.database_path
+            )
+        await asyncio.to_thread(shutil.rmtree, shards_dir, ignore_errors=True)
+        return True
+
+    @property
+    def similar_pairs_path(self):
+        return os.path.join(self.working_dir, "similar_pairs.txt")
+
+    async def _select_similar_pairs(self):
+        """Select the pairs of the similarity based matching"""
+        settings = self.settings
+        with trace_span("select_similar_pairs", "pipeline"):
+            num_pairs = await asyncio.to_thread(
+                write_similarity_pair_list,
+                self.thumbnail_path,
+                self.images_dir,
+                self.similar_pairs_path,
+                settings.num_similar_frames,
+                settings.min_similarity,
+                read_rejected_frame_names(self.working_dir)
+                if settings.filter_frames
+                else (),
+            )
+        self._report(
+            "INFO",
+            f"Selected {num_pairs} pairs by thumbnail similarity",
+            "select_similar_pairs",
+        )
+        return True
+
+    async def _match_features(self):
+        """COLMAP sequential (or similarity based) matching"""
+        settings = self.settings
+        if settings.matching_mode == "SIMILARITY":
+            cmd = [
+                self.tool_paths.colmap,
+                "matches_importer",
+                "--database_path", self.database_path,
+                "--match_list_path", self.similar_pairs_path,
+                "--match_type", "pairs",
+            ]
+        else:
+            cmd = [
+                self.tool_paths.colmap,
+                "sequential_matcher",
+                "--database_path", self.database_path,
+                "--SequentialMatching.overlap", str(settings.overlap),
+            ]
+        cmd += self._get_thread_args("--SiftMatching.num_threads", "matching")
+        succeeded = await self.run_command(
+            cmd, cmd[1], "matching", ColmapProgressParser()
+        )
+        if not succeeded:
+            return self._fail("Feature matching failed")
+        return True
+
+    async def _repair_weak_links(self):
+        """Re-match the frames around weak sequential links"""
+        settings = self.settings
+        pair_list_path = os.path.join(self.working_dir, "repair_pairs.txt")
+        with trace_span("select_repair_pairs", "pipeline"):
+            regions, num_pairs = await asyncio.to_thread(
+                write_repair_pair_list,
+                self.database_path,
+                pair_list_path,
+                settings.min_num_inliers,
+                settings.repair_overlap,
+            )
+        self._report(
+            "INFO",
+            f"Found {len(regions)} weak regions, "
+            f"re-matching {num_pairs} pairs",
+            "repair_weak_links",
+        )
+        succeeded = True
+        if num_pairs > 0:
+            cmd = [
+                self.tool_paths.colmap,
+                "matches_importer",
+                "--database_path", self.database_path,
+                "--match_list_path", pair_list_path,
+                "--match_type", "pairs",
+            ] + self._get_thread_args(
+                "--SiftMatching.num_threads", "repair_weak_links"
+            )
+            succeeded = await self.run_command(
+                cmd,
+                "repair_weak_links",
+                "repair_weak_links",
+                ColmapProgressParser(),
+            )
+        if not succeeded:
+            return self._fail("Weak link repair failed")
+        return True
+
+    async def _reconstruct(self):
+        """GLOMAP sparse reconstruction"""
+        settings = self.settings
+        use_gpu = "1" if settings.use_gpu else "0"
+        num_images = len(os.listdir(self.images_dir))
+        cmd = [
+            self.tool_paths.glomap,
+            "mapper",
+            "--database_path", self.database_path,
+            "--image_path", self.images_dir,
+            "--output_path", self.sparse_dir,
+            "--TrackEstablishment.max_num_tracks",
+            str(settings.max_num_tracks * num_images),
+            "--constraint_type", settings.constraint_type,
+            "--RelPoseEstimation.max_epipolar_error",
+            str(settings.max_epipolar_error),
+            "--GlobalPositioning.max_num_iterations",
+            str(settings.max_global_positioning_iterations),
+            "--BundleAdjustment.max_num_iterations",
+            str(settings.max_bundle_adjustment_iterations),
+            "--GlobalPositioning.use_gpu", use_gpu,
+            "--BundleAdjustment.use_gpu", use_gpu,
+        ]
+        thread_args = await self._get_supported_thread_args(
+            cmd, GLOMAP_MAPPER_THREAD_OPTIONS, "sparse_reconstruction"
+        )
+        succeeded = await self.run_command(
+            cmd + thread_args,
+            "sparse_reconstruction",
+            "sparse_reconstruction",
+            GlomapPhaseParser(),
+            pin_threads=not thread_args,
+        )
+        if not succeeded:
+            return self._fail("Sparse reconstruction failed")
+        if not os.path.exists(self.model_dir):
+            self._report("WARNING", "No model found to export")
+            return False
+        return True
+
+    async def _triangulate_points(self):
+        """Triangulate the points of the known camera poses (COLMAP
+        point_triangulator). The poses and intrinsics are not refined."""
+        input_dir = os.path.join(self.working_dir, "triangulation_input")
+        with trace_span("write_triangulation_input", "pipeline"):
+            num_images = await asyncio.to_thread(
+                write_triangulation_input,
+                self.known_poses_dir,
+                self.database_path,
+                input_dir,
+            )
+        if num_images == 0:
+            return self._fail(
+                "The known camera poses do not match any extracted frame"
+            )
+        self._report(
+            "INFO",
+            f"Triangulating points of {num_images} known poses",
+            "point_triangulation",
+        )
+        os.makedirs(self.model_dir, exist_ok=True)
+        cmd = [
+            self.tool_paths.colmap,
+            "point_triangulator",
+            "--database_path", self.database_path,
+            "--image_path", self.images_dir,
+            "--input_path", input_dir,
+            "--output_path", self.model_dir,
+            "--Mapper.ba_refine_focal_length", "0",
+            "--Mapper.ba_refine_principal_point", "0",
+            "--Mapper.ba_refine_extra_params", "0",
+        ] + self._get_thread_args(
+            "--Mapper.num_threads", "point_triangulation"
+        )
+        succeeded = await self.run_command(
+            cmd, "point_triangulator", "point_triangulation"
+        )
+        if not succeeded:
+            return self._fail("Point triangulation failed")
+        return True
+
+    @property
+    def new_images_path(self):
+        return os.path.join(self.working_dir, "new_images.txt")
+
+    def _get_last_frame_number(self):
+        """Return the number of the last extracted frame (0 if none)."""
+        names = os.listdir(self.images_dir) + read_rejected_frame_names(
+            self.working_dir
+        )
+        numbers = [_get_frame_number(name) for name in names]
+        return max(
+            (number for number in numbers if number is not None), default=0
+        )
+
+    async def _extract_new_frames(self):
+        """Extract the frames after the last extracted frame"""
+        last_frame_number = self._get_last_frame_number()
+        cmd = [
+            self.tool_paths.ffmpeg,
+            "-loglevel", "error",
+            "-stats",
+            "-threads", str(self.get_num_threads("frame_extraction")),
+        ]
+        if self.video_fps and last_frame_number:
+            # Seek half a frame before the first new frame (the frame
+            # numbers start at 1, the timestamps at 0). The timestamps are
+            # kept relative to the start of the video, so that the select
+            # trims exactly at the first new frame wherever the seek lands.
+            start_time = (last_frame_number - 0.5) / self.video_fps
+            cmd += [
+                "-ss", f"{start_time:.6f}",
+                "-copyts",
+                "-start_at_zero",
+                "-i", self.settings.video_path,
+                "-vf", f"select=gte(t\\,{start_time:.6f})",
+            ]
+        else:
+            # Without the frame rate all frames are decoded, the input frame
+            # index n starts at 0
+            cmd += [
+                "-i", self.settings.video_path,
+                "-vf", f"select=gte(n\\,{last_frame_number})",
+            ]
+        cmd += [
+            "-vsync", "passthrough",
+            "-qscale:v", str(self.settings.quality),
+            "-start_number", str(last_frame_number + 1),
+            os.path.join(self.images_dir, "frame_%06d.jpg"),
+        ]
+        num_new_frames = None
+        if self.expected_num_frames:
+            num_new_frames = max(
+                self.expected_num_frames - last_frame_number, 0
+            )
+        succeeded = await self.run_command(
+            cmd,
+            "frame_extraction",
+            "frame_extraction",
+            FFmpegStatsParser(num_new_frames),
+        )
+        if not succeeded:
+            return self._fail("Frame extraction failed")
+
+        self.new_frame_names = sorted(
+            name
+            for name in os.listdir(self.images_dir)
+            if (_get_frame_number(name) or 0) > last_frame_number
+        )
+        with open(self.new_images_path, "w") as new_images_file:
+            new_images_file.writelines(
+                name + "\n" for name in self.new_frame_names
+            )
+        self._report(
+            "INFO",
+            f"Extracted {len(self.new_frame_names)} new frames after frame "
+            f"{last_frame_number}",
+            "frame_extraction",
+        )
+        return True
+
+    async def _extract_new_features(self):
+        """COLMAP feature extraction of the new frames"""
+        if not self.new_frame_names:
+            return True
+        settings = self.settings
+        connection = open_database(self.database_path)
+        try:
+            camera_ids = read_camera_ids(connection)
+        finally:
+            connection.close()
+        cmd = [
+            self.tool_paths.colmap,
+            "feature_extractor",
+            "--database_path", self.database_path,
+            "--image_path", self.images_dir,
+            "--image_list_path", self.new_images_path,
+            "--ImageReader.single_camera", "1",
+            "--ImageReader.camera_model", settings.camera_model,
+            "--SiftExtraction.use_gpu", "1" if settings.use_gpu else "0",
+            "--SiftExtraction.max_image_size", str(settings.max_image_size),
+            "--SiftExtraction.max_num_features",
+            str(settings.max_num_features),
+        ] + self._get_thread_args(
+            "--SiftExtraction.num_threads", "feature_extraction"
+        )
+        # The new frames share the camera (intrinsics) of the existing model
+        if camera_ids:
+            cmd += ["--ImageReader.existing_camera_id", str(camera_ids[0])]
+        succeeded = await self.run_command(
+            cmd,
+            "feature_extraction",
+            "feature_extraction",
+            ColmapProgressParser(),
+        )
+        if not succeeded:
+            return self._fail("Feature extraction failed")
+        return True
+
+    async def _match_new_frames(self):
+        """Match the new frames with the preceding frames"""
+        if not self.new_frame_names:
+            return True
+        pair_list_path = os.path.join(self.working_dir, "new_pairs.txt")
+        with trace_span("select_new_pairs", "pipeline"):
+            num_pairs = await asyncio.to_thread(
+                write_neighbor_pair_list,
+                self.images_dir,
+                pair_list_path,
+                self.new_frame_names,
+                self.settings.overlap,
+            )
+        cmd = [
+            self.tool_paths.colmap,
+            "matches_importer",
+            "--database_path", self.database_path,
+            "--match_list_path", pair_list_path,
+            "--match_type", "pairs",
+        ] + self._get_thread_args("--SiftMatching.num_threads", "matching")
+        succeeded = await self.run_command(
+            cmd, "matches_importer", "matching", ColmapProgressParser()
+        )
+        if not succeeded:
+            return self._fail("Feature matching failed")
+        self._report("INFO", f"Matched {num_pairs} pairs", "matching")
+        return True
+
+    async def _register_new_frames(self):
+        """Register the new frames into the model and refine it"""
+        if not self.new_frame_names:
+            self._report("INFO", "No new frames", "image_registration")
+            return True
+        return await self._register_images(
+            "image_registration", "Registration of the new frames failed"
+        )
+
+    def _read_registered_frame_names(self):
+        path = os.path.join(self.model_dir, "images.bin")
+        return {image.name for image in read_images_binary(path).values()}
+
+    def _get_missing_frame_names(self):
+        """Return the frames of the database that are missing in the model."""
+        connection = open_database(self.database_path)
+        try:
+            _, image_names = read_images(connection)
+        finally:
+            connection.close()
+        registered_names = self._read_registered_frame_names()
+        return [name for name in image_names if name not in registered_names]
+
+    async def _match_missing_frames(self):
+        """Match the missing frames with more neighbors"""
+        self.missing_frame_names = await asyncio.to_thread(
+            self._get_missing_frame_names
+        )
+        self._report(
+            "INFO",
+            f"{len(self.missing_frame_names)} frames are missing in the model",
+            "matching",
+        )
+        if not self.missing_frame_names:
+            return True
+        pair_list_path = os.path.join(self.working_dir, "missing_pairs.txt")
+        with trace_span("select_missing_pairs", "pipeline"):
+            num_pairs = await asyncio.to_thread(
+                write_neighbor_pair_list,
+                self.images_dir,
+                pair_list_path,
+                self.missing_frame_names,
+                self.settings.repair_overlap,
+            )
+        cmd = [
+            self.tool_paths.colmap,
+            "matches_importer",
+            "--database_path", self.database_path,
+            "--match_list_path", pair_list_path,
+            "--match_type", "pairs",
+        ] + self._get_thread_args("--SiftMatching.num_threads", "matching")
+        succeeded = await self.run_command(
+            cmd, "matches_importer", "matching", ColmapProgressParser()
+        )
+        if not succeeded:
+            return self._fail("Feature matching failed")
+        self._report("INFO", f"Matched {num_pairs} pairs", "matching")
+        return True
+
+    async def _register_missing_frames(self):
+        """Register the missing frames without moving the registered ones"""
+        if not self.missing_frame_names:
+            return True
+        # A bundle adjustment would move all cameras and points, i.e. the
+        # import could not be limited to the registered frames
+        succeeded = await self._register_images(
+            "image_registration",
+            "Registration of the missing frames failed",
+            bundle_adjustment=False,
+        )
+        if not succeeded:
+            return False
+        num_missing = len(self.missing_frame_names) - len(
+            self.registered_frame_names
+        )
+        self._report(
+            "INFO",
+            f"Registered {len(self.registered_frame_names)} frames, "
+            f"{num_missing} frames are still missing",
+            "image_registration",
+        )
+        return True
+
+    async def _register_images(
+        self, stage, error_message, bundle_adjustment=True
+    ):
+        """Register the unregistered images of the database into the model
+        (COLMAP image_registrator) and optionally run a bundle adjustment.
+
+        The image_registrator refines the pose of each new image with the
+        points of the model fixed.
+        """
+        registered_names = await asyncio.to_thread(
+            self._read_registered_frame_names
+        )
+        cmd = [
+            self.tool_paths.colmap,
+            "image_registrator",
+            "--database_path", self.database_path,
+            "--input_path", self.model_dir,
+            "--output_path", self.model_dir,
+        ] + self._get_thread_args("--Mapper.num_threads", stage)
+        if not await self.run_command(cmd, "image_registrator", stage):
+            return self._fail(error_message)
+        self.registered_frame_names = sorted(
+            await asyncio.to_thread(self._read_registered_frame_names)
+            - registered_names
+        )
+        if not bundle_adjustment:
+            return True
+        cmd = [
+            self.tool_paths.colmap,
+            "bundle_adjuster",
+            "--input_path", self.model_dir,
+            "--output_path", self.model_dir,
+            "--BundleAdjustment.max_num_iterations",
+            str(self.settings.max_bundle_adjustment_iterations),
+        ]
+        thread_args = await self._get_supported_thread_args(
+            cmd, BUNDLE_ADJUSTER_THREAD_OPTIONS, stage
+        )
+        succeeded = await self.run_command(
+            cmd + thread_args,
+            "bundle_adjuster",
+            stage,
+            pin_threads=not thread_args,
+        )
+        if not succeeded:
+            return self._fail("Bundle adjustment failed")
+        return True
+
+    async def _export_internal_model(self):
+        """Export a TXT model inside the model folder"""
+        cmd = [
+            self.tool_paths.colmap,
+            "model_converter",
+            "--input_path", self.model_dir,
+            "--output_path", self.model_dir,
+            "--output_type", "TXT",
+        ]
+        succeeded = await self.run_command(cmd, "model_export_internal")
+        if not succeeded:
+            return self._fail("Internal model export failed")
+        return True
+
+    async def _export_external_model(self):
+        """Export a TXT model to the parent sparse directory"""
+        cmd = [
+            self.tool_paths.colmap,
+            "model_converter",
+            "--input_path", self.model_dir,
+            "--output_path", self.sparse_dir,
+            "--output_type", "TXT",
+        ]
+        succeeded = await self.run_command(cmd, "model_export_external")
+        if not succeeded:
+            return self._fail("External model export failed")
+        return True
+
+
+class PipelineEvent(namedtuple("PipelineEvent", ["kind", "data"])):
+    """Event of a :code:`BackgroundPipeline`.
+
+    :code:`kind` is :code:`progress` (data: :code:`PipelineProgress`),
+    :code:`log` (data: output line of a tool) or :code:`finished` (data:
+    True, if the pipeline succeeded).
+    """
+
+
+class BackgroundPipeline:
+    """Run a :code:`PipelineRunner` in an event loop on a worker thread.
+
+    The progress and the tool output are put into a thread-safe queue,
+    which is drained by the caller (e.g. the timer of a modal operator), so
+    that the callbacks never run on the thread of the caller.
+    """
+
+    def __init__(self, runner):
+        self.runner = runner
+        self.events = queue.SimpleQueue()
+        runner.progress_callback = self._put_progress
+        runner.log_callback = self._put_log_line
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _put_progress(self, progress):
+        self.events.put(PipelineEvent("progress", progress))
+
+    def _put_log_line(self, line):
+        self.events.put(PipelineEvent("log", line))
+
+    def _run(self):
+        try:
+            self.runner.run()
+        finally:
+            self.events.put(PipelineEvent("finished", self.runner.succeeded))
+
+    def start(self):
+        self.thread.start()
+
+    def cancel(self):
+        self.runner.cancel()
+
+    def get_events(self, max_num_events=10000):
+        """Return the pending events without blocking."""
+        events = []
+        while len(events) < max_num_events:
+            try:
+                events.append(self.events.get_nowait())
+            except queue.Empty:
+                break
+        return events
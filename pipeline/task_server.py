@@ -0,0 +1,649 @@
+"""Distribute tool commands of pipeline stages to worker processes.
+
+A small task server accepts commands (e.g. the feature extraction of a
+shard, see :code:`pipeline.feature_shards`) from pipeline runners and hands
+them to workers, which may run on other machines:
+
+    python -m open_video_tracker.pipeline.task_server serve --port 8765
+    python -m open_video_tracker.pipeline.task_server worker \
+        --server farm-01:8765 --colmap /opt/colmap/bin/colmap
+
+The protocol consists of json lines over TCP. A task names the tool
+(:code:`ffmpeg`, :code:`colmap` or :code:`glomap`) and its arguments, the
+worker runs its own executable of that tool. The tools read and write the
+working directory, which must be on a file system shared by all machines.
+Paths below the :code:`shared_dir` of the task are mapped to the
+:code:`--shared-dir` of the worker, if it is mounted elsewhere.
+
+While a task runs, the worker sends heartbeats. Tasks of workers that stop
+sending heartbeats and failed tasks are queued again, until they have been
+attempted :code:`max_num_attempts` times. The submitting runner waits for
+the result of each task.
+
+The server listens on localhost by default. It runs any tool command it
+receives, so it must not be reachable from untrusted networks.
+"""
+
+import argparse
+import asyncio
+import collections
+import itertools
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import time
+
+# Same as the ToolPaths fields of the runner
+TOOL_NAMES = ("ffmpeg", "colmap", "glomap")
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+HEARTBEAT_INTERVAL = 2.0
+# Tasks of workers without heartbeat for this duration are queued again
+HEARTBEAT_TIMEOUT = 10.0
+MAX_NUM_ATTEMPTS = 3
+POLL_INTERVAL = 0.5
+# Number of output lines of a task that are returned with its result
+NUM_LOG_LINES = 50
+CHUNK_SIZE = 65536
+# The results of older finished tasks are dropped
+MAX_NUM_FINISHED_TASKS = 10000
+
+QUEUED = "QUEUED"
+RUNNING = "RUNNING"
+SUCCEEDED = "SUCCEEDED"
+FAILED = "FAILED"
+CANCELLED = "CANCELLED"
+FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class TaskError(Exception):
+    """The task server could not be reached or sent an invalid reply."""
+
+
+def parse_address(address):
+    """Return the (host, port) of an address like :code:`host:port`."""
+    host, _, port = address.rpartition(":")
+    try:
+        return host or DEFAULT_HOST, int(port)
+    except ValueError:
+        raise ValueError(f"Invalid task server address: {address}")
+
+
+def map_paths(args, source_dir, target_dir):
+    """Replace the :code:`source_dir` prefix of the arguments."""
+    if not source_dir or not target_dir or source_dir == target_dir:
+        return list(args)
+    source_dir = os.path.normpath(source_dir)
+    mapped_args = []
+    for arg in args:
+        if arg == source_dir or arg.startswith(source_dir + os.sep):
+            arg = os.path.join(target_dir, os.path.relpath(arg, source_dir))
+        mapped_args.append(arg)
+    return mapped_args
+
+
+async def _send(writer, message):
+    writer.write(json.dumps(message).encode() + b"\n")
+    await writer.drain()
+
+
+async def _receive(reader):
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError("Connection closed")
+    return json.loads(line)
+
+
+class _Task:
+    def __init__(self, task_id, tool, args, shared_dir):
+        self.task_id = task_id
+        self.tool = tool
+        self.args = args
+        self.shared_dir = shared_dir
+        self.state = QUEUED
+        self.num_attempts = 0
+        self.worker = None
+        self.last_heartbeat = None
+        self.result = None
+        self.finished = asyncio.Event()
+
+    def to_message(self):
+        return {
+            "type": "task",
+            "task_id": self.task_id,
+            "tool": self.tool,
+            "args": self.args,
+            "shared_dir": self.shared_dir,
+            "attempt": self.num_attempts,
+        }
+
+
+class TaskServer:
+    """Queue of tool commands served to workers (asyncio TCP server)."""
+
+    def __init__(
+        self,
+        host=DEFAULT_HOST,
+        port=DEFAULT_PORT,
+        max_num_attempts=MAX_NUM_ATTEMPTS,
+        heartbeat_timeout=HEARTBEAT_TIMEOUT,
+        log_callback=None,
+    ):
+        self.host = host
+        self.port = port
+        self.max_num_attempts = max_num_attempts
+        self.heartbeat_timeout = heartbeat_timeout
+        self.log_callback = log_callback or (lambda message: None)
+        self._tasks = {}
+        self._queue = collections.deque()
+        self._task_ids = itertools.count(1)
+        self._server = None
+        self._watchdog = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(
+            self._handle_connection, self.host, self.port
+        )
+        # Port 0 selects a free port
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._watchdog = asyncio.ensure_future(self._watch_heartbeats())
+
+    async def close(self):
+        if self._watchdog is not None:
+            self._watchdog.cancel()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def serve_forever(self):
+        await self.start()
+        self.log_callback(
+            f"Task server listening on {self.host}:{self.port}"
+        )
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.close()
+
+    def get_status(self):
+        counts = collections.Counter(
+            task.state for task in self._tasks.values()
+        )
+        return {
+            "type": "status",
+            "states": dict(counts),
+            "workers": sorted(
+                {
+                    task.worker
+                    for task in self._tasks.values()
+                    if task.state == RUNNING
+                }
+            ),
+        }
+
+    def _submit(self, message):
+        task = _Task(
+            str(next(self._task_ids)),
+            message["tool"],
+            message["args"],
+            message.get("shared_dir"),
+        )
+        if task.tool not in TOOL_NAMES:
+            raise ValueError(f"Unknown tool: {task.tool}")
+        self._tasks[task.task_id] = task
+        self._queue.append(task)
+        self._drop_finished_tasks()
+        return task
+
+    def _drop_finished_tasks(self):
+        finished_ids = [
+            task_id
+            for task_id, task in self._tasks.items()
+            if task.state in FINISHED_STATES
+        ]
+        # The tasks are kept in submission order
+        for task_id in finished_ids[:-MAX_NUM_FINISHED_TASKS]:
+            del self._tasks[task_id]
+
+    def _next_task(self, worker):
+        while self._queue:
+            task = self._queue.popleft()
+            if task.state != QUEUED:
+                continue  # Cancelled while queued
+            task.state = RUNNING
+            task.num_attempts += 1
+            task.worker = worker
+            task.last_heartbeat = time.monotonic()
+            return task
+        return None
+
+    def _finish(self, task, state, result):
+        task.state = state
+        task.result = dict(result, state=state, attempts=task.num_attempts)
+        task.finished.set()
+
+    def _retry_or_fail(self, task, result):
+        if task.num_attempts < self.max_num_attempts:
+            self.log_callback(
+                f"Task {task.task_id} failed on {task.worker} "
+                f"(attempt {task.num_attempts}), queued again"
+            )
+            task.state = QUEUED
+            task.worker = None
+            self._queue.append(task)
+        else:
+            self._finish(task, FAILED, result)
+
+    def _handle_result(self, message):
+        task = self._tasks.get(message["task_id"])
+        # Ignore results of tasks that have been given to another worker
+        if task is None or task.state != RUNNING:
+            return
+        if task.worker != message.get("worker"):
+            return
+        result = {
+            "returncode": message.get("returncode"),
+            "log": message.get("log", []),
+            "worker": task.worker,
+        }
+        if message.get("returncode") == 0:
+            self._finish(task, SUCCEEDED, result)
+        else:
+            self._retry_or_fail(task, result)
+
+    def _cancel(self, task_id):
+        task = self._tasks.get(task_id)
+        if task is not None and task.state not in FINISHED_STATES:
+            # Running tasks are terminated on the next heartbeat
+            self._finish(task, CANCELLED, {"returncode": None, "log": []})
+
+    async def _watch_heartbeats(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_timeout / 4)
+            now = time.monotonic()
+            for task in list(self._tasks.values()):
+                if (
+                    task.state == RUNNING
+                    and now - task.last_heartbeat > self.heartbeat_timeout
+                ):
+                    self._retry_or_fail(
+                        task,
+                        {
+                            "returncode": None,
+                            "log": [f"Lost worker {task.worker}"],
+                            "worker": task.worker,
+                        },
+                    )
+
+    async def _handle_message(self, message, writer):
+        message_type = message.get("type")
+        if message_type == "submit":
+            try:
+                task = self._submit(message)
+            except (KeyError, ValueError) as e:
+                await _send(writer, {"type": "error", "error": str(e)})
+                return
+            await _send(writer, {"type": "submitted", "task_id": task.task_id})
+        elif message_type == "wait":
+            task = self._tasks.get(message.get("task_id"))
+            if task is None:
+                await _send(writer, {"type": "error", "error": "Unknown task"})
+                return
+            await task.finished.wait()
+            await _send(writer, dict(task.result, type="result"))
+        elif message_type == "request":
+            task = self._next_task(message.get("worker"))
+            if task is None:
+                await _send(writer, {"type": "no_task"})
+            else:
+                await _send(writer, task.to_message())
+        elif message_type == "heartbeat":
+            task = self._tasks.get(message.get("task_id"))
+            is_current = (
+                task is not None
+                and task.state == RUNNING
+                and task.worker == message.get("worker")
+            )
+            if is_current:
+                task.last_heartbeat = time.monotonic()
+            # The worker stops tasks that are cancelled or given to others
+            await _send(writer, {"type": "ok", "cancel": not is_current})
+        elif message_type == "result":
+            self._handle_result(message)
+            await _send(writer, {"type": "ok"})
+        elif message_type == "cancel":
+            self._cancel(message.get("task_id"))
+            await _send(writer, {"type": "ok"})
+        elif message_type == "status":
+            await _send(writer, self.get_status())
+        else:
+            await _send(writer, {"type": "error", "error": "Unknown message"})
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    message = await _receive(reader)
+                except ValueError:
+                    await _send(writer, {"type": "error", "error": "No json"})
+                    continue
+                await self._handle_message(message, writer)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except asyncio.CancelledError:
+            pass  # The server has been closed
+        finally:
+            writer.close()
+
+
+class TaskClient:
+    """Submit tool commands to a task server and wait for their results."""
+
+    def __init__(self, address, shared_dir=None):
+        self.host, self.port = parse_address(address)
+        self.shared_dir = shared_dir
+
+    async def _request(self, message):
+        try:
+            reader, writer = await asyncio.open_connection(
+                self.host, self.port
+            )
+        except OSError as e:
+            raise TaskError(
+                f"Could not connect to the task server {self.host}:"
+                f"{self.port}: {e}"
+            )
+        try:
+            await _send(writer, message)
+            reply = await _receive(reader)
+        except (ConnectionError, ValueError) as e:
+            raise TaskError(f"Task server error: {e}")
+        finally:
+            writer.close()
+        if reply.get("type") == "error":
+            raise TaskError(reply["error"])
+        return reply
+
+    async def run(self, tool, args):
+        """Run a command on a worker and return its result.
+
+        The result contains the :code:`state` (:code:`SUCCEEDED`,
+        :code:`FAILED` or :code:`CANCELLED`), the :code:`returncode`, the
+        last lines of the :code:`log` and the :code:`worker`. The task is
+        cancelled, if the calling task is cancelled.
+        """
+        reply = await self._request(
+            {
+                "type": "submit",
+                "tool": tool,
+                "args": list(args),
+                "shared_dir": self.shared_dir,
+            }
+        )
+        task_id = reply["task_id"]
+        try:
+            return await self._request({"type": "wait", "task_id": task_id})
+        except asyncio.CancelledError:
+            try:
+                await self._request({"type": "cancel", "task_id": task_id})
+            except TaskError:
+                pass
+            raise
+
+    async def get_status(self):
+        return await self._request({"type": "status"})
+
+
+class Worker:
+    """Runs the tasks of a task server with the local tool executables.
+
+    :code:`tool_paths` maps the tool names to the paths of the executables.
+    """
+
+    def __init__(
+        self,
+        address,
+        tool_paths,
+        shared_dir=None,
+        name=None,
+        heartbeat_interval=HEARTBEAT_INTERVAL,
+        poll_interval=POLL_INTERVAL,
+        log_callback=None,
+    ):
+        self.host, self.port = parse_address(address)
+        self.tool_paths = tool_paths
+        self.shared_dir = shared_dir
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}"
+        self.heartbeat_interval = heartbeat_interval
+        self.poll_interval = poll_interval
+        self.log_callback = log_callback or (lambda line: None)
+
+    async def _request(self, message):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            await _send(writer, dict(message, worker=self.name))
+            return await _receive(reader)
+        finally:
+            writer.close()
+
+    async def _send_heartbeats(self, task_id, process):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                reply = await self._request(
+                    {"type": "heartbeat", "task_id": task_id}
+                )
+            except (OSError, ConnectionError, ValueError):
+                continue  # Retried with the next heartbeat
+            if reply.get("cancel"):
+                self.log_callback(f"Task {task_id} cancelled")
+                process.terminate()
+                return
+
+    async def _collect_output(self, stream, log):
+        pending = b""
+        while True:
+            chunk = await stream.read(CHUNK_SIZE)
+            lines = (pending + chunk).replace(b"\r", b"\n").split(b"\n")
+            pending = lines.pop()
+            for line in lines:
+                if line:
+                    text = line.decode(errors="replace").rstrip()
+                    log.append(text)
+                    self.log_callback(text)
+            if not chunk:
+                break
+
+    async def run_task(self, message):
+        """Run a task and return its return code and the last log lines."""
+        executable = self.tool_paths.get(message["tool"])
+        if not executable:
+            return None, [f"No {message['tool']} executable on {self.name}"]
+        args = map_paths(
+            message["args"], message.get("shared_dir"), self.shared_dir
+        )
+        log = collections.deque(maxlen=NUM_LOG_LINES)
+        try:
+            process = await asyncio.create_subprocess_exec(
+                executable,
+                *args,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT,
+            )
+        except OSError as e:
+            return None, [f"Could not run {executable}: {e}"]
+        heartbeats = asyncio.ensure_future(
+            self._send_heartbeats(message["task_id"], process)
+        )
+        try:
+            await self._collect_output(process.stdout, log)
+            await process.wait()
+        finally:
+            heartbeats.cancel()
+        return process.returncode, list(log)
+
+    async def run(self, max_num_tasks=None):
+        """Request and run tasks until :code:`max_num_tasks` are done."""
+        num_tasks = 0
+        while max_num_tasks is None or num_tasks < max_num_tasks:
+            try:
+                message = await self._request({"type": "request"})
+            except (OSError, ConnectionError, ValueError):
+                # The server may be restarting
+                await asyncio.sleep(self.heartbeat_interval)
+                continue
+            if message.get("type") != "task":
+                await asyncio.sleep(self.poll_interval)
+                continue
+            self.log_callback(
+                f"Running task {message['task_id']} "
+                f"(attempt {message['attempt']}): {message['tool']}"
+            )
+            returncode, log = await self.run_task(message)
+            result = {
+                "type": "result",
+                "task_id": message["task_id"],
+                "returncode": returncode,
+                "log": log,
+            }
+            # The server queues the task again, if the result is lost
+            try:
+                await self._request(result)
+            except (OSError, ConnectionError, ValueError):
+                pass
+            num_tasks += 1
+
+
+def start_local_workers(address, tool_paths, num_workers, shared_dir=None):
+    """Start worker processes on this machine and return them."""
+    cmd = [
+        sys.executable,
+        "-m",
+        __spec__.name,
+        "worker",
+        "--server",
+        address,
+        "--quiet",
+    ]
+    for tool_name, path in tool_paths.items():
+        if path:
+            cmd += ["--" + tool_name, path]
+    if shared_dir:
+        cmd += ["--shared-dir", shared_dir]
+    # The package must be importable from the working directory
+    package_parent = os.path.dirname(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    )
+    return [
+        subprocess.Popen(cmd, cwd=package_parent) for _ in range(num_workers)
+    ]
+
+
+def create_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m open_video_tracker.pipeline.task_server",
+        description="Distribute the tool commands of pipeline stages to "
+        "workers.",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = subparsers.add_parser("serve", help="Run a task server")
+    serve_parser.add_argument("--host", default=DEFAULT_HOST)
+    serve_parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    serve_parser.add_argument(
+        "--max-attempts", type=int, default=MAX_NUM_ATTEMPTS
+    )
+    serve_parser.add_argument(
+        "--heartbeat-timeout", type=float, default=HEARTBEAT_TIMEOUT
+    )
+    serve_parser.add_argument(
+        "--local-workers",
+        type=int,
+        default=0,
+        help="Number of worker processes started on this machine (with the "
+        "tool paths below)",
+    )
+
+    worker_parser = subparsers.add_parser("worker", help="Run a worker")
+    worker_parser.add_argument(
+        "--server", default=f"{DEFAULT_HOST}:{DEFAULT_PORT}"
+    )
+    worker_parser.add_argument("--name", help="(default: host:pid)")
+    worker_parser.add_argument(
+        "--max-tasks",
+        type=int,
+        help="Exit after running this number of tasks",
+    )
+    worker_parser.add_argument(
+        "--quiet", action="store_true", help="Do not print the tool output"
+    )
+
+    for subparser in (serve_parser, worker_parser):
+        for tool_name in TOOL_NAMES:
+            subparser.add_argument(
+                "--" + tool_name,
+                default=shutil.which(tool_name),
+                help=f"Path of the {tool_name} executable (default: from "
+                "PATH)",
+            )
+        subparser.add_argument(
+            "--shared-dir",
+            help="Local path of the shared directory, if the tasks refer to "
+            "it with another path",
+        )
+    return parser
+
+
+def main(argv=None):
+    args = create_parser().parse_args(argv)
+    tool_paths = {
+        tool_name: getattr(args, tool_name) for tool_name in TOOL_NAMES
+    }
+
+    def log_callback(line):
+        print(line, flush=True)
+
+    if args.command == "worker":
+        worker = Worker(
+            args.server,
+            tool_paths,
+            args.shared_dir,
+            name=args.name,
+            log_callback=(lambda line: None) if args.quiet else log_callback,
+        )
+        try:
+            asyncio.run(worker.run(args.max_tasks))
+        except KeyboardInterrupt:
+            return 130
+        return 0
+
+    server = TaskServer(
+        args.host,
+        args.port,
+        max_num_attempts=args.max_attempts,
+        heartbeat_timeout=args.heartbeat_timeout,
+        log_callback=log_callback,
+    )
+    workers = []
+    if args.local_workers > 0:
+        workers = start_local_workers(
+            f"{args.host}:{args.port}",
+            tool_paths,
+            args.local_workers,
+            args.shared_dir,
+        )
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        return 130
+    finally:
+        for process in workers:
+            process.terminate()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,218 @@
+"""Resource usage of the external tools and the json run report.
+
+On Linux the usage of each child process is sampled from :code:`/proc`
+while it runs (CPU time, peak resident memory, bytes written to disk). On
+other systems only the CPU time and the peak memory of all terminated
+children (:code:`resource.getrusage`) are available, which are attributed
+to the stage that waited for the child.
+"""
+
+import datetime
+import json
+import os
+import platform
+import sys
+import time
+from collections import namedtuple
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+REPORT_FILE_NAME = "run_report.json"
+
+
+def get_total_memory_gb():
+    """Return the physical memory of the machine (in GB) or None."""
+    try:
+        num_pages = os.sysconf("SC_PHYS_PAGES")
+        page_size = os.sysconf("SC_PAGE_SIZE")
+    except (AttributeError, ValueError, OSError):
+        # Not available on Windows
+        return None
+    return num_pages * page_size / 1024**3
+
+
+def get_path_size(path):
+    """Return the size of a file or the total size of a directory (bytes)."""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, filename))
+            except OSError:
+                pass  # Removed in the meantime
+    return total
+
+
+class ProcessUsage(
+    namedtuple(
+        "ProcessUsage",
+        ["wall_time", "cpu_time", "peak_rss", "write_bytes"],
+        defaults=[0.0, 0.0, None, None],
+    )
+):
+    """Resource usage of a child process.
+
+    Times are given in seconds, :code:`peak_rss` and :code:`write_bytes` in
+    bytes (None, if unknown).
+    """
+
+
+def _read_proc_file(pid, name):
+    with open(f"/proc/{pid}/{name}") as proc_file:
+        return proc_file.read()
+
+
+class ProcessSampler:
+    """Sample the resource usage of a running child process."""
+
+    use_proc = sys.platform.startswith("linux") and os.path.isdir("/proc")
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.start = time.perf_counter()
+        self.cpu_time = 0.0
+        self.peak_rss = None
+        self.write_bytes = None
+        self._clock_ticks = os.sysconf("SC_CLK_TCK") if self.use_proc else 1
+        self._children_start = self._get_children_usage()
+
+    @staticmethod
+    def _get_children_usage():
+        if resource is None:
+            return None
+        return resource.getrusage(resource.RUSAGE_CHILDREN)
+
+    def sample(self):
+        """Read the current usage (the process may have terminated)."""
+        if not self.use_proc:
+            return
+        # The files of a terminated (zombie) process are partially available,
+        # i.e. the values are only increased
+        try:
+            stat = _read_proc_file(self.pid, "stat")
+            # The command name may contain spaces, the fields follow the ")"
+            fields = stat[stat.rindex(")") + 2 :].split()
+            utime, stime = int(fields[11]), int(fields[12])
+            self.cpu_time = max(
+                self.cpu_time, (utime + stime) / self._clock_ticks
+            )
+            for line in _read_proc_file(self.pid, "io").splitlines():
+                if line.startswith("write_bytes:"):
+                    self.write_bytes = max(
+                        self.write_bytes or 0, int(line.split()[1])
+                    )
+            for line in _read_proc_file(self.pid, "status").splitlines():
+                if line.startswith("VmHWM:"):
+                    self.peak_rss = max(
+                        self.peak_rss or 0, int(line.split()[1]) * 1024
+                    )
+        except (OSError, ValueError, IndexError):
+            pass  # Terminated or not readable
+
+    def finish(self):
+        """Return the usage after the process has terminated."""
+        wall_time = time.perf_counter() - self.start
+        if self.use_proc or self._children_start is None:
+            return ProcessUsage(
+                wall_time, self.cpu_time, self.peak_rss, self.write_bytes
+            )
+        end = self._get_children_usage()
+        start = self._children_start
+        cpu_time = (end.ru_utime - start.ru_utime) + (
+            end.ru_stime - start.ru_stime
+        )
+        # ru_maxrss is given in bytes on macOS and in KB elsewhere
+        factor = 1 if sys.platform == "darwin" else 1024
+        return ProcessUsage(wall_time, cpu_time, end.ru_maxrss * factor, None)
+
+
+class StageRecord:
+    """Measurements of a stage of a pipeline run."""
+
+    def __init__(self, name):
+        self.name = name
+        self.start = time.perf_counter()
+        self.wall_time = None
+        self.commands = []
+        self.output_bytes = None
+
+    def to_dict(self):
+        cpu_time = sum(usage.cpu_time for _, usage, _ in self.commands)
+        peak_rss = [
+            usage.peak_rss
+            for _, usage, _ in self.commands
+            if usage.peak_rss is not None
+        ]
+        write_bytes = [
+            usage.write_bytes
+            for _, usage, _ in self.commands
+            if usage.write_bytes is not None
+        ]
+        return {
+            "wall_time_s": self.wall_time,
+            "cpu_time_s": cpu_time,
+            "peak_rss_bytes": max(peak_rss) if peak_rss else None,
+            "write_bytes": sum(write_bytes) if write_bytes else None,
+            "output_bytes": self.output_bytes,
+            "commands": [
+                dict(usage._asdict(), name=name, returncode=returncode)
+                for name, usage, returncode in self.commands
+            ],
+        }
+
+
+class RunTelemetry:
+    """Collect the stage measurements of a run and write the report."""
+
+    def __init__(self):
+        self.start_time = time.time()
+        self.start = time.perf_counter()
+        self.stages = {}
+
+    def start_stage(self, name):
+        self.stages[name] = StageRecord(name)
+
+    def finish_stage(self, name, output_bytes=None):
+        record = self.stages[name]
+        record.wall_time = time.perf_counter() - record.start
+        record.output_bytes = output_bytes
+
+    def record_command(self, stage, name, usage, returncode):
+        if stage not in self.stages:
+            self.start_stage(stage)
+        self.stages[stage].commands.append((name, usage, returncode))
+
+    def create_report(self, settings, tool_paths, succeeded, error, inputs):
+        """Return the run report as json compatible dict."""
+        return {
+            "started": datetime.datetime.fromtimestamp(
+                self.start_time
+            ).isoformat(timespec="seconds"),
+            "duration_s": time.perf_counter() - self.start,
+            "succeeded": bool(succeeded),
+            "error": error,
+            "machine": {
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+                "memory_gb": get_total_memory_gb(),
+            },
+            "tools": tool_paths._asdict(),
+            "settings": settings._asdict(),
+            "inputs": inputs,
+            "stages": {
+                name: record.to_dict() for name, record in self.stages.items()
+            },
+        }
+
+    def write_report(self, report_path, *args, **kwargs):
+        """Write the run report (see :code:`create_report()`)."""
+        report = self.create_report(*args, **kwargs)
+        with open(report_path, "w") as report_file:
+            json.dump(report, report_file, indent=2)
+        return report
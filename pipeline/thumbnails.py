@@ -0,0 +1,52 @@
+import os
+
+import numpy as np
+
+
+THUMBNAIL_SIZE = 32
+THUMBNAIL_FILE_NAME = "thumbnails.gray"
+
+
+def get_thumbnail_output_args(thumbnail_path, size=THUMBNAIL_SIZE):
+    """Return FFmpeg output arguments that write a gray thumbnail per frame.
+
+    The arguments are appended to the frame extraction command as second
+    output, i.e. the video is decoded only once. The thumbnails are written
+    as raw 8 bit values in the order of the extracted frames. The file of a
+    previous run is overwritten (:code:`-y`).
+    """
+    return [
+        "-y",
+        "-vf", f"scale={size}:{size}:flags=area,format=gray",
+        "-f", "rawvideo",
+        thumbnail_path,
+    ]
+
+
+def read_thumbnails(thumbnail_path, size=THUMBNAIL_SIZE):
+    """Read the thumbnails written by FFmpeg as (N, size * size) array."""
+    data = np.fromfile(thumbnail_path, dtype=np.uint8)
+    num_thumbnails = len(data) // (size * size)
+    return data[: num_thumbnails * size * size].reshape(num_thumbnails, -1)
+
+
+def get_frame_names(images_dir):
+    """Return the names of the extracted frames in sequence order."""
+    return sorted(
+        name for name in os.listdir(images_dir)
+        if os.path.splitext(name)[1].lower() == ".jpg"
+    )
+
+
+def normalize_thumbnails(thumbnails):
+    """Return zero mean, unit length thumbnail vectors.
+
+    The dot product of two normalized thumbnails is their normalized cross
+    correlation, which is invariant to global brightness and contrast changes.
+    """
+    vectors = thumbnails.astype(np.float32)
+    vectors -= vectors.mean(axis=1, keepdims=True)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    # Avoid divisions by zero for uniformly colored frames
+    norms[norms == 0] = 1.0
+    return vectors / norms
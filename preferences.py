@@ -1,6 +1,11 @@
 import os
 import bpy
-from bpy.props import StringProperty, PointerProperty
+from bpy.props import StringProperty, PointerProperty, BoolProperty, IntProperty, FloatProperty
+
+def update_budget(self, context):
+    """Update function of the budgets, which change the warnings of the estimate"""
+    from .utils import clear_run_estimates
+    clear_run_estimates()
 
 class OpenVideoTrackerPreferences(bpy.types.AddonPreferences):
     bl_idname = __package__
@@ -32,6 +37,82 @@ class OpenVideoTrackerPreferences(bpy.types.AddonPreferences):
         subtype='FILE_PATH'
     )
 
+    enable_tracing: BoolProperty(
+        name="Write Timing Traces",
+        description="Measure the pipeline stages and the import steps and write a Chrome trace (trace.json / import_trace.json), which can be viewed with chrome://tracing or ui.perfetto.dev",
+        default=False
+    )
+
+    trace_memory: BoolProperty(
+        name="Trace Memory Peaks",
+        description="Additionally record Python memory peaks with tracemalloc. This slows down the import considerably",
+        default=False
+    )
+
+    max_concurrent_jobs: IntProperty(
+        name="Concurrent Jobs",
+        description="Maximum number of queued videos that are tracked at the same time",
+        default=2,
+        min=1,
+        max=64
+    )
+
+    job_cpu_budget: IntProperty(
+        name="CPU Budget",
+        description="Number of cores shared by the running jobs. A job is only started if the estimated demand of the running stages fits into the budget (0: all available cores, see the CPU quota of containers)",
+        default=0,
+        min=0
+    )
+
+    job_memory_budget: FloatProperty(
+        name="Memory Budget (GB)",
+        description="Memory shared by the running jobs (0: available memory, i.e. the physical memory or the memory limit of the container)",
+        default=0.0,
+        min=0.0
+    )
+
+    time_budget: FloatProperty(
+        name="Time Budget (min)",
+        description="Warn if the estimated duration of a run exceeds this budget (0: no warning)",
+        default=0.0,
+        min=0.0,
+        update=update_budget,
+    )
+
+    disk_budget: FloatProperty(
+        name="Disk Budget (GB)",
+        description="Warn if the estimated disk usage of a run exceeds this budget (0: no warning)",
+        default=0.0,
+        min=0.0,
+        update=update_budget,
+    )
+
+    use_shared_cache: BoolProperty(
+        name="Use Shared Cache",
+        description="Reuse the extracted frames and features of identical videos across projects",
+        default=False
+    )
+
+    cache_dir: StringProperty(
+        name="Cache Directory",
+        description="Directory of the shared cache (empty: ~/.open_video_tracker/cache)",
+        default="",
+        subtype='DIR_PATH'
+    )
+
+    cache_quota: FloatProperty(
+        name="Cache Quota (GB)",
+        description="The least recently used entries are removed if the cache exceeds this size",
+        default=50.0,
+        min=0.1
+    )
+
+    task_server: StringProperty(
+        name="Task Server",
+        description="Address (host:port) of a task server (python -m open_video_tracker.pipeline.task_server serve), whose workers extract the features of the shards. The directory of the blend file must be shared with the workers. Empty: extract locally",
+        default=""
+    )
+
     def draw(self, context):
         layout = self.layout
         header , panel = layout.panel("OPEN_VIDEO_TRACKER_PT_Panel" , default_closed=True)
@@ -40,4 +121,34 @@ class OpenVideoTrackerPreferences(bpy.types.AddonPreferences):
             panel.prop(self, "colmap_path")
             panel.prop(self, "glomap_path")
             panel.prop(self, "ffmpeg_path")
-            panel.prop(self, "ffprobe_path")
\ No newline at end of file
+            panel.prop(self, "ffprobe_path")
+        header , panel = layout.panel("OPEN_VIDEO_TRACKER_PT_Diagnostics" , default_closed=True)
+        header.label(text="Diagnostics")
+        if panel:
+            panel.prop(self, "enable_tracing")
+            row = panel.row()
+            row.enabled = self.enable_tracing
+            row.prop(self, "trace_memory")
+        header , panel = layout.panel("OPEN_VIDEO_TRACKER_PT_Job_Queue" , default_closed=True)
+        header.label(text="Job Queue")
+        if panel:
+            panel.prop(self, "max_concurrent_jobs")
+            panel.prop(self, "job_cpu_budget")
+            panel.prop(self, "job_memory_budget")
+        header , panel = layout.panel("OPEN_VIDEO_TRACKER_PT_Estimate" , default_closed=True)
+        header.label(text="Estimate")
+        if panel:
+            panel.prop(self, "time_budget")
+            panel.prop(self, "disk_budget")
+        header , panel = layout.panel("OPEN_VIDEO_TRACKER_PT_Shared_Cache" , default_closed=True)
+        header.label(text="Shared Cache")
+        if panel:
+            panel.prop(self, "use_shared_cache")
+            col = panel.column()
+            col.enabled = self.use_shared_cache
+            col.prop(self, "cache_dir")
+            col.prop(self, "cache_quota")
+        header , panel = layout.panel("OPEN_VIDEO_TRACKER_PT_Task_Server" , default_closed=True)
+        header.label(text="Task Server")
+        if panel:
+            panel.prop(self, "task_server")
\ No newline at end of file
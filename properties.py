@@ -1,13 +1,40 @@
 import bpy
-from bpy.props import StringProperty, BoolProperty, IntProperty, FloatProperty, EnumProperty
+from bpy.props import StringProperty, BoolProperty, IntProperty, FloatProperty, EnumProperty, CollectionProperty, PointerProperty
 import os
 
 from .importer.importer import CameraImporter
 from .importer.point_importer import PointImporter
 
 
+def apply_video_info(props, video_info, error):
+    """Show the ffprobe result of the current video"""
+    if video_info:
+        props.video_frame_rate = video_info.get("frame_rate", "N/A")
+        props.video_resolution = video_info.get("resolution", "N/A")
+        props.video_bitrate = video_info.get("bitrate", "N/A")
+        props.video_num_frames = video_info.get("num_frames", 0)
+        props.video_fps = video_info.get("fps", 0.0)
+        props.video_width = video_info.get("width", 0)
+        props.video_height = video_info.get("height", 0)
+    else:
+        props.video_frame_rate = f"Error: {error}" if error else "N/A"
+        props.video_resolution = "N/A"
+        props.video_bitrate = "N/A"
+
+def update_estimate(self, context):
+    """Update function of the settings that change the runtime estimate"""
+    # Import here to avoid circular imports
+    from .utils import update_run_estimate
+    update_run_estimate(self)
+
 def update_video_path(self, context):
     """Update function called when video_path property changes"""
+    # The numeric values are only known after a successful probe
+    self.video_num_frames = 0
+    self.video_fps = 0.0
+    self.video_width = 0
+    self.video_height = 0
+
     if not self.video_path:
         # Clear video info if path is empty
         self.video_frame_rate = ""
@@ -23,18 +50,27 @@ def update_video_path(self, context):
         return
 
     # Import here to avoid circular imports
+    from .utils import request_video_info
+
+    # ffprobe runs in the background, the result is applied by a timer
+    scene_name = context.scene.name
+    video_path = self.video_path
+
+    def on_video_info(video_info, error):
+        scene = bpy.data.scenes.get(scene_name)
+        if scene is None or scene.open_video_tracker.video_path != video_path:
+            return  # The scene was removed or another video was selected
+        apply_video_info(scene.open_video_tracker, video_info, error)
+        for window in bpy.context.window_manager.windows:
+            for area in window.screen.areas:
+                if area.type == 'VIEW_3D':
+                    area.tag_redraw()
+
     try:
-        from .utils import get_video_info
-        video_info, error = get_video_info(self.video_path)
-
-        if video_info:
-            self.video_frame_rate = video_info.get("frame_rate", "N/A")
-            self.video_resolution = video_info.get("resolution", "N/A")
-            self.video_bitrate = video_info.get("bitrate", "N/A")
-        else:
-            self.video_frame_rate = f"Error: {error}" if error else "N/A"
-            self.video_resolution = "N/A"
-            self.video_bitrate = "N/A"
+        if not request_video_info(video_path, on_video_info):
+            self.video_frame_rate = "Probing..."
+            self.video_resolution = ""
+            self.video_bitrate = ""
     except Exception as e:
         self.video_frame_rate = f"Error: {str(e)}"
         self.video_resolution = "N/A"
@@ -54,10 +90,56 @@ class OpenVideoTrackerCameraProperties(bpy.types.PropertyGroup ,CameraImporter):
 class OpenVideoTrackerPointsProperties(bpy.types.PropertyGroup ,PointImporter):
     pass
 
+class OpenVideoTrackerWeakLinkProperties(bpy.types.PropertyGroup):
+    first_image: StringProperty(name="First Image", default="")
+    second_image: StringProperty(name="Second Image", default="")
+    num_inliers: IntProperty(name="Inliers", default=0)
+
+class OpenVideoTrackerDatabaseProperties(bpy.types.PropertyGroup):
+    """Feature and match statistics read from database.db"""
+
+    # Only a few weak links are listed in the panel
+    max_num_listed_weak_links = 10
+
+    is_analyzed: BoolProperty(name="Is Analyzed", default=False)
+    num_images: IntProperty(name="Images", default=0)
+    min_keypoints: IntProperty(name="Min Keypoints", default=0)
+    mean_keypoints: IntProperty(name="Mean Keypoints", default=0)
+    max_keypoints: IntProperty(name="Max Keypoints", default=0)
+    num_matched_pairs: IntProperty(name="Matched Pairs", default=0)
+    num_verified_pairs: IntProperty(name="Verified Pairs", default=0)
+    min_sequential_inliers: IntProperty(name="Min Sequential Inliers", default=0)
+    mean_sequential_inliers: IntProperty(name="Mean Sequential Inliers", default=0)
+    num_weak_links: IntProperty(name="Weak Links", default=0)
+    weak_links: CollectionProperty(type=OpenVideoTrackerWeakLinkProperties)
+
+    def update_from_statistics(self, statistics):
+        """Copy the values of a DatabaseStatistics tuple to this property group"""
+        keypoint_counts = statistics.keypoint_counts
+        inlier_counts = statistics.sequential_inlier_counts
+        self.num_images = len(statistics.image_ids)
+        self.min_keypoints = int(keypoint_counts.min()) if len(keypoint_counts) else 0
+        self.mean_keypoints = int(keypoint_counts.mean()) if len(keypoint_counts) else 0
+        self.max_keypoints = int(keypoint_counts.max()) if len(keypoint_counts) else 0
+        self.num_matched_pairs = statistics.num_matched_pairs
+        self.num_verified_pairs = statistics.num_verified_pairs
+        self.min_sequential_inliers = int(inlier_counts.min()) if len(inlier_counts) else 0
+        self.mean_sequential_inliers = int(inlier_counts.mean()) if len(inlier_counts) else 0
+        self.num_weak_links = len(statistics.weak_link_indices)
+
+        self.weak_links.clear()
+        for index in statistics.weak_link_indices[:self.max_num_listed_weak_links]:
+            weak_link = self.weak_links.add()
+            weak_link.first_image = statistics.image_names[index]
+            weak_link.second_image = statistics.image_names[index + 1]
+            weak_link.num_inliers = int(inlier_counts[index])
+        self.is_analyzed = True
+
 class OpenVideoTrackerProperties(bpy.types.PropertyGroup):
 
     camera_importer: bpy.props.PointerProperty(type=OpenVideoTrackerCameraProperties)
     point_importer: bpy.props.PointerProperty(type=OpenVideoTrackerPointsProperties)
+    database_statistics: PointerProperty(type=OpenVideoTrackerDatabaseProperties)
     # Video file path
     video_path: StringProperty(
         name="Video Path",
@@ -80,20 +162,47 @@ class OpenVideoTrackerProperties(bpy.types.PropertyGroup):
 
         ],
         default='2',
+        update=update_estimate,
     )
     
+    # Frame filtering settings
+    filter_frames: BoolProperty(
+        name="Filter Frames",
+        description="Remove blurry and near duplicate frames before feature extraction. "
+        "Removed frames are moved to rejected_images and treated as missing cameras during the animation",
+        default=False,
+        update=update_estimate,
+    )
+
+    min_relative_sharpness: FloatProperty(
+        name="Min Relative Sharpness",
+        description="Frames with a sharpness below this fraction of the median sharpness of the surrounding frames are removed",
+        default=0.5,
+        min=0.0,
+        max=1.0
+    )
+
+    min_frame_change: FloatProperty(
+        name="Min Frame Change",
+        description="Frames that differ from the previously kept frame by less than this mean gray value difference are removed",
+        default=1.0,
+        min=0.0
+    )
+
     # COLMAP feature extraction settings
     max_image_size: IntProperty(
         name="Max Image Size",
         description="Maximum image size for feature extraction (in pixels)",
         default=2000,
-        min=100
+        min=100,
+        update=update_estimate,
     )
 
     use_gpu: BoolProperty(
         name="Use GPU",
         description="Use GPU for feature extraction",
-        default=True
+        default=True,
+        update=update_estimate,
     )
 
     camera_model: EnumProperty(
@@ -122,7 +231,16 @@ class OpenVideoTrackerProperties(bpy.types.PropertyGroup):
         description="Maximum number of features to extract per image",
         default=8192,
         min=100,
-        max=50000
+        max=50000,
+        update=update_estimate,
+    )
+
+    num_feature_shards: IntProperty(
+        name="Shards",
+        description="Number of concurrent feature extraction processes. The frames are split into contiguous shards, whose databases are merged afterwards. Use more than one shard on CPU-only machines with many cores",
+        default=1,
+        min=1,
+        max=64
     )
 
     # GLOMAP reconstruction settings
@@ -132,7 +250,8 @@ class OpenVideoTrackerProperties(bpy.types.PropertyGroup):
 Typically, one image should not need more than 1000 tracks to achieve good performance.""",
         default=1000,
         min=100,
-        max=100000
+        max=100000,
+        update=update_estimate,
     )
 
     constraint_type: EnumProperty(
@@ -178,9 +297,111 @@ Typically, one image should not need more than 1000 tracks to achieve good perfo
         name="Overlap",
         description="Number of overlapping images for sequential matching",
         default=10,
-        min=1
+        min=1,
+        update=update_estimate,
     )
     
+    matching_mode: EnumProperty(
+        name="Matching Mode",
+        description="How image pairs are selected for feature matching",
+        items=[
+            ('SEQUENTIAL', "Sequential", "Match each frame against its next overlapping frames", 1),
+            ('SIMILARITY', "Similarity", "Match each frame against its successor and its most similar frames (based on tiny thumbnails). Skips redundant pairs in slow segments and matches revisited locations", 2),
+        ],
+        default='SEQUENTIAL',
+        update=update_estimate,
+    )
+
+    pipeline_mode: EnumProperty(
+        name="Mode",
+        description="Which part of the video is reconstructed",
+        items=[
+            ('FULL', "Full", "Extract, match and reconstruct all frames of the video", 1),
+            ('EXTEND', "Extend", "Register the frames appended to the video since the last run into the existing model (the new frames are matched with the preceding frames and are not filtered)", 2),
+            ('REGISTER_MISSING', "Register Missing", "Register the frames that are missing in the existing model (e.g. after a partial solve) without changing the registered frames. Only the cameras of these frames are added to the scene", 3),
+            ('TRIANGULATE', "Triangulate Known Poses", "Triangulate the points of the poses of the active scene camera (e.g. a matchmoved or mocap camera) instead of reconstructing the camera motion. Frame n of the scene corresponds to the n-th frame of the video", 4),
+        ],
+        default='FULL',
+        update=update_estimate,
+    )
+
+    num_similar_frames: IntProperty(
+        name="Similar Frames",
+        description="Number of most similar frames matched against each frame",
+        default=10,
+        min=1,
+        update=update_estimate,
+    )
+
+    min_similarity: FloatProperty(
+        name="Min Similarity",
+        description="Minimum thumbnail correlation of a selected pair (-1 to 1)",
+        default=0.5,
+        min=-1.0,
+        max=1.0
+    )
+
+    repair_weak_links: BoolProperty(
+        name="Repair Weak Links",
+        description="Re-match only the frames around weak sequential links with a wider window before running the mapper",
+        default=False,
+        update=update_estimate,
+    )
+
+    repair_overlap: IntProperty(
+        name="Repair Overlap",
+        description="Number of frames on each side of a weak link that are matched across it",
+        default=30,
+        min=2
+    )
+
+    min_num_inliers: IntProperty(
+        name="Min Inliers",
+        description="Consecutive frames with fewer verified inlier matches are reported as weak links",
+        default=30,
+        min=0
+    )
+
+    import_in_background: BoolProperty(
+        name="Import in Background",
+        description="Parse the model on a worker thread and build the scene in small steps, so Blender stays responsive. Press ESC to cancel the import",
+        default=True
+    )
+
+    progressive_import: BoolProperty(
+        name="Progressive Import",
+        description="Import a decimated preview first and refine it to full camera and point density in the background",
+        default=False
+    )
+
+    preview_camera_step: IntProperty(
+        name="Preview Camera Step",
+        description="Only every n-th camera is added to the preview. The animated camera always uses all cameras",
+        default=10,
+        min=1
+    )
+
+    preview_voxel_size: FloatProperty(
+        name="Preview Voxel Size",
+        description="Size of the voxels used to subsample the preview point cloud, relative to the largest extent of the point cloud",
+        default=0.01,
+        min=0.0001,
+        max=1.0
+    )
+
+    preview_time_budget: FloatProperty(
+        name="Preview Time Budget",
+        description="Maximal time (in seconds) spent on the preview before the import continues in the background",
+        default=2.0,
+        min=0.0
+    )
+
+    auto_import_jobs: BoolProperty(
+        name="Import Finished Jobs",
+        description="Import the model of each queued video as soon as its job has finished. Otherwise the models are imported on demand from the job list",
+        default=False
+    )
+
     # Progress indicator
     progress: IntProperty(
         name="Progress",
@@ -207,4 +428,36 @@ Typically, one image should not need more than 1000 tracks to achieve good perfo
         name="Video Bitrate",
         description="Bitrate of the loaded video",
         default="",
+    )
+
+    # Numeric video information for the runtime estimate (0 if unknown)
+    video_num_frames: IntProperty(
+        name="Video Frames",
+        description="Number of frames of the loaded video",
+        default=0,
+        min=0,
+        update=update_estimate,
+    )
+
+    video_fps: FloatProperty(
+        name="Video FPS",
+        description="Frame rate of the loaded video",
+        default=0.0,
+        min=0.0,
+    )
+
+    video_width: IntProperty(
+        name="Video Width",
+        description="Width of the loaded video in pixels",
+        default=0,
+        min=0,
+        update=update_estimate,
+    )
+
+    video_height: IntProperty(
+        name="Video Height",
+        description="Height of the loaded video in pixels",
+        default=0,
+        min=0,
+        update=update_estimate,
     )
\ No newline at end of file
@@ -2,7 +2,16 @@ import bpy
 
 from .properties import OpenVideoTrackerCameraProperties , OpenVideoTrackerPointsProperties
 
-from .operators import OPEN_VIDEO_TRACKER_OT_run_pipeline_modal
+from .operators import (
+    OPEN_VIDEO_TRACKER_OT_run_pipeline_modal,
+    OPEN_VIDEO_TRACKER_OT_analyze_database,
+    OPEN_VIDEO_TRACKER_OT_add_job,
+    OPEN_VIDEO_TRACKER_OT_run_job_queue,
+    OPEN_VIDEO_TRACKER_OT_job_action)
+from .importer.importer import ImportColmapOperator
+from .pipeline.job_queue import QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED
+from .pipeline.progress import format_duration
+from .utils import get_job_queue, get_run_estimate
 
 class OPEN_VIDEO_TRACKER_PT_panel(bpy.types.Panel):
     """Creates a Panel in the 3D Viewport"""
@@ -56,6 +65,12 @@ class OPEN_VIDEO_TRACKER_PT_panel(bpy.types.Panel):
         box.label(text="Frame Extraction", icon='IMAGE_DATA')
         row = box.row()
         row.prop(open_video_tracker, "quality")
+        row = box.row()
+        row.prop(open_video_tracker, "filter_frames")
+        if open_video_tracker.filter_frames:
+            row = box.row(align=True)
+            row.prop(open_video_tracker, "min_relative_sharpness", text="Sharpness")
+            row.prop(open_video_tracker, "min_frame_change", text="Change")
         box = layout.box()
 
         # COLMAP Feature Extraction Settings
@@ -67,16 +82,59 @@ class OPEN_VIDEO_TRACKER_PT_panel(bpy.types.Panel):
         col1.label(text="Use GPU")
         col1.label(text="Camera Model")
         col1.label(text="Max Num Features")    
+        col1.label(text="Shards")
         col2.prop(open_video_tracker, "max_image_size" , text="")
         col2.prop(open_video_tracker, "use_gpu", text="")
         col2.prop(open_video_tracker, "camera_model", text="")
         col2.prop(open_video_tracker, "max_num_features", text="")
+        col2.prop(open_video_tracker, "num_feature_shards", text="")
         
         # COLMAP Sequential Matching Settings
         box = layout.box()
-        box.label(text="Sequential Matching", icon='CON_FOLLOWPATH')
+        box.label(text="Matching", icon='CON_FOLLOWPATH')
         row = box.row()
-        row.prop(open_video_tracker, "overlap")
+        row.prop(open_video_tracker, "matching_mode", expand=True)
+        if open_video_tracker.matching_mode == 'SIMILARITY':
+            row = box.row(align=True)
+            row.prop(open_video_tracker, "num_similar_frames")
+            row.prop(open_video_tracker, "min_similarity")
+        else:
+            row = box.row()
+            row.prop(open_video_tracker, "overlap")
+        row = box.row(align=True)
+        row.prop(open_video_tracker, "repair_weak_links")
+        sub = row.row(align=True)
+        sub.enabled = open_video_tracker.repair_weak_links
+        sub.prop(open_video_tracker, "repair_overlap", text="Window")
+
+        # Match Statistics from database.db
+        header,panel = box.panel("OPEN_VIDEO_TRACKER_PT_match_statistics" , default_closed =True)
+        header.label(text="Match Statistics", icon='VIEWZOOM')
+        if panel:
+            row = panel.row(align=True)
+            row.prop(open_video_tracker, "min_num_inliers")
+            row.operator(OPEN_VIDEO_TRACKER_OT_analyze_database.bl_idname, text="", icon='FILE_REFRESH')
+            statistics = open_video_tracker.database_statistics
+            if statistics.is_analyzed:
+                stats_box = panel.box()
+                stats_box.scale_y = 0.7
+                row = stats_box.row()
+                row.label(text="Images:")
+                row.label(text=str(statistics.num_images))
+                row = stats_box.row()
+                row.label(text="Keypoints (min/mean/max):")
+                row.label(text=f"{statistics.min_keypoints}/{statistics.mean_keypoints}/{statistics.max_keypoints}")
+                row = stats_box.row()
+                row.label(text="Verified/Matched Pairs:")
+                row.label(text=f"{statistics.num_verified_pairs}/{statistics.num_matched_pairs}")
+                row = stats_box.row()
+                row.label(text="Sequential Inliers (min/mean):")
+                row.label(text=f"{statistics.min_sequential_inliers}/{statistics.mean_sequential_inliers}")
+                row = stats_box.row()
+                row.label(text="Weak Links:", icon='ERROR' if statistics.num_weak_links else 'CHECKMARK')
+                row.label(text=str(statistics.num_weak_links))
+                for weak_link in statistics.weak_links:
+                    stats_box.label(text=f"{weak_link.first_image} - {weak_link.second_image}: {weak_link.num_inliers}")
 
         # GLOMAP Reconstruction Settings
         box = layout.box()
@@ -108,12 +166,101 @@ class OPEN_VIDEO_TRACKER_PT_panel(bpy.types.Panel):
         box = layout.box()
         box.label(text="Execution", icon='PLAY')
         row = box.row()
+        row.prop(open_video_tracker, "pipeline_mode", expand=True)
+        row = box.row()
         if not OPEN_VIDEO_TRACKER_OT_run_pipeline_modal.is_active:
             row.operator(OPEN_VIDEO_TRACKER_OT_run_pipeline_modal.bl_idname, text="Track Video")
+            row.operator(OPEN_VIDEO_TRACKER_OT_add_job.bl_idname, text="", icon='ADD')
+            self.draw_estimate(box, open_video_tracker)
         else:
             row.label(text="Progesss")
             row = box.row()
-            row.progress(text=OPEN_VIDEO_TRACKER_OT_run_pipeline_modal._message, factor=open_video_tracker.progress/7)
+            row.progress(text=OPEN_VIDEO_TRACKER_OT_run_pipeline_modal._message, factor=OPEN_VIDEO_TRACKER_OT_run_pipeline_modal._fraction)
+            for stage, (_, stage_message) in list(OPEN_VIDEO_TRACKER_OT_run_pipeline_modal._stage_messages.items()):
+                row = box.row()
+                row.scale_y = 0.7
+                row.label(text=f"{stage.replace('_', ' ').capitalize()}: {stage_message}", icon='TIME')
+        if ImportColmapOperator.is_active:
+            row = box.row()
+            row.progress(text=ImportColmapOperator._message, factor=ImportColmapOperator._progress)
+            box.label(text="Press ESC to cancel the import", icon='INFO')
+
+    def draw_estimate(self, layout, open_video_tracker):
+        estimate, warnings = get_run_estimate(open_video_tracker)
+        if estimate is None:
+            return
+        header, panel = layout.panel("OPEN_VIDEO_TRACKER_PT_estimate", default_closed=True)
+        source = f"{estimate.num_runs} runs" if estimate.num_runs else "defaults"
+        header.label(text=f"Estimate: {format_duration(estimate.total_seconds)}, {estimate.total_disk_bytes / 1024**3:.1f} GB ({source})", icon='TIME')
+        if panel:
+            col = panel.column(align=True)
+            col.scale_y = 0.7
+            for stage, seconds in estimate.stage_seconds.items():
+                col.label(text=f"{stage.replace('_', ' ').capitalize()}: {format_duration(seconds)}")
+            for name, num_bytes in estimate.disk_bytes.items():
+                col.label(text=f"{name.capitalize()}: {num_bytes / 1024**2:.0f} MB")
+        for warning in warnings:
+            layout.label(text=warning, icon='ERROR')
+
+
+class OPEN_VIDEO_TRACKER_PT_job_queue_panel(bpy.types.Panel):
+    """Lists the queued videos and their progress"""
+    bl_label = "Job Queue"
+    bl_idname = "OPEN_VIDEO_TRACKER_PT_job_queue_panel"
+    bl_space_type = 'VIEW_3D'
+    bl_region_type = 'UI'
+    bl_options = {'DEFAULT_CLOSED'}
+    bl_category = "Open Video Tracker"
+
+    state_icons = {
+        QUEUED: 'TIME',
+        RUNNING: 'PLAY',
+        SUCCEEDED: 'CHECKMARK',
+        FAILED: 'ERROR',
+        CANCELLED: 'CANCEL',
+    }
+
+    def draw(self, context):
+        layout = self.layout
+        try:
+            job_queue = get_job_queue()
+        except ValueError as e:
+            layout.label(text=str(e), icon='ERROR')
+            return
+        if job_queue is None:
+            layout.label(text="Save the blend file to use the queue", icon='INFO')
+            return
+
+        layout.prop(context.scene.open_video_tracker, "auto_import_jobs")
+        row = layout.row(align=True)
+        if OPEN_VIDEO_TRACKER_OT_run_job_queue.is_active:
+            op = row.operator(OPEN_VIDEO_TRACKER_OT_job_action.bl_idname, text="Cancel All", icon='CANCEL')
+            op.action = 'CANCEL_ALL'
+        else:
+            row.operator(OPEN_VIDEO_TRACKER_OT_run_job_queue.bl_idname, icon='PLAY')
+        if not job_queue.jobs:
+            layout.label(text="No jobs. Add videos with the + button of the main panel")
+
+        for job in job_queue.jobs:
+            box = layout.box()
+            row = box.row(align=True)
+            row.label(text=job.name, icon=self.state_icons[job.state])
+            if job.state in (QUEUED, RUNNING):
+                self.draw_job_action(row, job, 'CANCEL', 'X')
+            else:
+                self.draw_job_action(row, job, 'RETRY', 'FILE_REFRESH')
+                if job.state == SUCCEEDED:
+                    self.draw_job_action(row, job, 'IMPORT', 'IMPORT')
+                self.draw_job_action(row, job, 'REMOVE', 'TRASH')
+            if job.state == RUNNING:
+                box.progress(text=job.message, factor=job.fraction)
+            elif job.message:
+                box.label(text=job.message + (" (imported)" if job.imported else ""))
+
+    def draw_job_action(self, layout, job, action, icon):
+        op = layout.operator(OPEN_VIDEO_TRACKER_OT_job_action.bl_idname, text="", icon=icon)
+        op.job_id = job.job_id
+        op.action = action
 
 
 class OPEN_VIDEO_TRACKER_PT_camera_panel(bpy.types.Panel):
@@ -128,6 +275,13 @@ class OPEN_VIDEO_TRACKER_PT_camera_panel(bpy.types.Panel):
     def draw(self, context):
         layout = self.layout
         scene = context.scene
+        layout.prop(scene.open_video_tracker, "import_in_background")
+        progressive_box = layout.box()
+        progressive_box.prop(scene.open_video_tracker, "progressive_import")
+        if scene.open_video_tracker.progressive_import:
+            progressive_box.prop(scene.open_video_tracker, "preview_camera_step")
+            progressive_box.prop(scene.open_video_tracker, "preview_voxel_size")
+            progressive_box.prop(scene.open_video_tracker, "preview_time_budget")
         row = layout.row()
         # row.scale_y = 1.5
         self.draw_camera_options(row , scene.open_video_tracker.camera_importer)
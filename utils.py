@@ -1,11 +1,24 @@
 import os
 import bpy
-import subprocess
-import json
-
-from numpy import add
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from mathutils import Euler, Matrix, Quaternion, Vector
 
 from .properties import OpenVideoTrackerCameraProperties , OpenVideoTrackerPointsProperties
+from .importer.camera_utility import get_computer_vision_camera
+from .importer.colmap_file_handler import ColmapFileHandler
+from .pipeline.frame_filter import REJECTED_IMAGES_DIR_NAME
+from .pipeline.artifact_cache import ArtifactCache, get_default_cache_dir
+from .pipeline.estimator import Estimator, VideoStatistics, check_budget, get_default_history_path
+from .pipeline.job_queue import QUEUE_FILE_NAME, JobQueue, ResourceBudget
+from .pipeline.probe import ProbeCache, ProbeError, get_default_probe_cache_path
+from .pipeline.task_server import TaskClient
+from .pipeline.runner import (
+    PipelineSettings,
+    ToolPaths,
+    get_video_name,
+    get_working_directory,
+)
 
 def get_addon_preferences():
     """Get the addon preferences"""
@@ -13,55 +26,154 @@ def get_addon_preferences():
     addon_prefs = preferences.addons[__package__].preferences
     return addon_prefs
 
-def create_working_directory(base_path, video_name):
-    """Create a working directory for the video tracking process"""
-    working_dir = os.path.join(base_path, "video_tracking", video_name)
-    images_dir = os.path.join(working_dir, "images")
-    sparse_dir = os.path.join(working_dir, "sparse")
-    
-    # Create directories if they don't exist
-    os.makedirs(images_dir, exist_ok=True)
-    os.makedirs(sparse_dir, exist_ok=True)
-    
-    return working_dir, images_dir, sparse_dir
-
-def get_video_name(video_path):
-    """Extract the video name from the video path"""
-    basename = os.path.basename(video_path)
-    name, _ = os.path.splitext(basename)
-    return name
-
-def validate_executable_path(path):
-    """Validate that an executable path exists and is executable"""
-    if not path:
-        return False, "Path is empty"
-    
-    if not os.path.exists(path):
-        return False, f"Path does not exist: {path}"
-        
-    if not os.path.isfile(path):
-        return False, f"Path is not a file: {path}"
-        
-    return True, "Valid"
-
-def validate_video_path(path):
-    """Validate that a video path exists and has a valid extension"""
-    if not path:
-        return False, "Path is empty"
-    
-    if not os.path.exists(path):
-        return False, f"Path does not exist: {path}"
-        
-    if not os.path.isfile(path):
-        return False, f"Path is not a file: {path}"
-        
-    valid_extensions = ['.mp4', '.avi', '.mov', '.mkv', '.wmv', '.flv', '.webm']
-    _, ext = os.path.splitext(path.lower())
-    
-    if ext not in valid_extensions:
-        return False, f"Invalid file extension: {ext}"
-        
-    return True, "Valid"
+_job_queues = {}
+# Preferences the dependencies of each queue were built with
+_job_queue_configs = {}
+# Error and modification time of each queue file that could not be loaded
+_job_queue_errors = {}
+
+def _get_job_queue_config(prefs, base_dir):
+    return (
+        prefs.ffmpeg_path, prefs.colmap_path, prefs.glomap_path,
+        prefs.max_concurrent_jobs, prefs.job_cpu_budget, prefs.job_memory_budget,
+        prefs.enable_tracing, prefs.use_shared_cache, prefs.cache_dir, prefs.cache_quota,
+        prefs.task_server, base_dir,
+    )
+
+def _load_job_queue(queue_path):
+    """Load the queue file, raises a ValueError if it can not be read
+
+    The error is kept until the file changes, so that the panel does not read
+    a broken file on every redraw.
+    """
+    try:
+        mtime = os.path.getmtime(queue_path)
+    except OSError:
+        mtime = None
+    error = _job_queue_errors.get(queue_path)
+    if error is not None and error[0] == mtime:
+        raise ValueError(error[1])
+    try:
+        job_queue = JobQueue(queue_path, None)
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        message = f"Could not load the job queue {queue_path}: {e}"
+        _job_queue_errors[queue_path] = (mtime, message)
+        raise ValueError(message)
+    _job_queue_errors.pop(queue_path, None)
+    job_queue.history_path = get_history_path()
+    job_queue.probe_cache = get_probe_cache()
+    return job_queue
+
+def get_job_queue():
+    """Get the job queue of the saved blend file (or None if it is not saved)
+
+    The queue is loaded from video_tracking/job_queue.json next to the blend
+    file and kept for the whole Blender session. Its tools, budget, cache and
+    task client are built again only when the preferences change. Raises a
+    ValueError if the queue file or the preferences are invalid.
+    """
+    blend_path = bpy.data.filepath
+    if not blend_path:
+        return None
+    base_dir = os.path.dirname(blend_path)
+    queue_path = os.path.join(base_dir, "video_tracking", QUEUE_FILE_NAME)
+    if queue_path not in _job_queues:
+        _job_queues[queue_path] = _load_job_queue(queue_path)
+    job_queue = _job_queues[queue_path]
+    prefs = get_addon_preferences()
+    config = _get_job_queue_config(prefs, base_dir)
+    if _job_queue_configs.get(queue_path) != config:
+        job_queue.task_client = get_task_client(base_dir)
+        job_queue.tool_paths = ToolPaths(prefs.ffmpeg_path, prefs.colmap_path, prefs.glomap_path)
+        job_queue.budget = ResourceBudget(prefs.max_concurrent_jobs, prefs.job_cpu_budget or None, prefs.job_memory_budget or None)
+        job_queue.trace = prefs.enable_tracing
+        job_queue.artifact_cache = get_artifact_cache()
+        _job_queue_configs[queue_path] = config
+    return job_queue
+
+def get_artifact_cache():
+    """Get the shared frame and feature cache (or None if it is disabled)"""
+    prefs = get_addon_preferences()
+    if not prefs.use_shared_cache:
+        return None
+    cache_dir = bpy.path.abspath(prefs.cache_dir) if prefs.cache_dir else get_default_cache_dir()
+    return ArtifactCache(cache_dir, prefs.cache_quota)
+
+def get_task_client(base_dir):
+    """Get the client of the task server (or None if the features are extracted locally)
+
+    Raises a ValueError if the address of the task server is invalid.
+    """
+    prefs = get_addon_preferences()
+    if not prefs.task_server.strip():
+        return None
+    return TaskClient(prefs.task_server.strip(), base_dir)
+
+def get_history_path():
+    """Get the file of the successful runs (shared with the command line)"""
+    return get_default_history_path()
+
+_estimator = {"mtime": None, "estimator": None}
+
+def get_estimator():
+    """Get the estimator fitted to the run history
+
+    The estimator is fitted again, once the history file has changed.
+    """
+    history_path = get_history_path()
+    try:
+        mtime = os.path.getmtime(history_path)
+    except OSError:
+        mtime = None
+    if _estimator["estimator"] is None or _estimator["mtime"] != mtime:
+        _estimator["estimator"] = Estimator.from_history(history_path, PipelineSettings)
+        _estimator["mtime"] = mtime
+    return _estimator["estimator"]
+
+def estimate_run(props):
+    """Estimate the duration and disk usage of a run with the current settings
+
+    Returns the estimate and a list of budget warnings, or (None, []) if the
+    frame count or resolution of the video is unknown.
+    """
+    if not props.video_num_frames or not props.video_width or not props.video_height:
+        return None, []
+    video = VideoStatistics(props.video_num_frames, props.video_width, props.video_height)
+    estimate = get_estimator().estimate(PipelineSettings.from_properties(props), video)
+    prefs = get_addon_preferences()
+    max_disk_bytes = prefs.disk_budget * 1024**3 if prefs.disk_budget else None
+    warnings = check_budget(estimate, prefs.time_budget * 60 if prefs.time_budget else None, max_disk_bytes)
+    output_dir = os.path.dirname(bpy.data.filepath)
+    if output_dir:
+        try:
+            free_bytes = shutil.disk_usage(output_dir).free
+        except OSError:
+            free_bytes = None
+        if free_bytes is not None and estimate.total_disk_bytes > free_bytes:
+            warnings.append(f"Estimated disk usage exceeds the free space ({free_bytes / 1024**3:.1f} GB)")
+    return estimate, warnings
+
+# Estimate and warnings of each scene, see get_run_estimate
+_run_estimates = {}
+
+def update_run_estimate(props):
+    """Estimate the run of the current settings again (called when the settings or the video change)"""
+    _run_estimates[props.id_data.name] = estimate_run(props)
+
+def get_run_estimate(props):
+    """Get the cached estimate of the current settings
+
+    The panel is redrawn often, so the estimate is only computed when it is
+    missing or has been cleared.
+    """
+    scene_name = props.id_data.name
+    if scene_name not in _run_estimates:
+        update_run_estimate(props)
+    return _run_estimates[scene_name]
+
+def clear_run_estimates():
+    """Estimate the runs again, once the budgets or the run history have changed"""
+    _run_estimates.clear()
 
 def get_ffprobe_path():
     """Get the path to ffprobe executable"""
@@ -69,88 +181,183 @@ def get_ffprobe_path():
     return addon_prefs.ffprobe_path
 
 
-def get_video_info(video_path):
-    """Extract video information using ffprobe"""
-    ffprobe_path = get_ffprobe_path()
-    
+_probe_cache = None
+_probe_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="open_video_tracker_probe")
+
+def get_probe_cache():
+    """Get the persistent cache of the ffprobe results"""
+    global _probe_cache
+    if _probe_cache is None:
+        _probe_cache = ProbeCache(get_default_probe_cache_path())
+    return _probe_cache
+
+def format_video_info(info):
+    """Convert a VideoInfo to the values shown in the panel"""
+    frame_rate = f"{info.fps:.1f} fps" if info.fps else "N/A"
+    resolution = f"{info.width}x{info.height}" if info.width and info.height else "N/A"
+    bitrate = f"{info.bit_rate / 1000000:.2f} Mbps" if info.bit_rate else "N/A"
+    return {
+        "frame_rate": frame_rate,
+        "resolution": resolution,
+        "bitrate": bitrate,
+        # Numeric values for the runtime estimate (0 if unknown)
+        "fps": info.fps or 0.0,
+        "duration": info.duration or 0.0,
+        "num_frames": info.num_frames or 0,
+        "width": info.width or 0,
+        "height": info.height or 0,
+        "codec": info.codec or "N/A",
+        "rotation": info.rotation,
+    }
+
+def _probe_video(ffprobe_path, video_path):
+    # Runs on a worker thread, i.e. must not access bpy
     if not os.path.exists(ffprobe_path):
         return None, f"ffprobe not found at: {ffprobe_path}"
-    
     try:
-        # Run ffprobe to get video stream information
-        cmd = [
-            ffprobe_path,
-            "-v", "quiet",
-            "-print_format", "json",
-            "-show_format",
-            "-show_streams",
-            video_path
-        ]
-        
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
-        
-        if result.returncode != 0:
-            return None, f"ffprobe error: {result.stderr}"
-        
-        data = json.loads(result.stdout)
-        
-        # Extract video stream information
-        video_stream = None
-        for stream in data.get("streams", []):
-            if stream.get("codec_type") == "video":
-                video_stream = stream
-                break
-        
-        if not video_stream:
-            return None, "No video stream found"
-        
-        # Extract information
-        frame_rate = video_stream.get("r_frame_rate", "N/A")
-        if frame_rate != "N/A":
-            # Convert frame rate from fraction to float
-            try:
-                num, den = frame_rate.split('/')
-                frame_rate = f"{float(num) / float(den):.1f} fps"
-            except:
-                frame_rate = f"{frame_rate} fps"
-        
-        width = video_stream.get("width", "N/A")
-        height = video_stream.get("height", "N/A")
-        resolution = f"{width}x{height}" if width != "N/A" and height != "N/A" else "N/A"
-        
-        bitrate = video_stream.get("bit_rate", "N/A")
-        if bitrate != "N/A":
-            # Convert bitrate to Mbps
-            try:
-                bitrate_mbps = float(bitrate) / 1000000
-                bitrate = f"{bitrate_mbps:.2f} Mbps"
-            except:
-                bitrate = f"{bitrate} bps"
-        
-        return {
-            "frame_rate": frame_rate,
-            "resolution": resolution,
-            "bitrate": bitrate
-        }, None
-        
-    except subprocess.TimeoutExpired:
-        return None, "ffprobe timeout"
-    except json.JSONDecodeError:
-        return None, "Failed to parse ffprobe output"
+        info = get_probe_cache().probe(ffprobe_path, video_path)
+    except ProbeError as e:
+        return None, str(e)
     except Exception as e:
         return None, f"Error getting video info: {str(e)}"
+    return format_video_info(info), None
+
+def get_video_info(video_path):
+    """Extract video information using ffprobe (blocks until ffprobe returns, unless cached)"""
+    return _probe_video(get_ffprobe_path(), video_path)
+
+def request_video_info(video_path, callback):
+    """Extract video information without blocking the UI
+
+    A cached result is passed to callback(video_info, error) immediately.
+    Otherwise ffprobe runs on a worker thread and the callback is called
+    from a timer on the main thread, once it has returned. Returns True if
+    the callback has already been called.
+    """
+    cached_info = get_probe_cache().get(video_path)
+    if cached_info is not None:
+        callback(format_video_info(cached_info), None)
+        return True
+    future = _probe_executor.submit(_probe_video, get_ffprobe_path(), video_path)
+
+    def apply_result():
+        if not future.done():
+            return 0.1
+        callback(*future.result())
+        return None
+
+    bpy.app.timers.register(apply_result, first_interval=0.1)
+    return False
+
+# Transform properties of an object, which are evaluated from its F-curves
+_TRANSFORM_DATA_PATHS = ("location", "rotation_euler", "rotation_quaternion", "rotation_axis_angle", "scale")
+
+def get_transform_fcurves(obj):
+    """Get the F-curves of the transform of an object by (data path, index)
+
+    Returns None, if the world matrix does not only depend on these F-curves (parents, constraints, drivers, NLA tracks, delta transforms or animated camera data), i.e. the scene must be evaluated for each frame.
+    """
+    if obj.parent is not None or obj.constraints:
+        return None
+    if tuple(obj.delta_location) != (0, 0, 0) or tuple(obj.delta_rotation_euler) != (0, 0, 0) or tuple(obj.delta_rotation_quaternion) != (1, 0, 0, 0) or tuple(obj.delta_scale) != (1, 1, 1):
+        return None
+    data_animation = obj.data.animation_data
+    if data_animation is not None and (data_animation.action is not None or data_animation.drivers):
+        return None
+    animation_data = obj.animation_data
+    if animation_data is None or animation_data.action is None:
+        return {}  # Not animated
+    if animation_data.drivers or animation_data.nla_tracks:
+        return None
+    fcurves = getattr(animation_data.action, "fcurves", None)
+    if fcurves is None:
+        return None  # Layered action
+    return {
+        (fcurve.data_path, fcurve.array_index): fcurve
+        for fcurve in fcurves
+        if fcurve.data_path in _TRANSFORM_DATA_PATHS and not fcurve.mute
+    }
+
+def evaluate_matrix_world(obj, transform_fcurves, frame):
+    """Evaluate the world matrix of an object at a frame (see get_transform_fcurves)"""
+    values = {data_path: list(getattr(obj, data_path)) for data_path in _TRANSFORM_DATA_PATHS}
+    for (data_path, index), fcurve in transform_fcurves.items():
+        values[data_path][index] = fcurve.evaluate(frame)
+    if obj.rotation_mode == 'QUATERNION':
+        rotation = Quaternion(values["rotation_quaternion"]).normalized()
+    elif obj.rotation_mode == 'AXIS_ANGLE':
+        angle, *axis = values["rotation_axis_angle"]
+        rotation = Quaternion(axis, angle)
+    else:
+        rotation = Euler(values["rotation_euler"], obj.rotation_mode)
+    return Matrix.LocRotScale(Vector(values["location"]), rotation, Vector(values["scale"]))
+
+def write_known_poses(context, model_dir, image_dir, num_frames=None):
+    """Write the poses of the scene camera as binary COLMAP model for the point triangulation
+
+    Frame n of the scene is the n-th frame of the video (like in the imported camera animations), i.e. the images are named like the extracted frames. Only the frames of the video are written, if its number of frames (num_frames) is known. Unless the camera requires an evaluation of the scene (see get_transform_fcurves), the poses are evaluated from its F-curves without changing the frame of the scene. Returns the number of poses.
+    """
+    scene = context.scene
+    camera_obj = scene.camera
+    if camera_obj is None:
+        return 0
+    last_frame = min(scene.frame_end, num_frames) if num_frames else scene.frame_end
+    frames = range(max(scene.frame_start, 1), last_frame + 1)
+    transform_fcurves = get_transform_fcurves(camera_obj)
+    cameras = []
+    if transform_fcurves is not None:
+        for frame in frames:
+            matrix_world = evaluate_matrix_world(camera_obj, transform_fcurves, frame)
+            cameras.append(get_computer_vision_camera(camera_obj, f"frame_{frame:06d}.jpg", image_dp=image_dir, camera_index=frame, check_scale=False, matrix_world=matrix_world))
+    else:
+        frame_current = scene.frame_current
+        try:
+            for frame in frames:
+                scene.frame_set(frame)
+                cameras.append(get_computer_vision_camera(camera_obj, f"frame_{frame:06d}.jpg", image_dp=image_dir, camera_index=frame, check_scale=False))
+        finally:
+            scene.frame_set(frame_current)
+    # Poses of a previous run must not be mixed with the current ones
+    shutil.rmtree(model_dir, ignore_errors=True)
+    os.makedirs(model_dir)
+    ColmapFileHandler.write_colmap_model(model_dir, cameras, [], camera_model="PINHOLE", ext=".bin")
+    return len(cameras)
+
+def import_pipeline_model(context, settings, model_dir, image_dir, registered_frame_names=()):
+    """Import the model of a finished run according to its pipeline mode
+
+    REGISTER_MISSING runs only add the cameras of the registered frames to the previous import, TRIANGULATE runs only import the points (the cameras are already in the scene). The other runs (including EXTEND, whose bundle adjustment moves all cameras and points) are imported completely. Returns False if there is nothing to import.
+    """
+    if settings.pipeline_mode == "REGISTER_MISSING":
+        if not registered_frame_names:
+            return False
+        import_colmap_data(context, model_dir, image_dir, registered_frame_names, filter_frames=settings.filter_frames)
+    elif settings.pipeline_mode == "TRIANGULATE":
+        import_colmap_data(context, model_dir, image_dir, import_cameras=False, filter_frames=settings.filter_frames)
+    elif os.path.exists(model_dir):
+        import_colmap_data(context, model_dir, image_dir, filter_frames=settings.filter_frames)
+    else:
+        return False
+    return True
 
-def import_colmap_data(context , model_dir , image_dir):
+def import_colmap_data(context , model_dir , image_dir, update_image_names=(), import_cameras=True, filter_frames=False):
+    """Import a model. If update_image_names is given, only the cameras of these images are added to the previous import (if possible). With import_cameras=False only the points are imported. The rejected frames are only added to the animation, if the frames have been filtered (filter_frames)."""
     camera_prop:OpenVideoTrackerCameraProperties = context.scene.open_video_tracker.camera_importer
     point_prop:OpenVideoTrackerPointsProperties = context.scene.open_video_tracker.point_importer
-    bpy.ops.import_scene.open_video_tracker_colmap(directory=model_dir,
-    import_cameras=camera_prop.import_cameras,
+    props = context.scene.open_video_tracker
+    if props.import_in_background and not update_image_names:
+        import_operator = bpy.ops.import_scene.open_video_tracker_colmap_async
+    else:
+        import_operator = bpy.ops.import_scene.open_video_tracker_colmap
+    import_operator(directory=model_dir,
+    update_image_names=";".join(update_image_names),
+    import_cameras=camera_prop.import_cameras and import_cameras,
     camera_extent=camera_prop.camera_extent,
     add_background_images=camera_prop.add_background_images,
     add_image_planes=camera_prop.add_image_planes,
     add_image_plane_emission=camera_prop.add_image_plane_emission,
     image_plane_transparency=camera_prop.image_plane_transparency,
-    add_camera_motion_as_animation=camera_prop.add_camera_motion_as_animation,
+    add_camera_motion_as_animation=camera_prop.add_camera_motion_as_animation and import_cameras,
     animation_frame_source=camera_prop.animation_frame_source, 
     add_animated_camera_background_images=camera_prop.add_animated_camera_background_images,
     number_interpolation_frames=camera_prop.number_interpolation_frames,
@@ -159,6 +366,7 @@ def import_colmap_data(context , model_dir , image_dir):
     remove_rotation_discontinuities=camera_prop.remove_rotation_discontinuities,
     adjust_render_settings=camera_prop.adjust_render_settings,
     image_dp = image_dir,
+    rejected_image_dp = os.path.join(os.path.dirname(os.path.normpath(image_dir)), REJECTED_IMAGES_DIR_NAME) if filter_frames else "",
     import_points=point_prop.import_points,
     point_cloud_display_sparsity=point_prop.point_cloud_display_sparsity,
     center_points=point_prop.center_points,
@@ -169,5 +377,9 @@ def import_colmap_data(context , model_dir , image_dir):
     add_mesh_to_point_geometry_nodes=point_prop.add_mesh_to_point_geometry_nodes,
     point_radius=point_prop.point_radius,
     point_subdivisions=point_prop.point_subdivisions,
-    add_color_as_custom_property=point_prop.add_color_as_custom_property
+    add_color_as_custom_property=point_prop.add_color_as_custom_property,
+    progressive_import=props.progressive_import,
+    preview_camera_step=props.preview_camera_step,
+    preview_voxel_size=props.preview_voxel_size,
+    preview_time_budget=props.preview_time_budget
                                                                    )
\ No newline at end of file